@@ -48,6 +48,9 @@ Provides:
 
 import bz2
 from copy import copy
+from itertools import islice
+import os
+import time
 
 from config import config
 
@@ -56,7 +59,9 @@ from gui._events import *
 from lib._interfaces import sign, verify, is_pyme_present, get_font_from_data
 
 from lib.selection import Selection
-from model.model import DictGrid
+from model.model import DictGrid, EvaluationTimeoutError
+from model.tilestore import TileStore
+from model.sqlitestore import SqliteStore
 
 from actions._grid_cell_actions import CellActions
 
@@ -141,16 +146,47 @@ class FileActions(object):
         self.opening = False
         self.need_abort = False
 
-    def _empty_grid(self, shape):
-        """Empties grid and sets shape to shape"""
+    def _empty_grid(self, shape, store=None):
+        """Empties grid and sets shape to shape
         
-        self.code_array.dict_grid.clear()
+        Parameters
+        ----------
+        shape: 3-tuple of Integer
+        \tShape of the empty grid
+        store: TileStore or SqliteStore, defaults to new TileStore
+        \tStore for the cell code of the empty grid
+        
+        """
+        
+        if store is None:
+            store = TileStore()
+        
+        self.code_array.dict_grid.store = store
         c_a = self.code_array.dict_grid.cell_attributes
         [c_a.pop() for _ in xrange(len(c_a))]
         self.code_array.unredo.reset()
-        self.code_array.result_cache.clear()
+        self.code_array.reset_result_cache()
 
     
+    def _get_store(self, filepath):
+        """Returns store for the cell code of the file filepath
+        
+        Large files get an on-disk store so that only the cell code of 
+        recently used regions is kept in memory. The store is chosen by 
+        the size of the file, not per document. New grids and smaller 
+        files are kept in memory. Cell attributes are always kept in 
+        memory, and saving copies the whole database.
+        
+        """
+        
+        large_file_size = config["large_file_size"]
+        
+        if large_file_size is not None and \
+           os.path.getsize(filepath) > large_file_size:
+            return SqliteStore(max_pages=config["max_store_pages"])
+        
+        return TileStore()
+    
     def open(self, event):
         """Opens a file that is specified in event.attr
         
@@ -205,7 +241,12 @@ class FileActions(object):
 
         section_readers = { \
             "[shape]": self.code_array.dict_grid.parse_to_shape,
+            "[code_dictionary]": 
+                self.code_array.dict_grid.parse_to_code_dictionary,
+            "[grid_references]": 
+                self.code_array.dict_grid.parse_to_grid_reference,
             "[grid]": self.code_array.dict_grid.parse_to_grid,
+            "[styles]": self.code_array.dict_grid.parse_to_style,
             "[attributes]": self.code_array.dict_grid.parse_to_attribute,
             "[row_heights]": self.code_array.dict_grid.parse_to_height,
             "[col_widths]": self.code_array.dict_grid.parse_to_width,
@@ -228,7 +269,8 @@ class FileActions(object):
                         parser(line)
                         if parser == self.code_array.dict_grid.parse_to_shape:
                             # Empty grid
-                            self._empty_grid(self.code_array.shape)
+                            self._empty_grid(self.code_array.shape, 
+                                             self._get_store(filepath))
                             
                             self.grid.GetTable().ResetView()
                 else:
@@ -251,6 +293,9 @@ class FileActions(object):
         # Enable undo again
         self.grid.code_array.unredo.active = False
         
+        # Cells have been loaded directly into the dict_grid
+        self.grid.code_array.reset_result_cache()
+        
         self.grid.GetTable().ResetView()
         self.grid.ForceRefresh()
         
@@ -299,7 +344,10 @@ class FileActions(object):
         
         filepath = event.attr["filepath"]
         
-        dict_grid = self.code_array.dict_grid
+        self.code_array.compact_cell_attributes()
+        
+        # Edits while saving do not show up in the snapshot
+        dict_grid = self.code_array.snapshot().dict_grid
         
         self.saving = True
         self.need_abort = False
@@ -560,6 +608,10 @@ class TableActions(TableRowActionsMixin, TableColumnActionsMixin,
         row_overflow = False
         col_overflow = False
         
+        no_pasted_cols = grid_cols - tl_col
+        
+        block = []
+        
         for src_row, col_data in enumerate(data):
             target_row = tl_row + src_row
             
@@ -572,19 +624,16 @@ class TableActions(TableRowActionsMixin, TableColumnActionsMixin,
                 row_overflow = True
                 break
             
-            for src_col, cell_data in enumerate(col_data):
-                target_col = tl_col + src_col
-                
-                if target_col >= grid_cols:
-                    col_overflow = True
-                    break
-                
-                key = target_row, target_col, tl_tab
-                
-                try:
-                    self.grid.code_array[key] = cell_data
-                except KeyError:
-                    pass
+            row_data = list(islice(col_data, no_pasted_cols + 1))
+            
+            if len(row_data) > no_pasted_cols:
+                col_overflow = True
+                row_data.pop()
+            
+            block.append(row_data)
+        
+        # All cells are written at once as one undo step
+        self.grid.code_array.set_block((tl_row, tl_col, tl_tab), block)
         
         if row_overflow or col_overflow:
             self._show_final_overflow_message(row_overflow, col_overflow)
@@ -714,6 +763,95 @@ class GridActions(object):
         if target_zoom > config["minimum_zoom"]:
             self.zoom(target_zoom)
     
+    def recalculate_parallel(self):
+        """Recalculates all cells, independent cells in worker processes"""
+        
+        start_time = time.time()
+        
+        no_worker_cells = \
+            self.code_array.recalculate(processes=config["recalc_processes"])
+        
+        statustext = u"Recalculated in {0:.2f} s, {1} cells in parallel."
+        statustext = statustext.format(time.time() - start_time, 
+                                       no_worker_cells)
+        
+        no_timeouts = sum(1 for result in 
+                          self.code_array.result_cache.itervalues()
+                          if isinstance(result, EvaluationTimeoutError))
+        
+        if no_timeouts:
+            statustext += u" {0} cells timed out.".format(no_timeouts)
+        
+        result_cache = self.code_array.result_cache
+        
+        statustext += u" Result cache: {0:.1f} MB, {1} evictions.".format(
+                    result_cache.nbytes / 2.0 ** 20, result_cache.evictions)
+        
+        post_command_event(self.main_window, StatusBarMsg, text=statustext)
+    
+    def compact_cell_attributes(self, min_new_entries=0):
+        """Removes redundant cell attributes and returns their number
+        
+        Parameters
+        ----------
+        min_new_entries: Integer, defaults to 0
+        \tNumber of entries that have to be added since the last compaction.
+        \tOtherwise, the cell attributes are not compacted.
+        
+        """
+        
+        cell_attributes = self.code_array.cell_attributes
+        
+        no_entries = len(cell_attributes)
+        
+        if no_entries - cell_attributes.compacted_length < min_new_entries:
+            return 0
+        
+        no_removed = self.code_array.compact_cell_attributes()
+        
+        if not min_new_entries:
+            statustext = u"{0} of {1} cell attributes removed.".format(
+                                                    no_removed, no_entries)
+            post_command_event(self.main_window, StatusBarMsg, 
+                               text=statustext)
+        
+        return no_removed
+    
+    def evaluate_pending_cells(self):
+        """Evaluates pending cells for a while and repaints finished cells
+        
+        Returns True if cells are still pending.
+        
+        """
+        
+        evaluation_queue = self.code_array.evaluation_queue
+        
+        if not evaluation_queue:
+            return False
+        
+        visible_slice = self.grid.get_visiblecell_slice()
+        
+        finished_keys = evaluation_queue.evaluate(
+                                config["idle_evaluation_time"], visible_slice)
+        
+        grid_window = self.grid.GetGridWindow()
+        
+        result_cache = self.code_array.result_cache
+        
+        for key in finished_keys:
+            if key in result_cache and \
+               isinstance(result_cache[key], EvaluationTimeoutError):
+                post_command_event(self.main_window, StatusBarMsg, 
+                                   text=unicode(result_cache[key]))
+            
+            if all(slc.start <= key_ele < slc.stop 
+                   for key_ele, slc in zip(key, visible_slice)):
+                rect = self.grid.CellToRect(*key[:2])
+                rect.x, rect.y = self.grid.CalcScrolledPosition(rect.x, rect.y)
+                grid_window.RefreshRect(rect, eraseBackground=False)
+        
+        return bool(evaluation_queue)
+    
     def on_mouse_over(self, key):
         """Displays cell code of cell key in status bar"""
         
@@ -870,7 +1008,19 @@ class SelectionActions(object):
         
         selection = self.get_selection()
         
-        del_keys = [key for key in self.grid.code_array if key[:2] in selection]
+        tab = self.grid.current_table
+        
+        used_range = self.grid.code_array.dict_grid.get_used_range(tab)
+        
+        if used_range is None:
+            return
+        
+        dict_grid = self.grid.code_array.dict_grid
+        
+        del_keys = [key for top, left, bottom, right in 
+                            selection.get_rectangles(used_range)
+                        for key, _ in dict_grid.iteritems_in((top, left, tab), 
+                                         (bottom + 1, right + 1, tab + 1))]
         
         for key in del_keys:
             self.grid.actions.delete_cell(key)
@@ -1005,10 +1155,23 @@ class AllGridActions(FileActions, TableActions, UnRedoActions,
         return False
 
     def _replace_bbox_none(self, bbox):
-        """Returns bbox, in which None is replaced by grid boundaries"""
+        """Returns bbox, in which None is replaced by grid boundaries
+        
+        Open bottom and right borders end at the used range of the current
+        table instead of the grid shape.
+        
+        """
         
         (bb_top, bb_left), (bb_bottom, bb_right) = bbox
         
+        used_range = self.code_array.dict_grid.get_used_range(
+                                                    self.grid.current_table)
+        
+        if used_range is None:
+            used_bottom, used_right = 0, 0
+        else:
+            used_bottom, used_right = used_range[1]
+        
         if bb_top is None:
             bb_top = 0
         
@@ -1016,9 +1179,9 @@ class AllGridActions(FileActions, TableActions, UnRedoActions,
             bb_left = 0    
         
         if bb_bottom is None:
-            bb_bottom = self.code_array.shape[0] - 1
+            bb_bottom = max(bb_top, used_bottom)
         
         if bb_right is None:
-            bb_right = self.code_array.shape[1] - 1  
+            bb_right = max(bb_left, used_right)
         
         return (bb_top, bb_left), (bb_bottom, bb_right)
@@ -184,26 +184,35 @@ class CellActions(object):
                 self.set_attr(attr + "_right", value)
             
         else:
-            # Adjust selection so that only bounding box edge is in selection
-            bbox_tl, bbox_lr = selection.get_bbox()
+            # Adjust selection so that only its edge cells are in selection
+            
+            if not selection:
+                selection = Selection([], [], [], [], [self.cursor[:2]])
+            
+            rows, cols = self.grid.code_array.shape[:2]
+            bounds = (0, 0), (rows - 1, cols - 1)
+            
+            # Edge cells are selected cells with an unselected neighbor
+            
+            def get_edge(delta):
+                """Returns edge of selection that is opposite to delta"""
+                
+                return selection.difference(selection + delta, bounds)
+            
             if "top" in borders:
-                adj_selection = Selection([bbox_tl], [(bbox_tl[0], bbox_lr[1])],
-                                          [], [], []) + (-1, 0)
+                adj_selection = get_edge((1, 0)) + (-1, 0)
                 self.set_attr(attr + "_bottom", value, adj_selection)
             
             if "bottom" in borders:
-                adj_selection = Selection([(bbox_lr[0], bbox_tl[1])], [bbox_lr],
-                                          [], [], [])
+                adj_selection = get_edge((-1, 0))
                 self.set_attr(attr + "_bottom", value, adj_selection)
                 
             if "left" in borders:
-                adj_selection = Selection([bbox_tl], [(bbox_lr[0], bbox_tl[1])],
-                                          [], [], []) + (0, -1)
+                adj_selection = get_edge((0, 1)) + (0, -1)
                 self.set_attr(attr + "_right", value, adj_selection)
             
             if "right" in borders:
-                adj_selection = Selection([(bbox_tl[0], bbox_lr[1])], [bbox_lr],
-                                          [], [], [])
+                adj_selection = get_edge((0, -1))
                 self.set_attr(attr + "_right", value, adj_selection)
             
 
@@ -384,37 +384,35 @@ class ClipboardActions(object):
             (bb_top, bb_left), (bb_bottom, bb_right) = \
                             replace_none(selection.get_bbox())
         
-        data = []
+        bounds = (bb_top, bb_left), (bb_bottom, bb_right)
         
-        for __row in xrange(bb_top, bb_bottom + 1):
-            data.append([])
+        # Cells that are not in selection stay empty
+        
+        data = [[u""] * (bb_right - bb_left + 1) 
+                for _ in xrange(bb_top, bb_bottom + 1)]
+        
+        if selection_bbox:
+            cells = selection.iter_cells(bounds)
+        else:
+            # There is no selection
+            cells = [(bb_top, bb_left)]
+        
+        for __row, __col in cells:
+            content = getter((__row, __col, tab))
+            
+            # Delete cell if delete flag is set
             
-            for __col in xrange(bb_left, bb_right + 1):
-                # Only copy content if cell is in selection or 
-                # if there is no selection
+            if delete:
+                try:
+                    self.grid.code_array.pop((__row, __col, tab))
                 
-                if (__row, __col) in selection or not selection_bbox:
-                    content = getter((__row, __col, tab))
-                    
-                    # Delete cell if delete flag is set
-                    
-                    if delete:
-                        try:
-                            self.grid.code_array.pop((__row, __col, tab))
-                        
-                        except KeyError:
-                            pass
-                    
-                    # Store data
-                    
-                    if content is None:
-                        data[-1].append(u"")
-                        
-                    else:
-                        data[-1].append(content)
-                        
-                else:
-                    data[-1].append(u"")
+                except KeyError:
+                    pass
+            
+            # Store data
+            
+            if content is not None:
+                data[__row - bb_top][__col - bb_left] = content
         
         return "\n".join("\t".join(line) for line in data)
     
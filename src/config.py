@@ -77,6 +77,44 @@ class DefaultConfig(object):
         self.grid_shape = "(1000, 100, 3)"
         self.max_unredo = "5000"
         
+        # Maximum number of distinct cell codes with cached compiled code
+        self.max_cell_programs = "10000"
+        
+        # Approximate memory in bytes for cached cell results
+        self.max_result_cache_bytes = "256 * 2 ** 20"
+        
+        # Number of processes for parallel recalculation, None for all CPUs
+        self.recalc_processes = "None"
+        
+        # Time in seconds for evaluating pending cells in one idle event
+        self.idle_evaluation_time = "0.05"
+        
+        # Time in seconds after which a cell evaluation is aborted, None for
+        # no limit. The deadline is checked on Python function calls, so
+        # loops without calls and loops inside of C functions are not
+        # aborted.
+        self.eval_timeout = "None"
+        
+        # Solve circular references by fixed-point iteration
+        self.iterative_calculation = "False"
+        self.max_iterations = "100"
+        self.iteration_tolerance = "0.001"
+        
+        # Files larger than this number of bytes are opened with the cell
+        # code in an on-disk database, None keeps all grids in memory.
+        # Cell attributes are kept in memory for all files.
+        self.large_file_size = "16 * 2 ** 20"
+        
+        # Number of pages of the on-disk cell code that are kept in memory
+        self.max_store_pages = "64"
+        
+        # Number of cells with cached cell attributes
+        self.max_attr_cache_cells = "10000"
+        
+        # Cell attributes are compacted in idle time after this number of
+        # entries has been added, None disables compaction in idle time
+        self.attr_compaction_entries = "1000"
+        
         # Colors
         self.grid_color = repr(get_color(wx.SYS_COLOUR_3DSHADOW))
         self.selection_color = repr(get_color(wx.SYS_COLOUR_HIGHLIGHT))
@@ -156,6 +156,8 @@ PasteMsg, EVT_COMMAND_PASTE = new_command_event()
 # Grid view events
 
 RefreshSelectionMsg , EVT_COMMAND_REFRESH_SELECTION = new_command_event()
+RecalculateParallelMsg , EVT_COMMAND_RECALCULATE_PARALLEL = \
+                                                    new_command_event()
 DisplayGotoCellDialogMsg , EVT_COMMAND_DISPLAY_GOTO_CELL_DIALOG = \
                                                     new_command_event()
 GotoCellMsg , EVT_COMMAND_GOTO_CELL = new_command_event()
@@ -184,6 +186,9 @@ ResizeGridMsg, EVT_COMMAND_RESIZE_GRID = new_command_event()
 
 # Grid attribute events
 
+CompactCellAttributesMsg, EVT_COMMAND_COMPACT_CELL_ATTRIBUTES = \
+                                                new_command_event()
+
 # Undo/Redo events
 
 UndoMsg, EVT_COMMAND_UNDO = new_command_event()
@@ -33,6 +33,8 @@ Provides
 
 import wx.grid
 
+from config import config
+
 from _events import *
 
 from _grid_table import GridTable
@@ -121,10 +123,12 @@ class Grid(wx.grid.Grid):
         
         self.Bind(wx.EVT_MOUSEWHEEL, handlers.OnMouseWheel)
         self.Bind(wx.EVT_KEY_DOWN, handlers.OnKey)
+        self.Bind(wx.EVT_IDLE, handlers.OnIdle)
         
         # Grid events
         
         self.GetGridWindow().Bind(wx.EVT_MOTION, handlers.OnMouseMotion)
+        self.GetGridWindow().Bind(wx.EVT_PAINT, handlers.OnPaint)
         self.Bind(wx.grid.EVT_GRID_CELL_LEFT_CLICK, handlers.OnMouseClick)
         self.Bind(wx.EVT_SCROLLWIN, handlers.OnScroll)
         
@@ -168,6 +172,8 @@ class Grid(wx.grid.Grid):
         
         main_window.Bind(EVT_COMMAND_REFRESH_SELECTION, 
                     handlers.OnRefreshSelectedCells)
+        main_window.Bind(EVT_COMMAND_RECALCULATE_PARALLEL, 
+                    handlers.OnRecalculateParallel)
         main_window.Bind(EVT_COMMAND_DISPLAY_GOTO_CELL_DIALOG, 
                     handlers.OnDisplayGoToCellDialog)
         main_window.Bind(EVT_COMMAND_GOTO_CELL, handlers.OnGoToCell)
@@ -197,6 +203,8 @@ class Grid(wx.grid.Grid):
         main_window.Bind(EVT_COMMAND_SHOW_RESIZE_GRID_DIALOG, 
                                                   handlers.OnResizeGridDialog)
         
+        main_window.Bind(EVT_COMMAND_COMPACT_CELL_ATTRIBUTES, 
+                                            handlers.OnCompactCellAttributes)
         main_window.Bind(wx.grid.EVT_GRID_ROW_SIZE, handlers.OnRowSize)
         main_window.Bind(wx.grid.EVT_GRID_COL_SIZE, handlers.OnColSize)
         
@@ -504,6 +512,29 @@ class GridEventHandlers(object):
         grid.actions.on_mouse_over((row, col, tab))
         
         event.Skip()
+    
+    def OnPaint(self, event):
+        """Grid window paint event handler
+        
+        The renderer resolves the visible styles once per paint.
+        
+        """
+        
+        self.grid.grid_renderer.start_paint()
+        
+        event.Skip()
+    
+    def OnIdle(self, event):
+        """Idle event handler that evaluates pending cells"""
+        
+        if self.grid.actions.evaluate_pending_cells():
+            event.RequestMore()
+        
+        elif config["attr_compaction_entries"] is not None:
+            self.grid.actions.compact_cell_attributes(
+                                        config["attr_compaction_entries"])
+        
+        event.Skip()
 
     def OnMouseClick(self, event):
         """Grid left mouse click event handler"""
@@ -612,6 +643,14 @@ class GridEventHandlers(object):
         self.grid.ForceRefresh()
         
         event.Skip()
+    
+    def OnRecalculateParallel(self, event):
+        """Event handler for recalculating all cells in parallel via menu"""
+        
+        self.grid.actions.recalculate_parallel()
+        self.grid.ForceRefresh()
+        
+        event.Skip()
         
     def OnZoomIn(self, event):
         """Event handler for increasing grid zoom"""
@@ -854,6 +893,13 @@ class GridEventHandlers(object):
         event.Skip()
 
     # Grid attribute events 
+    
+    def OnCompactCellAttributes(self, event):
+        """Event handler for compacting cell attributes via menu"""
+        
+        self.grid.actions.compact_cell_attributes()
+        
+        event.Skip()
 
     def OnRowSize(self, event):
         """Row size event handler"""
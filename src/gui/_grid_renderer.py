@@ -53,11 +53,16 @@ class GridRenderer(wx.grid.PyGridCellRenderer):
         
         self.data_array = data_array
         
-        # Background key is (width, height, bgbrush, 
-        # borderwidth_bottom, borderwidth_right, 
-        # bordercolor_bottom, bordercolor_right)
+        # Background key is (width, height, style_id)
         self.backgrounds = {} 
         
+        # Font key is (style_id, zoom)
+        self.fonts = {}
+        
+        # Style ids of the visible cells of the current paint
+        # 2-tuple of block (top, left, bottom, right, tab) and array or None
+        self.paint_style_ids = None
+        
         # Zoom of grid
         self.zoom = 1.0
         
@@ -143,9 +148,11 @@ class GridRenderer(wx.grid.PyGridCellRenderer):
         for distance, __row, __col in grid.colliding_cells(row, col, textbox):
             # Draw blocking arrows if locking cell is not empty
             
+            res = self.data_array.evaluation_queue.get((__row, __col, tab))
+            
             if not( \
                (blocking_distance is None or distance == blocking_distance) \
-               and not self.data_array[__row, __col, tab]):
+               and not res):
                
                 yield __row, __col, tab
 
@@ -170,8 +177,9 @@ class GridRenderer(wx.grid.PyGridCellRenderer):
         for distance, __row, __col in grid.colliding_cells(row, col, textbox):
             
             if blocking_distance is None or distance == blocking_distance:
-                if self.data_array[__row, __col, tab] is not None and \
-                   self.data_array[__row, __col, tab] != "":
+                res = self.data_array.evaluation_queue.get((__row, __col, tab))
+                
+                if res is not None and res != "":
                     blocking_distance = distance
                 else:
                     yield __row, __col, tab
@@ -202,7 +210,8 @@ class GridRenderer(wx.grid.PyGridCellRenderer):
         
         row, col, tab = key
         
-        cell_attributes = self.data_array.cell_attributes[key]
+        style_id = self.get_style_id(key)
+        cell_attributes = self.data_array.cell_attributes.styles[style_id]
         
         # Text font attributes
         textfont = cell_attributes["textfont"]
@@ -225,8 +234,19 @@ class GridRenderer(wx.grid.PyGridCellRenderer):
         
         # Get font from font attribute strings
         
-        font = self.get_font(textfont, pointsize, fontweight, fontstyle, 
-                             underline)
+        font_key = style_id, self.zoom
+        
+        try:
+            font = self.fonts[font_key]
+            
+        except KeyError:
+            if len(self.fonts) > 10000:
+                # self.fonts may grow quickly
+                
+                self.fonts = {}
+            
+            font = self.fonts[font_key] = self.get_font(textfont, pointsize, 
+                                        fontweight, fontstyle, underline)
         
         dc.SetFont(font)
         
@@ -422,11 +442,52 @@ class GridRenderer(wx.grid.PyGridCellRenderer):
                          pen=wx.WHITE_PEN, brush=wx.WHITE_BRUSH)
         self._draw_cursor(dc, grid, row, col)
     
+    def start_paint(self):
+        """Discards the style ids of the previous paint"""
+        
+        self.paint_style_ids = None
+    
+    def resolve_visible_styles(self, grid):
+        """Resolves the styles of all visible cells for the current paint
+        
+        This replaces individual style lookups of the cells of the view.
+        The style ids are kept until start_paint is called, independently 
+        of the size of the style id cache of the cell attributes.
+        
+        """
+        
+        row_slice, col_slice, _ = grid.get_visiblecell_slice()
+        
+        top, left = max(0, row_slice.start), max(0, col_slice.start)
+        bottom, right = row_slice.stop - 1, col_slice.stop - 1
+        tab = grid.current_table
+        
+        style_ids = self.data_array.cell_attributes.get_style_ids(
+                                            top, left, bottom, right, tab)
+        
+        self.paint_style_ids = (top, left, bottom, right, tab), style_ids
+    
+    def get_style_id(self, key):
+        """Returns style id of key, from the current paint if it is visible"""
+        
+        if self.paint_style_ids is not None:
+            (top, left, bottom, right, tab), style_ids = self.paint_style_ids
+            row, col, key_tab = key
+            
+            if key_tab == tab and top <= row <= bottom and \
+               left <= col <= right:
+                return int(style_ids[row - top, col - left])
+        
+        return self.data_array.cell_attributes.get_style_id(key)
+    
     def Draw(self, grid, attr, dc, rect, row, col, isSelected, printing=False):
         """Draws the cell border and content"""
         
         key = (row, col, grid.current_table)
         
+        if not printing and self.paint_style_ids is None:
+            self.resolve_visible_styles(grid)
+        
         if isSelected:
             grid.selection_present = True
             
@@ -435,13 +496,7 @@ class GridRenderer(wx.grid.PyGridCellRenderer):
         else:
             _, _, width, height = grid.CellToRect(row, col)
             
-            bg_components = ["bgcolor", 
-                             "borderwidth_bottom", "borderwidth_right", 
-                             "bordercolor_bottom", "bordercolor_right"]
-            
-            bg_key = tuple([width, height] + \
-                           [self.data_array.cell_attributes[key][bgc] \
-                                            for bgc in bg_components])
+            bg_key = width, height, self.get_style_id(key)
             
             try:
                 bg = self.backgrounds[bg_key]
@@ -464,9 +519,14 @@ class GridRenderer(wx.grid.PyGridCellRenderer):
                 bg.dc, 0, 0, mask_type)
         
         
-        # Check if the dc is drawn manually be a return func
+        # Cells are evaluated in idle time unless printing
+        
+        if printing:
+            res = self.data_array[key]
+        else:
+            res = self.data_array.evaluation_queue.get(key)
         
-        res = self.data_array[row, col, grid.current_table]
+        # Check if the dc is drawn manually be a return func
         
         if type(res) is types.FunctionType:
             # Add func_dict attribute 
@@ -543,16 +603,18 @@ class Background(object):
         rightline = x + w, y, x + w, y + h
         lines = [bottomline, rightline]
         
+        cell_attributes = self.data_array.cell_attributes[key]
+        
         # Bottom line pen
         
-        color = self.data_array.cell_attributes[key]["bordercolor_bottom"]
-        width = self.data_array.cell_attributes[key]["borderwidth_bottom"]
+        color = cell_attributes["bordercolor_bottom"]
+        width = cell_attributes["borderwidth_bottom"]
         bottom_pen = get_pen_from_data((color, width, int(wx.SOLID)))
         
         # Right line pen
         
-        color = self.data_array.cell_attributes[key]["bordercolor_right"]
-        width = self.data_array.cell_attributes[key]["borderwidth_right"]
+        color = cell_attributes["bordercolor_right"]
+        width = cell_attributes["borderwidth_right"]
         right_pen = get_pen_from_data((color, width, int(wx.SOLID)))
         
         borderpens = bottom_pen, right_pen
@@ -222,7 +222,10 @@ class MainMenu(_filledMenu):
             ["Separator"], \
             [item, [ShowResizeGridDialogMsg, "Resize grid", 
                     "Resize the grid. " + \
-                    "The buttom right lowermost cells are deleted first."]]] \
+                    "The buttom right lowermost cells are deleted first."]], \
+            [item, [CompactCellAttributesMsg, "Compact cell attributes", 
+                    "Remove cell attributes that are overridden " + \
+                    "by later ones."]]] \
         ], \
         [wx.Menu, "&View", [ \
             [wx.Menu, "Toolbars", [ \
@@ -251,6 +254,9 @@ class MainMenu(_filledMenu):
             ["Separator"], \
             [item, [RefreshSelectionMsg, "Refresh selected cells\tF5", 
                         "Refresh selected cells even when frozen"]],
+            [item, [RecalculateParallelMsg, "Recalculate all (parallel)", 
+                        "Recalculate all cells. " + \
+                        "Independent cells are evaluated in parallel."]],
             ], \
         ], \
 #        [wx.Menu, "F&ormat", [ \
@@ -32,6 +32,250 @@ from copy import copy
 
 from itertools import izip
 
+import numpy
+
+# Attributes that define the selected cells
+SELECTION_ATTRIBUTES = "block_tl", "block_br", "rows", "cols", "cells"
+
+
+def merge_blocks(blocks):
+    """Returns list of blocks without blocks that are contained in others
+    
+    Blocks that are adjacent and have equal extents are merged.
+    
+    Parameters
+    ----------
+    
+    blocks: Iterable of 4-tuples
+    \tTop, left, bottom and right of each block
+    
+    """
+    
+    blocks = sorted(set(blocks))
+    
+    merged = True
+    
+    while merged:
+        merged = False
+        result = []
+        
+        for block in blocks:
+            top, left, bottom, right = block
+            
+            for i, (r_top, r_left, r_bottom, r_right) in enumerate(result):
+                if r_top <= top and r_left <= left and \
+                   bottom <= r_bottom and right <= r_right:
+                    break
+                
+                if top <= r_top and left <= r_left and \
+                   r_bottom <= bottom and r_right <= right or \
+                   left == r_left and right == r_right and \
+                   top <= r_bottom + 1 and r_top <= bottom + 1 or \
+                   top == r_top and bottom == r_bottom and \
+                   left <= r_right + 1 and r_left <= right + 1:
+                    result[i] = (min(top, r_top), min(left, r_left), 
+                                 max(bottom, r_bottom), max(right, r_right))
+                    merged = True
+                    break
+            
+            else:
+                result.append(block)
+        
+        blocks = sorted(result)
+    
+    return blocks
+
+
+def merge_intervals(intervals):
+    """Returns sorted list of disjoint half open intervals covering intervals
+    
+    Parameters
+    ----------
+    
+    intervals: Iterable of 2-tuples
+    \tStart and stop of each interval
+    
+    """
+    
+    result = []
+    
+    for start, stop in sorted(intervals):
+        if result and start <= result[-1][1]:
+            result[-1] = result[-1][0], max(result[-1][1], stop)
+        else:
+            result.append((start, stop))
+    
+    return result
+
+
+def combine_intervals(intervals_1, intervals_2, operation):
+    """Returns disjoint half open intervals, for which operation is True
+    
+    Parameters
+    ----------
+    
+    intervals_1, intervals_2: List of 2-tuples
+    \tSorted disjoint half open intervals
+    operation: Function
+    \tMaps membership in intervals_1 and intervals_2 to membership in result
+    
+    """
+    
+    def is_in(intervals, point):
+        """Returns True iif point is in intervals"""
+        
+        return any(start <= point < stop for start, stop in intervals)
+    
+    bounds = sorted(set(ele for interval in intervals_1 + intervals_2 
+                            for ele in interval))
+    
+    result = []
+    
+    for start, stop in izip(bounds[:-1], bounds[1:]):
+        if operation(is_in(intervals_1, start), is_in(intervals_2, start)):
+            if result and result[-1][1] == start:
+                result[-1] = result[-1][0], stop
+            else:
+                result.append((start, stop))
+    
+    return result
+
+
+def combine_rectangles(rectangles_1, rectangles_2, operation):
+    """Returns sorted list of disjoint rectangles, for which operation is True
+    
+    The rows are split into bands, in which all rectangles are unchanged.
+    Equal column intervals of consecutive bands form one rectangle.
+    
+    Parameters
+    ----------
+    
+    rectangles_1, rectangles_2: List of 4-tuples
+    \tTop, left, bottom and right of each rectangle, rectangles may overlap
+    operation: Function
+    \tMaps membership in rectangles_1 and rectangles_2 to membership in result
+    
+    """
+    
+    rectangles = rectangles_1 + rectangles_2
+    
+    row_bounds = sorted(set([top for top, _, _, _ in rectangles] + 
+                            [bottom + 1 for _, _, bottom, _ in rectangles]))
+    
+    result = []
+    
+    # Maps column interval to top row of the rectangle that it continues
+    open_intervals = {}
+    
+    for band_top in row_bounds:
+        band_intervals = [merge_intervals((left, right + 1) for 
+                                           top, left, bottom, right in rects
+                                           if top <= band_top <= bottom)
+                          for rects in (rectangles_1, rectangles_2)]
+        
+        intervals = combine_intervals(band_intervals[0], band_intervals[1], 
+                                      operation)
+        
+        last_open_intervals = open_intervals
+        open_intervals = {}
+        
+        for interval in intervals:
+            open_intervals[interval] = \
+                last_open_intervals.pop(interval, band_top)
+        
+        for (start, stop), top in last_open_intervals.iteritems():
+            result.append((top, start, band_top - 1, stop - 1))
+    
+    return sorted(result)
+
+
+class CompiledSelection(object):
+    """Lookup structures of a Selection for fast membership tests
+    
+    Parameters
+    ----------
+    
+    selection: Selection
+    \tSelection that is compiled
+    
+    """
+    
+    def __init__(self, selection):
+        self.signature = selection.get_signature()
+        
+        self.rows = frozenset(selection.rows)
+        self.cols = frozenset(selection.cols)
+        self.cells = frozenset(tuple(cell) for cell in selection.cells)
+        
+        self.blocks = merge_blocks(tuple(top_left) + tuple(bottom_right) 
+                                   for top_left, bottom_right in 
+                                   izip(selection.block_tl, selection.block_br))
+        
+        # Columns of the block array are top, left, bottom and right
+        self.block_array = numpy.array(self.blocks, dtype=int).reshape(-1, 4)
+        
+        self.row_array = numpy.array(sorted(self.rows), dtype=int)
+        self.col_array = numpy.array(sorted(self.cols), dtype=int)
+        
+        # Cells are encoded as row * cell_span + col for array lookups
+        self.cell_span = max(col for _, col in self.cells) + 1 \
+                         if self.cells else 1
+        self.cell_array = numpy.array(sorted(row * self.cell_span + col 
+                                             for row, col in self.cells), 
+                                      dtype=numpy.int64)
+    
+    def __contains__(self, cell):
+        cell_row, cell_col = cell
+        
+        if cell_row in self.rows or cell_col in self.cols or \
+           (cell_row, cell_col) in self.cells:
+            return True
+        
+        for top, left, bottom, right in self.blocks:
+            if top <= cell_row <= bottom and left <= cell_col <= right:
+                return True
+        
+        return False
+    
+    def contains_array(self, rows, cols):
+        """Returns boolean array that is True for cells in the selection
+        
+        Parameters
+        ----------
+        
+        rows: numpy.array of Integer
+        \tRows of the cells
+        cols: numpy.array of Integer
+        \tColumns of the cells, broadcastable to the shape of rows
+        
+        """
+        
+        rows, cols = numpy.broadcast_arrays(numpy.asarray(rows), 
+                                            numpy.asarray(cols))
+        
+        result = numpy.zeros(rows.shape, dtype=bool)
+        
+        for top, left, bottom, right in self.blocks:
+            result |= (top <= rows) & (rows <= bottom) & \
+                      (left <= cols) & (cols <= right)
+        
+        if self.rows:
+            result |= numpy.in1d(rows, self.row_array).reshape(rows.shape)
+        
+        if self.cols:
+            result |= numpy.in1d(cols, self.col_array).reshape(cols.shape)
+        
+        if self.cells:
+            valid = (cols >= 0) & (cols < self.cell_span)
+            codes = rows.astype(numpy.int64) * self.cell_span + cols
+            result |= valid & \
+                      numpy.in1d(codes, self.cell_array).reshape(rows.shape)
+        
+        return result
+
+# End of class CompiledSelection
+
+
 class Selection(object):
     """Represents grid selection
     
@@ -58,6 +302,47 @@ class Selection(object):
         self.cols = cols
         self.cells = cells
     
+    def __setattr__(self, name, value):
+        """Discards compiled lookup structures if the selection changes"""
+        
+        if name in SELECTION_ATTRIBUTES:
+            self.__dict__.pop("_compiled", None)
+        
+        object.__setattr__(self, name, value)
+    
+    def __getstate__(self):
+        """Compiled lookup structures are not pickled"""
+        
+        state = self.__dict__.copy()
+        state.pop("_compiled", None)
+        
+        return state
+    
+    def get_signature(self):
+        """Returns lengths of the selection lists
+        
+        The signature detects lists that are extended in place.
+        
+        """
+        
+        return tuple(len(getattr(self, name)) for name in SELECTION_ATTRIBUTES)
+    
+    def get_compiled(self):
+        """Returns CompiledSelection, which is built on first use"""
+        
+        try:
+            compiled = self._compiled
+            
+            if compiled.signature == self.get_signature():
+                return compiled
+        
+        except AttributeError:
+            pass
+        
+        compiled = self._compiled = CompiledSelection(self)
+        
+        return compiled
+    
     def __nonzero__(self):
         """Returns True iif any attribute is non-empty"""
         
@@ -86,6 +371,110 @@ class Selection(object):
         else:
             return False
     
+    def _get_bounded_rectangles(self, bounds):
+        """Returns list of rectangles of the selection inside bounds
+        
+        Rectangles may overlap.
+        
+        """
+        
+        (b_top, b_left), (b_bottom, b_right) = bounds
+        
+        rectangles = \
+            [tuple(top_left) + tuple(bottom_right) for top_left, bottom_right
+                                in izip(self.block_tl, self.block_br)] + \
+            [(row, b_left, row, b_right) for row in self.rows] + \
+            [(b_top, col, b_bottom, col) for col in self.cols] + \
+            [(row, col, row, col) for row, col in self.cells]
+        
+        bounded_rectangles = []
+        
+        for top, left, bottom, right in rectangles:
+            top, left = max(top, b_top), max(left, b_left)
+            bottom, right = min(bottom, b_bottom), min(right, b_right)
+            
+            if top <= bottom and left <= right:
+                bounded_rectangles.append((top, left, bottom, right))
+        
+        return bounded_rectangles
+    
+    def get_rectangles(self, bounds):
+        """Returns sorted list of disjoint rectangles that cover the selection
+        
+        Parameters
+        ----------
+        
+        bounds: 2-tuple of 2-tuple of Integer
+        \tTop left and bottom right cell, to which rectangles are clipped
+        
+        """
+        
+        return combine_rectangles(self._get_bounded_rectangles(bounds), [],
+                                  lambda in_1, in_2: in_1)
+    
+    def _combine(self, other, bounds, operation):
+        """Returns block Selection of the cells, for which operation is True"""
+        
+        rectangles = combine_rectangles(self._get_bounded_rectangles(bounds),
+                                        other._get_bounded_rectangles(bounds),
+                                        operation)
+        
+        return Selection([(top, left) for top, left, _, _ in rectangles], 
+                         [(bottom, right) for _, _, bottom, right in rectangles],
+                         [], [], [])
+    
+    def union(self, other, bounds):
+        """Returns Selection of the cells in self or other
+        
+        The result consists of disjoint blocks.
+        
+        Parameters
+        ----------
+        
+        other: Selection
+        \tSelection that is combined with self
+        bounds: 2-tuple of 2-tuple of Integer
+        \tTop left and bottom right cell, to which the result is clipped
+        
+        """
+        
+        return self._combine(other, bounds, lambda in_1, in_2: in_1 or in_2)
+    
+    def intersection(self, other, bounds):
+        """Returns Selection of the cells in self and other
+        
+        Parameters are the same as for union.
+        
+        """
+        
+        return self._combine(other, bounds, lambda in_1, in_2: in_1 and in_2)
+    
+    def difference(self, other, bounds):
+        """Returns Selection of the cells in self but not in other
+        
+        Parameters are the same as for union.
+        
+        """
+        
+        return self._combine(other, bounds, 
+                             lambda in_1, in_2: in_1 and not in_2)
+    
+    def iter_cells(self, bounds):
+        """Yields row, column tuples of each selected cell inside bounds
+        
+        Parameters
+        ----------
+        
+        bounds: 2-tuple of 2-tuple of Integer
+        \tTop left and bottom right cell, e.g. the used range of a table
+        
+        """
+        
+        for top, left, bottom, right in self.get_rectangles(bounds):
+            for row in xrange(top, bottom + 1):
+                for col in xrange(left, right + 1):
+                    yield row, col
+    
     def __contains__(self, cell):
         """Returns True iif cell is in selection
         
@@ -99,26 +488,22 @@ class Selection(object):
         
         assert len(cell) == 2
         
-        cell_row, cell_col = cell
-        
-        # Block selections
-        for top_left, bottom_right in izip(self.block_tl, self.block_br):
-            top, left = top_left
-            bottom, right = bottom_right
-            
-            if top <= cell_row <= bottom and left <= cell_col <= right:
-                return True
+        return cell in self.get_compiled()
+    
+    def contains_array(self, rows, cols):
+        """Returns boolean array that is True for cells in the selection
         
-        # Row and column selections
+        Parameters
+        ----------
         
-        if cell_row in self.rows or cell_col in self.cols:
-            return True
+        rows: numpy.array of Integer
+        \tRows of the cells
+        cols: numpy.array of Integer
+        \tColumns of the cells, broadcastable to the shape of rows
         
-        # Cell selections
-        if cell in self.cells:
-            return True
+        """
         
-        return False
+        return self.get_compiled().contains_array(rows, cols)
         
     def __add__(self, value):
         """Shifts selection down and / or right
@@ -214,7 +599,7 @@ class Selection(object):
                 bb_left = left
             if bb_bottom is None or bb_bottom < bottom:
                 bb_bottom = bottom
-            if bb_right is None or bb_right > right:
+            if bb_right is None or bb_right < right:
                 bb_right = right
         
         # Row and column selections
@@ -23,6 +23,8 @@ from sys import path, modules
 path.insert(0, "..") 
 path.insert(0, "../..") 
 
+import numpy
+
 from lib.selection import Selection
 import actions._grid_actions
 
@@ -72,6 +74,79 @@ class TestSelection(object):
         
         # Test cell selection
     
+    def test_contains_changed(self):
+        """Membership follows changes of the selection"""
+        
+        assert (1, 1) not in self.selection
+        
+        self.selection.cells.append((1, 1))
+        
+        assert (1, 1) in self.selection
+        
+        self.selection.rows = [7]
+        
+        assert (7, 0) in self.selection
+        assert (7, 0) not in self.selection + (1, 0)
+    
+    def test_contains_array(self):
+        """Vectorized membership equals single cell membership"""
+        
+        selection = Selection([(2, 1), (4, 1), (0, 0)], [(3, 3), (6, 3), 
+                              (1, 1)], [9], [7], [(5, 5), (12, 0)])
+        
+        assert selection.get_compiled().blocks == [(0, 0, 1, 1), (2, 1, 6, 3)]
+        
+        rows, cols = numpy.ogrid[0:14, 0:10]
+        mask = selection.contains_array(rows, cols)
+        
+        for row in xrange(14):
+            for col in xrange(10):
+                assert mask[row, col] == ((row, col) in selection)
+    
+    def test_get_rectangles(self):
+        """Rectangles are disjoint and cover the selection inside bounds"""
+        
+        selection = Selection([(0, 0), (1, 1)], [(2, 2), (3, 3)], [6], [], 
+                              [(3, 0)])
+        
+        assert selection.get_rectangles(((0, 0), (9, 4))) == \
+            [(0, 0, 0, 2), (1, 0, 3, 3), (6, 0, 6, 4)]
+        
+        assert selection.get_rectangles(((2, 2), (5, 5))) == [(2, 2, 3, 3)]
+    
+    def test_algebra(self):
+        """Union, intersection and difference equal the cell set operations"""
+        
+        selection_1 = Selection([(1, 1), (5, 2)], [(4, 6), (8, 3)], [10], [], 
+                                [(0, 0)])
+        selection_2 = Selection([(3, 3)], [(6, 9)], [], [2], [(1, 1)])
+        
+        bounds = (0, 0), (11, 11)
+        
+        cells = [(row, col) for row in xrange(12) for col in xrange(12)]
+        cells_1 = set(cell for cell in cells if cell in selection_1)
+        cells_2 = set(cell for cell in cells if cell in selection_2)
+        
+        for result, result_cells in [
+                (selection_1.union(selection_2, bounds), cells_1 | cells_2),
+                (selection_1.intersection(selection_2, bounds), 
+                 cells_1 & cells_2),
+                (selection_1.difference(selection_2, bounds), 
+                 cells_1 - cells_2)]:
+            
+            assert not result.rows and not result.cols and not result.cells
+            assert len(list(result.iter_cells(bounds))) == len(result_cells)
+            assert set(result.iter_cells(bounds)) == result_cells
+    
+    def test_iter_cells(self):
+        """Cells are clipped to bounds and yielded once"""
+        
+        selection = Selection([(0, 0)], [(5, 5)], [], [1], [(2, 2)])
+        
+        cells = list(selection.iter_cells(((4, 0), (7, 1))))
+        
+        assert cells == [(4, 0), (4, 1), (5, 0), (5, 1), (6, 1), (7, 1)]
+    
     def test_insert(self):
         pass
     
@@ -86,3 +161,7 @@ class TestSelection(object):
         bbox_tl, bbox_br = selection.get_bbox() 
         assert bbox_tl == sel_tl[0]
         assert bbox_br == sel_br[0]
+        
+        selection = self.SelectionCls([(4, 5), (2, 7)], [(100, 200), (3, 250)],
+                                      [], [], [])
+        assert selection.get_bbox() == ((2, 5), (100, 250))
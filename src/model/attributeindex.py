@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2008 Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+
+Attributeindex
+==============
+
+Attributeindex contains the spatial index of the cell attribute selections.
+
+Provides
+--------
+
+ * BUCKET_SHAPE: Default number of rows and columns of an index bucket
+ * AttributeIndex: Spatial index of the selections of cell attributes
+
+"""
+
+from itertools import izip
+
+BUCKET_SHAPE = 64, 16
+
+
+class AttributeIndex(object):
+    """Spatial index of the selections of cell attribute entries
+
+    Entries are identified by their position in the cell attribute list.
+    Selected rows, columns and cells are indexed in dicts. Selection blocks
+    are indexed in the buckets that they overlap. Blocks that overlap more
+    than max_buckets buckets are kept in a list per table, which is
+    searched linearly.
+
+    Parameters
+    ----------
+    bucket_shape: 2-tuple of Integer, defaults to BUCKET_SHAPE
+    \tNumber of rows and columns of a bucket
+    max_buckets: Integer, defaults to 256
+    \tMaximum number of buckets, in which a block is indexed
+
+    """
+
+    def __init__(self, bucket_shape=BUCKET_SHAPE, max_buckets=256):
+        self.bucket_shape = bucket_shape
+        self.max_buckets = max_buckets
+
+        # Map (tab, row), (tab, col) and (tab, row, col) to entry lists
+        self.rows = {}
+        self.cols = {}
+        self.cells = {}
+
+        # Maps (tab, bucket_row, bucket_col) to list of block entries
+        self.buckets = {}
+
+        # Maps tab to list of block entries that overlap many buckets
+        self.large_blocks = {}
+
+    def _iter_lists(self, selection, tab):
+        """Yields 3-tuples of dict, key and item for each index entry"""
+
+        bucket_rows, bucket_cols = self.bucket_shape
+
+        for row in selection.rows:
+            yield self.rows, (tab, row), None
+
+        for col in selection.cols:
+            yield self.cols, (tab, col), None
+
+        for row, col in selection.cells:
+            yield self.cells, (tab, row, col), None
+
+        for (top, left), (bottom, right) in izip(selection.block_tl,
+                                                 selection.block_br):
+            block = top, left, bottom, right
+
+            bucket_row_range = xrange(top // bucket_rows,
+                                      bottom // bucket_rows + 1)
+            bucket_col_range = xrange(left // bucket_cols,
+                                      right // bucket_cols + 1)
+
+            if len(bucket_row_range) * len(bucket_col_range) > \
+               self.max_buckets:
+                yield self.large_blocks, tab, block
+                continue
+
+            for bucket_row in bucket_row_range:
+                for bucket_col in bucket_col_range:
+                    yield self.buckets, (tab, bucket_row, bucket_col), block
+
+    def add(self, index, selection, tab):
+        """Adds the entry with position index to the index
+
+        Entries must be added in the order of their positions.
+
+        """
+
+        for lists, key, block in self._iter_lists(selection, tab):
+            item = index if block is None else (index, block)
+
+            try:
+                lists[key].append(item)
+
+            except KeyError:
+                lists[key] = [item]
+
+    def remove_last(self, selection, tab):
+        """Removes the most recently added entry from the index
+
+        selection and tab must be unchanged since the entry was added.
+
+        """
+
+        for lists, key, _ in self._iter_lists(selection, tab):
+            entries = lists[key]
+            entries.pop()
+
+            if not entries:
+                del lists[key]
+
+    def get_indices(self, key):
+        """Returns sorted list of the entries whose selection contains key
+
+        Parameters
+        ----------
+        key: 3-tuple of Integer
+        \tRow, column and table of the cell
+
+        """
+
+        row, col, tab = key
+        bucket_rows, bucket_cols = self.bucket_shape
+
+        indices = set(self.rows.get((tab, row), ()))
+        indices.update(self.cols.get((tab, col), ()))
+        indices.update(self.cells.get((tab, row, col), ()))
+
+        bucket_key = tab, row // bucket_rows, col // bucket_cols
+
+        for blocks in [self.buckets.get(bucket_key, ()),
+                       self.large_blocks.get(tab, ())]:
+            for index, (top, left, bottom, right) in blocks:
+                if top <= row <= bottom and left <= col <= right:
+                    indices.add(index)
+
+        return sorted(indices)
+
+    def get_indices_in(self, top, left, bottom, right, tab):
+        """Returns sorted list of entries whose selection may overlap a block
+
+        The list may contain entries that do not overlap the block.
+
+        Parameters
+        ----------
+        top, left, bottom, right: Integer
+        \tTop left and bottom right cell of the block
+        tab: Integer
+        \tTable of the block
+
+        """
+
+        bucket_rows, bucket_cols = self.bucket_shape
+
+        indices = set()
+
+        for row in xrange(top, bottom + 1):
+            indices.update(self.rows.get((tab, row), ()))
+
+            for col in xrange(left, right + 1):
+                indices.update(self.cells.get((tab, row, col), ()))
+
+        for col in xrange(left, right + 1):
+            indices.update(self.cols.get((tab, col), ()))
+
+        for bucket_row in xrange(top // bucket_rows,
+                                 bottom // bucket_rows + 1):
+            for bucket_col in xrange(left // bucket_cols,
+                                     right // bucket_cols + 1):
+                indices.update(index for index, _ in
+                               self.buckets.get((tab, bucket_row, bucket_col),
+                                                ()))
+
+        indices.update(index for index, _ in self.large_blocks.get(tab, ()))
+
+        return sorted(indices)
+
+# End of class AttributeIndex
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2008 Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+
+Cellcode
+========
+
+Cellcode contains the analysis of cell code strings into cell programs
+and a bounded cache that shares these programs between cells.
+
+Provides
+--------
+
+ * split_assignment: Splits cell code into global name and expression
+ * parse_literal: Decodes immutable literal cell code without compiling it
+ * CellProgram: Analysed and compiled cell code
+ * ProgramCache: Bounded, code string keyed LRU cache of CellPrograms
+
+"""
+
+import ast
+from collections import OrderedDict
+
+from dependencies import References, get_tree_references
+
+OPERATORS = ["+", "-", "*", "**", "/", "//",
+             "%", "<<", ">>", "&", "|", "^", "~",
+             "<", ">", "<=", ">=", "==", "!=", "<>",
+            ]
+
+# Types of literal results that may be shared between cells
+IMMUTABLE_LITERAL_TYPES = (int, long, float, complex, str, unicode, bool,
+                           type(None))
+
+
+def has_assignment(split_code):
+    """Returns True iif split code is a global assignment
+
+    Assignment is valid iif
+     * only one term in front of "=" and
+     * no "==" and
+     * no operators left and
+     * parentheses balanced
+
+    Parameters
+    ----------
+    split_code: List of strings
+    \tCell code split at "="
+
+    """
+
+    return len(split_code) > 1 and \
+           len(split_code[0].split()) == 1 and \
+           split_code[1] != "" and \
+           (not max(op in split_code[0] for op in OPERATORS)) and \
+           split_code[0].count("(") == split_code[0].count(")")
+
+
+def split_assignment(code):
+    """Returns 2-tuple of global variable name or None and expression"""
+
+    split_code = code.split("=")
+
+    if has_assignment(split_code):
+        return split_code[0].strip(), "=".join(split_code[1:])
+
+    else:
+        return None, code
+
+
+def is_immutable_literal(value):
+    """Returns True if value is an immutable literal value"""
+
+    if type(value) is tuple:
+        return all(is_immutable_literal(ele) for ele in value)
+
+    return type(value) in IMMUTABLE_LITERAL_TYPES
+
+
+def parse_literal(code):
+    """Returns 2-tuple (is_literal, value) for cell code
+    
+    Code is literal iif it is no global assignment and consists only of an
+    immutable Python literal. The code is parsed but not compiled.
+    
+    Parameters
+    ----------
+    code: String
+    \tCell code
+    
+    """
+    
+    if split_assignment(code)[0] is not None:
+        return False, None
+    
+    try:
+        # eval strips leading spaces and tabs, so we do the same
+        value = ast.literal_eval(code.lstrip(" \t"))
+        
+    except (SyntaxError, ValueError, TypeError):
+        return False, None
+    
+    if is_immutable_literal(value):
+        return True, value
+    
+    return False, None
+
+
+class CellProgram(object):
+    """Analysed and compiled cell code
+
+    A CellProgram does not depend on the cell position, so that all cells
+    with identical code share one program.
+
+    Parameters
+    ----------
+    code: String
+    \tCell code
+
+    Attributes
+    ----------
+    glob_var: String or None
+    \tName of the global variable that is assigned by the cell
+    code_object: Code object or None
+    \tCompiled expression, None if the expression does not compile
+    error: Exception or None
+    \tCompilation error
+    references: References object
+    \tCell references of the expression
+    is_literal: Bool
+    \tTrue if the code is an immutable literal without assignment
+    literal_value: Object
+    \tValue of the literal if is_literal
+
+    """
+
+    def __init__(self, code):
+        self.code = code
+
+        self.glob_var, expression = split_assignment(code)
+
+        self.code_object = None
+        self.error = None
+        self.references = References()
+        self.is_literal = False
+        self.literal_value = None
+
+        try:
+            # eval strips leading spaces and tabs, so we do the same
+            tree = ast.parse(expression.lstrip(" \t"), mode="eval")
+            self.code_object = compile(tree, "<cell>", "eval")
+
+        except Exception, err:
+            self.error = err
+            return
+
+        self.references = get_tree_references(tree)
+
+        if self.glob_var is None:
+            try:
+                value = ast.literal_eval(tree)
+
+            except (ValueError, TypeError):
+                # Not a literal
+                return
+
+            if is_immutable_literal(value):
+                self.is_literal = True
+                self.literal_value = value
+
+    def __repr__(self):
+        return "CellProgram(" + repr(self.code) + ")"
+
+# End of class CellProgram
+
+
+class ProgramCache(object):
+    """Bounded least recently used cache of CellPrograms keyed by code
+
+    Missing programs are created on access.
+
+    Parameters
+    ----------
+    maxsize: Integer
+    \tMaximum number of programs in the cache
+
+    Attributes
+    ----------
+    hits: Integer
+    \tNumber of accesses that found the program in the cache
+    misses: Integer
+    \tNumber of accesses that created a new program
+    evictions: Integer
+    \tNumber of programs that have been removed from the full cache
+
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.programs = OrderedDict()
+
+        self.reset_stats()
+
+    def __len__(self):
+        return len(self.programs)
+
+    def __contains__(self, code):
+        return code in self.programs
+
+    def __getitem__(self, code):
+        """Returns CellProgram for code"""
+
+        try:
+            program = self.programs.pop(code)
+            self.hits += 1
+
+        except KeyError:
+            program = CellProgram(code)
+            self.misses += 1
+
+            if len(self.programs) >= self.maxsize:
+                self.programs.popitem(last=False)
+                self.evictions += 1
+
+        # Most recently used programs are at the end
+        self.programs[code] = program
+
+        return program
+
+    def clear(self):
+        """Empties the cache"""
+
+        self.programs.clear()
+
+    def reset_stats(self):
+        """Resets hit, miss and eviction counters"""
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def hit_rate(self):
+        """Ratio of hits and accesses, None if there is no access"""
+
+        accesses = self.hits + self.misses
+
+        if accesses:
+            return float(self.hits) / accesses
+
+# End of class ProgramCache
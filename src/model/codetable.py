@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2008 Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+
+Codetable
+=========
+
+Codetable contains the intern table for cell code.
+
+Provides
+--------
+
+ * CodeTable: Shared code strings with reference counts
+ * StoreCodeTable: Code table of stores that count shared code themselves
+
+"""
+
+
+# Characters that start string literals
+QUOTES = "'\""
+
+
+def is_plain_literal(code):
+    """Returns True if code is a number or starts like a string literal
+
+    The test is cheap and does not parse the code.
+
+    """
+
+    try:
+        code = code.strip()
+
+    except AttributeError:
+        # Code that is no string is not a literal
+        return False
+
+    if code and code[0] in QUOTES:
+        return True
+
+    try:
+        float(code)
+
+    except ValueError:
+        return False
+
+    return True
+
+
+class CodeTable(object):
+    """Intern table for cell code
+
+    Cells with equal code share one string object from the table.
+    Each code string is kept as long as cells reference it.
+    Plain literals such as numbers are not interned because they are 
+    mostly unique, so that table entries would only add memory.
+
+    Attributes
+    ----------
+    codes: Dict
+    \tMaps code to the shared code string
+    refcounts: Dict
+    \tMaps code to the number of cells that reference it if there are
+    \tmore than one. Other codes are referenced once.
+
+    """
+
+    def __init__(self):
+        self.codes = {}
+        self.refcounts = {}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, code):
+        return code in self.codes
+
+    def intern(self, code):
+        """Returns the shared string that equals code and references it"""
+
+        try:
+            shared_code = self.codes[code]
+
+        except KeyError:
+            if not is_plain_literal(code):
+                self.codes[code] = code
+
+            return code
+
+        self.refcounts[code] = self.refcounts.get(code, 1) + 1
+
+        return shared_code
+
+    def release(self, code):
+        """Removes a reference to code, unused code is removed
+
+        Code that is not in the table, e.g. because it has been stored
+        before the table was created, is ignored.
+
+        """
+
+        if code not in self.codes:
+            return
+
+        refcount = self.refcounts.pop(code, 1) - 1
+
+        if refcount > 1:
+            self.refcounts[code] = refcount
+
+        elif not refcount:
+            del self.codes[code]
+
+    def get_shared_codes(self):
+        """Returns list of the codes that are referenced more than once"""
+
+        return [self.codes[code] for code in self.refcounts]
+
+    def copy(self):
+        """Returns a copy of the table that shares the code strings"""
+
+        code_table = CodeTable()
+
+        code_table.codes.update(self.codes)
+        code_table.refcounts.update(self.refcounts)
+
+        return code_table
+
+    def clear(self):
+        """Removes all code"""
+
+        self.codes.clear()
+        self.refcounts.clear()
+
+# End of class CodeTable
+
+
+class StoreCodeTable(object):
+    """Code table of stores that keep cell code on disk
+
+    Interning would keep every code in memory, which the store avoids.
+    Therefore, code is not interned. Shared codes are counted by the store.
+
+    Parameters
+    ----------
+    store: Object with get_shared_codes method, e.g. SqliteStore
+    \tStore of the cell code
+
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def intern(self, code):
+        """Returns code"""
+
+        return code
+
+    def release(self, code):
+        """Does nothing because code is not referenced"""
+
+    def get_shared_codes(self):
+        """Returns list of the codes that are stored more than once"""
+
+        return self.store.get_shared_codes()
+
+    def clear(self):
+        """Does nothing because the store removes its code"""
+
+# End of class StoreCodeTable
@@ -0,0 +1,741 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2008 Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+
+Dependencies
+============
+
+Dependencies contains the cell reference parser and the DependencyGraph
+class that maps cells to the cells that they reference.
+
+Provides
+--------
+
+ * get_references: Static analysis of cell references in code
+ * get_tree_references: Static analysis of cell references in an ast
+ * References: Position independent result of get_references
+ * is_in_range: Checks if a cell key is inside a resolved range
+ * reads_cells: Checks if macros may read cells
+ * RangeIndex: Spatial index of the ranges that cells reference
+ * get_strongly_connected_component: Cells that reference each other
+ * DependencyGraph: Precedents / dependents graph of grid cells
+
+"""
+
+import ast
+import __builtin__
+
+from attributeindex import BUCKET_SHAPE
+
+# Names that evaluate to the current cell position, mapped onto their axis
+POSITION_NAMES = {"X": 0, "Y": 1, "Z": 2, "R": 0, "C": 1, "T": 2}
+
+
+class References(object):
+    """Position independent cell references of one piece of cell code
+
+    Each axis component of a reference is a 2-tuple (axis, offset).
+    If axis is None then offset is an absolute index.
+    Otherwise, offset is relative to the position of the evaluated cell
+    along axis, i. e. X+1 is represented by (0, 1).
+
+    Parameters
+    ----------
+
+    cells: List of 3-tuples of components
+    \tSingle cell references such as S[X-1, Y, Z]
+    ranges: List of 3-tuples of 2-tuples of components or None
+    \tSlice references such as S[:, 1, 0], None is an open boundary
+    names: Frozenset of strings
+    \tGlobal names that are read by the code
+    volatile: Bool
+    \tTrue if the code may read cells that cannot be determined statically
+    calls: Bool
+    \tTrue if the code calls functions that may be defined in the macros
+
+    """
+
+    def __init__(self, cells=None, ranges=None, names=None, volatile=False,
+                 calls=False):
+        self.cells = [] if cells is None else cells
+        self.ranges = [] if ranges is None else ranges
+        self.names = frozenset() if names is None else frozenset(names)
+        self.volatile = volatile
+        self.calls = calls
+
+    def __repr__(self):
+        return "References" + repr((self.cells, self.ranges,
+                                    sorted(self.names), self.volatile,
+                                    self.calls))
+
+    def get_cells(self, key):
+        """Returns list of referenced cell keys for cell key"""
+
+        return [resolve_reference(ref, key) for ref in self.cells]
+
+    def get_ranges(self, key):
+        """Returns list of referenced ranges for cell key
+
+        Each range is a 3-tuple of (lower, upper) with inclusive lower and
+        exclusive upper bounds. Open bounds are None.
+
+        """
+
+        def resolve_bound(component):
+            """Returns index for component, None stays None"""
+
+            if component is None:
+                return
+
+            axis, offset = component
+            index = offset if axis is None else key[axis] + offset
+
+            # Negative indices count from the end, so the bound is left open
+            if index >= 0:
+                return index
+
+        return [tuple((resolve_bound(lower), resolve_bound(upper))
+                      for lower, upper in rng) for rng in self.ranges]
+
+# End of class References
+
+
+def resolve_reference(ref, key):
+    """Returns absolute key for reference ref as seen from cell key"""
+
+    return tuple(offset if axis is None else key[axis] + offset
+                 for axis, offset in ref)
+
+
+def _get_bound_names(tree):
+    """Returns set of the names that are bound inside of an ast
+
+    Comprehension targets, lambda and function arguments and function 
+    names are bound. Scopes are ignored, which is conservative.
+
+    """
+
+    bound_names = set()
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and \
+           isinstance(node.ctx, (ast.Store, ast.Param)):
+            bound_names.add(node.id)
+
+        elif isinstance(node, ast.arguments):
+            bound_names.update(name for name in (node.vararg, node.kwarg)
+                               if name is not None)
+
+        elif isinstance(node, ast.FunctionDef):
+            bound_names.add(node.name)
+
+    return bound_names
+
+
+def _get_component(node, bound_names=()):
+    """Returns (axis, offset) for an index expression node or None
+
+    None is returned if the node cannot be resolved statically.
+    Position names in bound_names are not the cell position.
+
+    """
+
+    if isinstance(node, ast.Num) and type(node.n) in (int, long):
+        return None, node.n
+
+    elif isinstance(node, ast.Name) and node.id in POSITION_NAMES:
+        if node.id not in bound_names:
+            return POSITION_NAMES[node.id], 0
+
+    elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        operand = _get_component(node.operand, bound_names)
+        if operand is not None and operand[0] is None:
+            return None, -operand[1]
+
+    elif isinstance(node, ast.BinOp) and \
+         isinstance(node.op, (ast.Add, ast.Sub)):
+        left = _get_component(node.left, bound_names)
+        right = _get_component(node.right, bound_names)
+
+        if left is None or right is None:
+            return
+
+        if isinstance(node.op, ast.Sub):
+            if right[0] is not None:
+                # X - Y is not a position
+                return
+            return left[0], left[1] - right[1]
+
+        if left[0] is not None and right[0] is not None:
+            # X + Y is not a position
+            return
+
+        axis = right[0] if left[0] is None else left[0]
+        return axis, left[1] + right[1]
+
+
+def _get_index_nodes(slice_node):
+    """Returns list of index or slice nodes of a subscript or None"""
+
+    if isinstance(slice_node, ast.Index):
+        if isinstance(slice_node.value, ast.Tuple):
+            return [ast.Index(value=elt) for elt in slice_node.value.elts]
+
+    elif isinstance(slice_node, ast.ExtSlice):
+        return slice_node.dims
+
+
+def _get_subscript_reference(node, bound_names=()):
+    """Returns ("cell", ref) or ("range", ref) for S subscript node or None
+
+    Position names in bound_names make the subscript unresolvable.
+
+    """
+
+    index_nodes = _get_index_nodes(node.slice)
+
+    if index_nodes is None or len(index_nodes) != 3:
+        return
+
+    # Each element is either ("index", component) or ("slice", bounds)
+    elements = []
+
+    for index_node in index_nodes:
+        if isinstance(index_node, ast.Index):
+            component = _get_component(index_node.value, bound_names)
+            if component is None:
+                return
+            elements.append(("index", component))
+
+        elif isinstance(index_node, ast.Slice):
+            bounds = []
+            for bound_node in index_node.lower, index_node.upper:
+                if bound_node is None:
+                    bounds.append(None)
+                else:
+                    component = _get_component(bound_node, bound_names)
+                    if component is None:
+                        return
+                    bounds.append(component)
+
+            elements.append(("slice", tuple(bounds)))
+
+        else:
+            return
+
+    if all(kind == "index" for kind, _ in elements):
+        return "cell", tuple(component for _, component in elements)
+
+    # Single indices become ranges of length 1
+
+    range_ref = []
+    for kind, element in elements:
+        if kind == "index":
+            axis, offset = element
+            range_ref.append(((axis, offset), (axis, offset + 1)))
+        else:
+            range_ref.append(element)
+
+    return "range", tuple(range_ref)
+
+
+def get_references(expression):
+    """Returns References object for a cell expression
+
+    Parameters
+    ----------
+
+    expression: String
+    \tCell code without global assignment
+
+    """
+
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+
+    except (SyntaxError, TypeError, ValueError):
+        # Code that does not parse does not reference anything
+        return References()
+
+    return get_tree_references(tree)
+
+
+def get_tree_references(tree):
+    """Returns References object for the abstract syntax tree of an expression
+
+    Parameters
+    ----------
+
+    tree: ast.Expression
+    \tParsed cell expression
+
+    """
+
+    cells = []
+    ranges = []
+    names = set()
+    volatile = False
+    calls = False
+
+    # Name nodes of S that are part of a resolved subscript
+    resolved_s_nodes = set()
+
+    # Position names that are bound, e.g. by a comprehension, are not the
+    # cell position. Subscripts that use them are volatile.
+    bound_names = _get_bound_names(tree).intersection(POSITION_NAMES)
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Subscript) and \
+           isinstance(node.value, ast.Name) and node.value.id == "S":
+            reference = _get_subscript_reference(node, bound_names)
+
+            if reference is not None:
+                ref_type, ref = reference
+                if ref_type == "cell":
+                    cells.append(ref)
+                else:
+                    ranges.append(ref)
+                resolved_s_nodes.add(id(node.value))
+
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) \
+             and not hasattr(__builtin__, node.func.id):
+            # Macro function calls may access any cell
+            calls = True
+
+        if isinstance(node, ast.Name) and node.id != "S" and \
+           node.id not in POSITION_NAMES:
+            names.add(node.id)
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id == "S" and \
+           id(node) not in resolved_s_nodes:
+            # S is used in a way that is not statically resolvable
+            volatile = True
+            break
+
+    return References(cells, ranges, names, volatile, calls)
+
+
+def is_in_range(key, rng):
+    """Returns True if key is inside the range rng of References.get_ranges"""
+
+    for key_ele, (lower, upper) in zip(key, rng):
+        if lower is not None and key_ele < lower:
+            return False
+        if upper is not None and key_ele >= upper:
+            return False
+
+    return True
+
+
+def reads_cells(macros):
+    """Returns True if functions that are defined in macros may read cells
+
+    Parameters
+    ----------
+
+    macros: String
+    \tMacro code
+
+    """
+
+    try:
+        tree = ast.parse(macros)
+
+    except (SyntaxError, TypeError, ValueError):
+        # Macros that do not parse do not define functions
+        return False
+
+    return any(isinstance(node, ast.Name) and node.id == "S"
+               for node in ast.walk(tree))
+
+
+class RangeIndex(object):
+    """Spatial index of the ranges that cells reference
+
+    Ranges are indexed per table in the buckets that they overlap, similar
+    to the selections in AttributeIndex. Ranges that are open towards the
+    bottom or the right or that overlap more than max_buckets buckets are
+    kept in a list per table. Ranges over more than max_tables tables are
+    kept with the table None.
+
+    Each list is a dict that maps the key of the referencing cell to the
+    list of its ranges in the bucket.
+
+    Parameters
+    ----------
+    bucket_shape: 2-tuple of Integer, defaults to BUCKET_SHAPE
+    \tNumber of rows and columns of a bucket
+    max_buckets: Integer, defaults to 256
+    \tMaximum number of buckets, in which a range is indexed
+    max_tables: Integer, defaults to 16
+    \tMaximum number of tables, in which a range is indexed
+
+    """
+
+    def __init__(self, bucket_shape=BUCKET_SHAPE, max_buckets=256,
+                 max_tables=16):
+        self.bucket_shape = bucket_shape
+        self.max_buckets = max_buckets
+        self.max_tables = max_tables
+
+        # Maps (tab, bucket_row, bucket_col) to dict of ranges
+        self.buckets = {}
+
+        # Maps tab or None to dict of ranges that overlap many buckets
+        self.large_ranges = {}
+
+    def _iter_lists(self, rng):
+        """Yields 2-tuples of dict and key of the lists that contain rng"""
+
+        bucket_rows, bucket_cols = self.bucket_shape
+        (row_lower, row_upper), (col_lower, col_upper), (tab_lower, tab_upper) \
+            = rng
+
+        if tab_lower is not None and tab_upper is not None and \
+           tab_upper - tab_lower <= self.max_tables:
+            tabs = xrange(tab_lower, tab_upper)
+        else:
+            tabs = [None]
+
+        if row_upper is None or col_upper is None:
+            bucket_row_range = bucket_col_range = None
+
+        else:
+            bucket_row_range = xrange((row_lower or 0) // bucket_rows,
+                                      (row_upper - 1) // bucket_rows + 1)
+            bucket_col_range = xrange((col_lower or 0) // bucket_cols,
+                                      (col_upper - 1) // bucket_cols + 1)
+
+            if len(bucket_row_range) * len(bucket_col_range) > \
+               self.max_buckets or tabs == [None]:
+                bucket_row_range = bucket_col_range = None
+
+        for tab in tabs:
+            if bucket_row_range is None:
+                yield self.large_ranges, tab
+                continue
+
+            for bucket_row in bucket_row_range:
+                for bucket_col in bucket_col_range:
+                    yield self.buckets, (tab, bucket_row, bucket_col)
+
+    def add(self, key, rng):
+        """Adds range rng that is referenced by cell key"""
+
+        for lists, list_key in self._iter_lists(rng):
+            lists.setdefault(list_key, {}).setdefault(key, []).append(rng)
+
+    def remove(self, key, rng):
+        """Removes all ranges of cell key from the lists of rng"""
+
+        for lists, list_key in self._iter_lists(rng):
+            entries = lists.get(list_key)
+
+            if entries is not None:
+                entries.pop(key, None)
+
+                if not entries:
+                    del lists[list_key]
+
+    def get_lists(self, key):
+        """Returns list of 2-tuples of list id and list that may contain key
+
+        Each list is a dict that maps referencing cells to their ranges.
+
+        Parameters
+        ----------
+        key: 3-tuple of Integer
+        \tRow, column and table of the cell
+
+        """
+
+        row, col, tab = key
+        bucket_rows, bucket_cols = self.bucket_shape
+
+        bucket_key = tab, row // bucket_rows, col // bucket_cols
+
+        candidates = [(("bucket", bucket_key), self.buckets.get(bucket_key)),
+                      (("large", tab), self.large_ranges.get(tab)),
+                      (("large", None), self.large_ranges.get(None))]
+
+        return [(list_id, entries) for list_id, entries in candidates
+                if entries]
+
+    def get_dependents(self, key):
+        """Returns set of keys of cells that reference a range containing key
+        """
+
+        return set(dependent for _, entries in self.get_lists(key)
+                   for dependent, ranges in entries.iteritems()
+                   if any(is_in_range(key, rng) for rng in ranges))
+
+# End of class RangeIndex
+
+
+def get_strongly_connected_component(key, get_precedents):
+    """Returns set of keys of the strongly connected component of key
+
+    The component consists of key and all cells that key depends on,
+    which in turn depend on key.
+
+    Parameters
+    ----------
+    key: 3-tuple of Integer
+    \tKey of a cell in the component
+    get_precedents: Function
+    \tReturns iterable of keys of the cells that a cell key references
+
+    """
+
+    # Cells that key depends on
+
+    precedents = {}
+    stack = [key]
+
+    while stack:
+        node = stack.pop()
+        if node not in precedents:
+            precedents[node] = get_precedents(node)
+            stack.extend(precedents[node])
+
+    # Cells among these that depend on key
+
+    dependents = {}
+    for node, node_precedents in precedents.iteritems():
+        for precedent in node_precedents:
+            dependents.setdefault(precedent, []).append(node)
+
+    component = set([key])
+    stack = [key]
+
+    while stack:
+        for node in dependents.get(stack.pop(), ()):
+            if node not in component:
+                component.add(node)
+                stack.append(node)
+
+    return component
+
+
+class DependencyGraph(object):
+    """Precedents and dependents graph of grid cells
+
+    Cells are registered with their references when they are evaluated.
+    The graph answers which cells have to be invalidated when a cell changes.
+
+    Attributes
+    ----------
+    precedents: Dict
+    \tMaps cell key to set of keys of the cells that it references
+    dependents: Dict
+    \tMaps cell key to set of keys of the cells that reference it
+    ranges: Dict
+    \tMaps cell key to list of ranges that the cell references
+    range_index: RangeIndex
+    \tSpatial index of the ranges
+    volatile: Set
+    \tKeys of cells whose references cannot be determined statically
+    callers: Set
+    \tKeys of cells that call functions, which may be macros
+    macros_read_cells: Bool
+    \tTrue if macro functions may read cells, which makes callers volatile
+
+    """
+
+    def __init__(self):
+        self.precedents = {}
+        self.dependents = {}
+        self.ranges = {}
+        self.range_index = RangeIndex()
+        self.volatile = set()
+        self.callers = set()
+        self.macros_read_cells = False
+
+        # Global names that are read and assigned by cells
+        self.readers = {} # Maps name to set of keys
+        self.names = {} # Maps key to frozenset of names
+        self.assignments = {} # Maps key to assigned global name
+
+    def __contains__(self, key):
+        return key in self.names
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, key, references, glob_var=None):
+        """Registers cell key with its References, replaces old registration
+
+        Parameters
+        ----------
+        key: 3-tuple of Integer
+        \tKey of the cell that is registered
+        references: References object
+        \tReferences of the cell code
+        glob_var: String or None
+        \tName of the global variable that the cell assigns
+
+        """
+
+        self.remove(key)
+
+        precedents = set(references.get_cells(key))
+        self.precedents[key] = precedents
+        for precedent in precedents:
+            self.dependents.setdefault(precedent, set()).add(key)
+
+        if references.ranges:
+            ranges = self.ranges[key] = references.get_ranges(key)
+            for rng in ranges:
+                self.range_index.add(key, rng)
+
+        if references.volatile:
+            self.volatile.add(key)
+
+        if references.calls:
+            self.callers.add(key)
+
+        self.names[key] = references.names
+        for name in references.names:
+            self.readers.setdefault(name, set()).add(key)
+
+        if glob_var is not None:
+            self.assignments[key] = glob_var
+
+    def remove(self, key):
+        """Unregisters cell key"""
+
+        for precedent in self.precedents.pop(key, ()):
+            dependents = self.dependents[precedent]
+            dependents.discard(key)
+            if not dependents:
+                del self.dependents[precedent]
+
+        for rng in self.ranges.pop(key, ()):
+            self.range_index.remove(key, rng)
+
+        self.volatile.discard(key)
+        self.callers.discard(key)
+
+        for name in self.names.pop(key, ()):
+            readers = self.readers[name]
+            readers.discard(key)
+            if not readers:
+                del self.readers[name]
+
+        self.assignments.pop(key, None)
+
+    def clear(self):
+        """Removes all registrations, macros_read_cells is kept"""
+
+        macros_read_cells = self.macros_read_cells
+        self.__init__()
+        self.macros_read_cells = macros_read_cells
+
+    def get_direct_dependents(self, key):
+        """Returns set of keys of cells that directly depend on key"""
+
+        direct_dependents = set(self.dependents.get(key, ()))
+        direct_dependents.update(self.range_index.get_dependents(key))
+
+        if key in self.assignments:
+            direct_dependents.update(
+                self.readers.get(self.assignments[key], ()))
+
+        return direct_dependents
+
+    def get_dirty(self, keys, names=()):
+        """Returns set of cells that have to be invalidated if keys change
+
+        The result comprises keys, their transitive dependents and all
+        volatile cells together with their transitive dependents.
+        Cells that call functions are volatile if macro functions may
+        read cells.
+
+        Range lists are compacted while the graph is traversed so that each
+        range is tested at most once per dirty cell in its bucket and
+        ranges of dirty cells are not tested again.
+
+        Parameters
+        ----------
+        keys: Iterable of 3-tuples of Integer
+        \tKeys of changed cells
+        names: Iterable of strings, defaults to ()
+        \tGlobal names that are assigned by the new code of changed cells
+
+        """
+
+        dirty = set(keys)
+        dirty.update(self.volatile)
+
+        if self.macros_read_cells:
+            dirty.update(self.callers)
+
+        for name in names:
+            dirty.update(self.readers.get(name, ()))
+
+        stack = list(dirty)
+
+        # Maps list id to the remaining (dependent, ranges) items of the list
+        pending = {}
+
+        def add(dependent):
+            """Marks dependent as dirty"""
+
+            if dependent not in dirty:
+                dirty.add(dependent)
+                stack.append(dependent)
+
+        while stack:
+            key = stack.pop()
+
+            for dependent in self.dependents.get(key, ()):
+                add(dependent)
+
+            if key in self.assignments:
+                for dependent in self.readers.get(self.assignments[key], ()):
+                    add(dependent)
+
+            for list_id, entries in self.range_index.get_lists(key):
+                try:
+                    items = pending[list_id]
+                except KeyError:
+                    items = entries.items()
+
+                remaining = []
+
+                for item in items:
+                    dependent, ranges = item
+
+                    if dependent in dirty:
+                        continue
+
+                    if any(is_in_range(key, rng) for rng in ranges):
+                        add(dependent)
+                    else:
+                        remaining.append(item)
+
+                pending[list_id] = remaining
+
+        return dirty
+
+# End of class DependencyGraph
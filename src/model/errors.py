@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2008 Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+
+Errors
+======
+
+Errors contains the exceptions that are results of cell evaluation.
+
+Provides
+--------
+
+ * CircularReferenceError: Result of all cells of a reference cycle
+ * EvaluationTimeoutError: Result of a cell that exceeded its time budget
+
+"""
+
+
+class CircularReferenceError(KeyError):
+    """Result of all cells of a reference cycle"""
+
+    pass
+
+# End of class CircularReferenceError
+
+
+class EvaluationTimeoutError(Exception):
+    """Result of a cell that exceeded its evaluation time budget"""
+
+    pass
+
+# End of class EvaluationTimeoutError
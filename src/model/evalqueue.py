@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2008 Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+
+Evalqueue
+=========
+
+Evalqueue contains the queue of cells that are evaluated in idle time
+so that displaying the grid does not wait for cell evaluation.
+
+Provides
+--------
+
+ * PENDING: Placeholder result of a cell that waits for evaluation
+ * EvaluationQueue: Queue of cells that are evaluated in idle time
+
+"""
+
+from collections import deque, OrderedDict
+import time
+
+
+class Pending(object):
+    """Placeholder result of a cell that waits for evaluation"""
+
+    def __repr__(self):
+        return "PENDING"
+
+    def __unicode__(self):
+        return u"..."
+
+    __str__ = __repr__
+
+# End of class Pending
+
+PENDING = Pending()
+
+
+class EvaluationQueue(object):
+    """Queue of cells that are evaluated in idle time
+
+    Cells that have been requested for display are evaluated first.
+    Afterwards, all other cells without result are evaluated in the
+    background.
+
+    Parameters
+    ----------
+    code_array: CodeArray
+    \tCodeArray, in which the cells are evaluated
+
+    """
+
+    def __init__(self, code_array):
+        self.code_array = code_array
+
+        # Keys of requested cells in order of request
+        self.requested = OrderedDict()
+
+        # Keys of all other cells, None if they have not been collected
+        self.background = None
+
+    def __nonzero__(self):
+        """Returns True if any cell may wait for evaluation"""
+
+        return bool(self.requested) or self.background is None or \
+               bool(self.background)
+
+    def reset(self):
+        """Marks all cells for background evaluation after result changes"""
+
+        self.background = None
+
+    def add(self, keys):
+        """Queues cells for background evaluation after their results changed
+
+        Parameters
+        ----------
+        keys: Iterable of 3-tuples of Integer
+        \tKeys of the cells that have lost their results
+
+        """
+
+        # Cells are collected anyway if background is None
+        if self.background is not None:
+            self.background.extend(keys)
+
+    def get(self, key):
+        """Returns result of cell key or PENDING if it needs evaluation
+
+        Pending cells are queued for evaluation.
+
+        """
+
+        code_array = self.code_array
+
+        if code_array.is_evaluated(key):
+            return code_array[key]
+
+        self.requested[key] = None
+
+        return PENDING
+
+    def _pop(self):
+        """Returns 2-tuple of next key or None and True if it was requested"""
+
+        if self.requested:
+            return self.requested.popitem(last=False)[0], True
+
+        if self.background is None:
+            self.background = deque(self.code_array.keys())
+
+        if self.background:
+            return self.background.popleft(), False
+
+        return None, False
+
+    def evaluate(self, duration, visible_slice=None):
+        """Evaluates queued cells and returns keys of finished cells
+
+        Finished cells comprise all requested cells that have been
+        evaluated and all background cells that have been evaluated now.
+
+        Parameters
+        ----------
+        duration: Float
+        \tTime in seconds, after which no further cell is evaluated
+        visible_slice: 3-tuple of slice or None, defaults to None
+        \tRequested cells outside of visible_slice are deferred to the
+        \tbackground. None keeps all requested cells.
+
+        """
+
+        if visible_slice is not None:
+            for key in self.requested.keys():
+                if not all(slc.start <= key_ele < slc.stop
+                           for key_ele, slc in zip(key, visible_slice)):
+                    del self.requested[key]
+
+                    if self.background is not None:
+                        self.background.appendleft(key)
+
+        code_array = self.code_array
+
+        finished_keys = []
+
+        end_time = time.time() + duration
+
+        while time.time() < end_time:
+            key, is_requested = self._pop()
+
+            if key is None:
+                break
+
+            if is_requested:
+                code_array[key]
+                finished_keys.append(key)
+
+            elif not code_array.is_evaluated(key):
+                code_array[key]
+                finished_keys.append(key)
+
+        return finished_keys
+
+# End of class EvaluationQueue
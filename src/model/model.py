@@ -30,15 +30,17 @@ It is divided into layers.
 Layer 3: CodeArray
 Layer 2: DataArray
 Layer 1: DictGrid
-Layer 0: KeyValueStore
+Layer 0: TileStore, SqliteStore or KeyValueStore
 
 """
 
 import ast
+from collections import OrderedDict
 from copy import copy
 import cStringIO
-from itertools import imap, product
+from itertools import imap, izip, product
 import sys
+import time
 from types import SliceType
 
 import numpy
@@ -53,6 +55,17 @@ from lib.typechecks import is_slice_like, is_string_like, is_generator_like
 from lib.selection import Selection
 
 from unredo import UnRedo
+from dependencies import DependencyGraph, is_in_range
+from dependencies import get_strongly_connected_component, reads_cells
+from cellcode import ProgramCache, parse_literal, split_assignment
+from recalculation import Recalculation
+from evalqueue import EvaluationQueue
+from errors import CircularReferenceError, EvaluationTimeoutError
+from resultcache import ResultCache, MISSING
+from tilestore import TileStore
+from codetable import CodeTable, StoreCodeTable
+from attributeindex import AttributeIndex
+from styles import Style, StyleRegistry
 
 class KeyValueStore(dict):
     """Key-Value store in memory. Currently a dict with default value None.
@@ -65,6 +78,44 @@ class KeyValueStore(dict):
         """Returns the default value None"""
         
         return
+    
+    def iteritems_in(self, start, stop):
+        """Returns iterator over key, value pairs inside a box
+        
+        Parameters
+        ----------
+        start: 3-tuple of Integer
+        \tSmallest row, column and table of the box
+        stop: 3-tuple of Integer
+        \tRow, column and table behind the box
+        
+        """
+        
+        return ((key, value) for key, value in self.items()
+                if all(lower <= ele < upper 
+                       for ele, lower, upper in izip(key, start, stop)))
+    
+    def get_used_range(self, tab):
+        """Returns bounding box of the cells of table tab or None if empty
+        
+        The bounding box is a 2-tuple of top left and bottom right cell.
+        
+        """
+        
+        keys = [key for key in self if key[2] == tab]
+        
+        if not keys:
+            return
+        
+        rows = [row for row, _, _ in keys]
+        cols = [col for _, col, _ in keys]
+        
+        return (min(rows), min(cols)), (max(rows), max(cols))
+    
+    def snapshot(self):
+        """Returns a shallow copy of the store"""
+        
+        return KeyValueStore(self)
         
 # End of class KeyValueStore
 
@@ -80,6 +131,17 @@ class CellAttributes(list):
     The class provides attribute read access to single cells via __getitem__
     Otherwise it behaves similar to a list.
     
+    Attribute dicts of entries and of cells are shared Style objects from 
+    the StyleRegistry styles. Only dicts with a frozen attribute are not 
+    shared because the frozen cell results are updated in place.
+    Styles of cells do not contain frozen results. Their frozen attribute
+    is True for frozen cells. The result is read from the entry.
+    
+    Read access uses a spatial index of the selections. It is updated when
+    entries are appended or popped from the end. Other changes of the list
+    rebuild the index on the next read. Changes of selections or tables of
+    entries require a call of clear_index.
+    
     Note that for the method undoable_append to work, unredo has to be
     defined as class attribute.
     
@@ -106,9 +168,146 @@ class CellAttributes(list):
         "frozen": False,
     }
     
-    # Cache for __getattr__ maps key to tuple of len and attr_dict
+    def __init__(self, *args):
+        list.__init__(self, *args)
+        
+        self._index = None
+        
+        # Indices of the entries with a frozen attribute, built with _index
+        self._frozen_indices = set()
+        
+        self.styles = StyleRegistry()
+        
+        # Cache for get_style_id maps key to style id
+        # Least recently used keys are at the beginning.
+        self._attr_cache = OrderedDict()
+        self._max_attr_cache = config["max_attr_cache_cells"]
+        
+        # Number of entries after the last compaction
+        self.compacted_length = 0
+    
+    def _get_index(self):
+        """Returns AttributeIndex of all entries, which is built on demand
+        
+        The indices of the entries with a frozen attribute are collected 
+        together with the index.
+        
+        """
+        
+        if self._index is None:
+            self._index = AttributeIndex()
+            self._frozen_indices = set()
+            
+            for index, (selection, tab, attr_dict) in enumerate(self):
+                self._index.add(index, selection, tab)
+                
+                if "frozen" in attr_dict:
+                    self._frozen_indices.add(index)
+        
+        return self._index
+    
+    def clear_index(self):
+        """Marks index for rebuilding after entries have been changed
+        
+        The attribute cache is emptied.
+        
+        """
+        
+        self._index = None
+        self._attr_cache.clear()
+    
+    def _invalidate_cache(self, selection, tab):
+        """Removes cached attributes of the cells of selection in table tab"""
+        
+        keys = [key for key in self._attr_cache if key[2] == tab]
+        
+        if not keys:
+            return
+        
+        key_array = numpy.array(keys)
+        invalid = selection.contains_array(key_array[:, 0], key_array[:, 1])
+        
+        for key, is_invalid in izip(keys, invalid):
+            if is_invalid:
+                del self._attr_cache[key]
+    
+    def _share(self, attr_dict):
+        """Returns shared Style for attr_dict unless it is frozen"""
+        
+        if "frozen" in attr_dict:
+            return attr_dict
+        
+        return self.styles[self.styles.get_style_id(attr_dict)]
+    
+    def append(self, value):
+        """Appends entry and adds it to the index"""
+        
+        selection, tab, attr_dict = value
+        
+        list.append(self, (selection, tab, self._share(attr_dict)))
+        
+        if self._index is not None:
+            self._index.add(len(self) - 1, selection, tab)
+            
+            if "frozen" in attr_dict:
+                self._frozen_indices.add(len(self) - 1)
+        
+        self._invalidate_cache(selection, tab)
+    
+    def extend(self, values):
+        """Appends entries and adds them to the index"""
+        
+        for value in values:
+            self.append(value)
+    
+    def __iadd__(self, values):
+        self.extend(values)
+        
+        return self
+    
+    def pop(self, *index):
+        """Removes entry at index, which defaults to the last entry"""
+        
+        if index and index[0] not in (-1, len(self) - 1):
+            self.clear_index()
+            
+            return list.pop(self, *index)
+        
+        value = list.pop(self)
+        
+        selection, tab, _ = value
+        
+        if self._index is not None:
+            self._index.remove_last(selection, tab)
+            self._frozen_indices.discard(len(self))
+        
+        self._invalidate_cache(selection, tab)
+        
+        return value
+    
+    def __setitem__(self, index, value):
+        list.__setitem__(self, index, value)
+        self.clear_index()
+    
+    def __delitem__(self, index):
+        list.__delitem__(self, index)
+        self.clear_index()
+    
+    def __setslice__(self, start, stop, values):
+        list.__setslice__(self, start, stop, values)
+        self.clear_index()
     
-    _attr_cache = {}
+    def __delslice__(self, start, stop):
+        list.__delslice__(self, start, stop)
+        self.clear_index()
+    
+    def insert(self, index, value):
+        list.insert(self, index, value)
+        self.clear_index()
+    
+    def remove(self, value):
+        list.remove(self, value)
+        self.clear_index()
     
     def undoable_append(self, value):
         """Appends item to list and provides undo and redo functionality"""
@@ -122,30 +321,316 @@ class CellAttributes(list):
         
         self.append(value)
     
+    def _get_entries_style_id(self, indices):
+        """Returns id of the Style of a cell that is covered by entries
+        
+        Frozen results are replaced by True so that refreshes of frozen 
+        cells do not add styles.
+        
+        Parameters
+        ----------
+        indices: Iterable of Integer
+        \tSorted indices of the entries that cover the cell
+        
+        """
+        
+        result_dict = copy(self.default_cell_attributes)
+        
+        for index in indices:
+            result_dict.update(list.__getitem__(self, index)[2])
+        
+        if result_dict["frozen"] is not False:
+            result_dict["frozen"] = True
+        
+        return self.styles.get_style_id(result_dict)
+    
+    def get_style_id(self, key):
+        """Returns id of the Style of a single key in styles"""
+        
+        try:
+            style_id = self._attr_cache.pop(key)
+            
+        except KeyError:
+            style_id = self._get_entries_style_id(
+                self._get_index().get_indices(key))
+            
+            if len(self._attr_cache) >= self._max_attr_cache:
+                self._attr_cache.popitem(last=False)
+        
+        # Most recently used keys are at the end
+        self._attr_cache[key] = style_id
+        
+        return style_id
+    
+    def has_style_id(self, key):
+        """Returns True if the style id of key is cached"""
+        
+        return key in self._attr_cache
+    
+    def _get_mask(self, selection, top, left, bottom, right):
+        """Returns boolean array of the cells of a block that are selected"""
+        
+        rows, cols = numpy.ogrid[top:bottom + 1, left:right + 1]
+        
+        return selection.contains_array(rows, cols)
+    
+    def get_style_ids(self, top, left, bottom, right, tab):
+        """Returns array of the style ids of all cells of a block
+        
+        The block is resolved in one pass over the entries that overlap it.
+        The style ids are cached as far as the cache size permits.
+        
+        Parameters
+        ----------
+        top, left, bottom, right: Integer
+        \tTop left and bottom right cell of the block
+        tab: Integer
+        \tTable of the block
+        
+        """
+        
+        # Each cell has a label of the entries that cover it
+        labels = numpy.zeros((bottom - top + 1, right - left + 1), dtype=int)
+        
+        # Maps label to tuple of entry indices
+        label_entries = [()]
+        
+        for index in self._get_index().get_indices_in(top, left, bottom, 
+                                                       right, tab):
+            selection = list.__getitem__(self, index)[0]
+            
+            mask = self._get_mask(selection, top, left, bottom, right)
+            
+            if not mask.any():
+                continue
+            
+            old_labels, inverse = numpy.unique(labels[mask], 
+                                               return_inverse=True)
+            
+            new_labels = []
+            
+            for label in old_labels:
+                new_labels.append(len(label_entries))
+                label_entries.append(label_entries[label] + (index,))
+            
+            labels[mask] = numpy.array(new_labels)[inverse]
+        
+        # Resolve the styles of all labels
+        
+        label_style_ids = numpy.empty(len(label_entries), dtype=int)
+        
+        for label, indices in enumerate(label_entries):
+            label_style_ids[label] = self._get_entries_style_id(indices)
+        
+        style_ids = label_style_ids[labels]
+        
+        # Update cache
+        
+        if style_ids.size <= self._max_attr_cache:
+            for (row, col), style_id in numpy.ndenumerate(style_ids):
+                key = top + row, left + col, tab
+                
+                self._attr_cache.pop(key, None)
+                
+                if len(self._attr_cache) >= self._max_attr_cache:
+                    self._attr_cache.popitem(last=False)
+                
+                self._attr_cache[key] = int(style_id)
+        
+        return style_ids
+    
+    def get_frozen(self, key):
+        """Returns frozen result of a single key or False if not frozen
+        
+        The result is looked up in the index of the entries, so that the 
+        style id cache is not changed.
+        
+        """
+        
+        index = self._get_index()
+        
+        if not self._frozen_indices:
+            return False
+        
+        for entry_index in reversed(index.get_indices(key)):
+            if entry_index in self._frozen_indices:
+                return list.__getitem__(self, entry_index)[2]["frozen"]
+        
+        return False
+    
     def __getitem__(self, key):
-        """Returns attribute dict for a single key"""
+        """Returns attribute dict for a single key
+        
+        The attribute dict is a Style, which cannot be changed. For frozen
+        cells, it is a dict copy of the Style with the frozen result.
+        
+        """
         
         assert not any(type(key_ele) is SliceType for key_ele in key)
         
-        if key in self._attr_cache:
-           cache_len, cache_dict = self._attr_cache[key]
-           
-           # Use cache result only if no new attrs have been defined 
-           if cache_len == len(self):
-               return cache_dict
+        style = self.styles[self.get_style_id(key)]
         
-        row, col, tab  = key
+        if style["frozen"] is False:
+            return style
         
-        result_dict = copy(self.default_cell_attributes)
+        attr_dict = dict(style)
+        attr_dict["frozen"] = self.get_frozen(key)
+        
+        return attr_dict
+    
+    def _covers(self, outer, inner):
+        """Returns True if Selection outer contains all cells of inner
+        
+        The test is conservative, i.e. False may be returned for some
+        selections that are covered.
+        
+        """
+        
+        outer_rows = set(outer.rows)
+        outer_cols = set(outer.cols)
+        outer_blocks = zip(outer.block_tl, outer.block_br)
+        
+        def covers_block(top, left, bottom, right):
+            """Returns True if block is in outer"""
+            
+            for (o_top, o_left), (o_bottom, o_right) in outer_blocks:
+                if o_top <= top and o_left <= left and \
+                   bottom <= o_bottom and right <= o_right:
+                    return True
+            
+            if bottom - top < len(outer_rows) and \
+               all(row in outer_rows for row in xrange(top, bottom + 1)):
+                return True
+            
+            if right - left < len(outer_cols) and \
+               all(col in outer_cols for col in xrange(left, right + 1)):
+                return True
+            
+            return False
+        
+        return all(row in outer_rows for row in inner.rows) and \
+               all(col in outer_cols for col in inner.cols) and \
+               all(cell in outer for cell in inner.cells) and \
+               all(covers_block(top, left, bottom, right) 
+                   for (top, left), (bottom, right) 
+                   in izip(inner.block_tl, inner.block_br))
+    
+    def _get_any_cell(self, selection):
+        """Returns a cell of selection that is on every covering selection"""
+        
+        if selection.block_tl:
+            return selection.block_tl[0]
+        
+        elif selection.rows:
+            return selection.rows[0], 0
+        
+        elif selection.cols:
+            return 0, selection.cols[0]
+        
+        elif selection.cells:
+            return selection.cells[0]
+    
+    def _is_shadowed(self, index, stop):
+        """Returns True if later entries before stop override entry index"""
+        
+        selection, tab, attr_dict = list.__getitem__(self, index)
+        
+        cell = self._get_any_cell(selection)
+        
+        if cell is None:
+            # Empty selections do not change any cell
+            return True
+        
+        # Later entries that may cover the selection
+        candidates = [list.__getitem__(self, i) for i in 
+                      self._get_index().get_indices(cell + (tab,))
+                      if index < i < stop]
+        
+        uncovered_attrs = set(attr_dict)
+        
+        for c_selection, _, c_attr_dict in candidates:
+            if uncovered_attrs.intersection(c_attr_dict) and \
+               self._covers(c_selection, selection):
+                uncovered_attrs.difference_update(c_attr_dict)
+                
+                if not uncovered_attrs:
+                    return True
+        
+        return not uncovered_attrs
+    
+    def _merge(self, entry_1, entry_2):
+        """Returns merged entry of two consecutive entries or None
+        
+        Entries are merged if they have the same table and if either their 
+        selections or their attributes are equal. Frozen entries must
+        have single cell selections and are not merged by attributes.
         
-        for selection, table, attr_dict in self:
-            if tab == table and (row, col) in selection:
-                result_dict.update(attr_dict)
+        """
+        
+        selection_1, tab_1, attr_dict_1 = entry_1
+        selection_2, tab_2, attr_dict_2 = entry_2
+        
+        if tab_1 != tab_2:
+            return
+        
+        if selection_1 == selection_2:
+            attr_dict = dict(attr_dict_1)
+            attr_dict.update(attr_dict_2)
+            
+            return selection_1, tab_1, self._share(attr_dict)
+        
+        if attr_dict_1 == attr_dict_2 and "frozen" not in attr_dict_1:
+            selection = Selection(selection_1.block_tl + selection_2.block_tl,
+                                  selection_1.block_br + selection_2.block_br,
+                                  selection_1.rows + selection_2.rows,
+                                  selection_1.cols + selection_2.cols,
+                                  selection_1.cells + selection_2.cells)
+            
+            return selection, tab_1, attr_dict_1
+    
+    def compact(self, stop=None):
+        """Removes redundant entries, which does not alter cell attributes
+        
+        Entries that are overridden by later entries are removed. 
+        Consecutive entries with equal selections or attributes are merged.
+        
+        Parameters
+        ----------
+        stop: Integer, defaults to None
+        \tOnly entries before stop are compacted. None compacts all entries.
+        
+        Returns
+        -------
+        Number of removed entries
+        
+        """
+        
+        if stop is None:
+            stop = len(self)
         
-        # Upddate cache with current length and dict
-        self._attr_cache[key] = (len(self), result_dict)
+        entries = []
         
-        return result_dict
+        for index in xrange(stop):
+            if self._is_shadowed(index, stop):
+                continue
+            
+            entry = list.__getitem__(self, index)
+            
+            merged_entry = entries and self._merge(entries[-1], entry)
+            
+            if merged_entry:
+                entries[-1] = merged_entry
+            else:
+                entries.append(entry)
+        
+        no_removed = stop - len(entries)
+        
+        if no_removed:
+            self[:stop] = entries
+        
+        self.compacted_length = len(self)
+        
+        return no_removed
 
 # End of class CellAttributes
 
@@ -178,6 +663,21 @@ class ParserMixin(object):
         
         self[key] = code
     
+    def parse_to_code_dictionary(self, line):
+        """Parses line and adds code to the code dictionary"""
+        
+        index, code = self._split_tidy(line, maxsplit=1)
+        
+        self.code_dictionary[int(index)] = code
+    
+    def parse_to_grid_reference(self, line):
+        """Parses line and inserts code from the code dictionary"""
+        
+        row, col, tab, index = self._split_tidy(line)
+        key = self._get_key(row, col, tab)
+        
+        self[key] = self.code_dictionary[int(index)]
+    
     def parse_to_attribute(self, line):
         """Parses line and appends cell attribute"""
         
@@ -188,8 +688,19 @@ class ParserMixin(object):
         
         tab = int(splitline[5])
         
+        if len(splitline) == 7:
+            # Reference to the styles section
+            attrs = self.style_dictionary[int(splitline[6])]
+        else:
+            attrs = self._get_attr_dict(splitline[6:])
+                
+        self.cell_attributes.append((selection, tab, attrs))
+    
+    def _get_attr_dict(self, strings):
+        """Returns attribute dict from alternating key and value strings"""
+        
         attrs = {}
-        for col, ele in enumerate(splitline[6:]):
+        for col, ele in enumerate(strings):
             if col % 2:
                 # Even cols are values
                 attrs[key] = ast.literal_eval(ele)
@@ -197,8 +708,16 @@ class ParserMixin(object):
             else:
                 # Odd entries are keys
                 key = ast.literal_eval(ele)
-                
-        self.cell_attributes.append((selection, tab, attrs))
+        
+        return attrs
+    
+    def parse_to_style(self, line):
+        """Parses line and adds attribute dict to the style dictionary"""
+        
+        splitline = self._split_tidy(line)
+        
+        self.style_dictionary[int(splitline[0])] = \
+            self._get_attr_dict(splitline[1:])
 
 
     def parse_to_height(self, line):
@@ -234,10 +753,20 @@ class StringGeneratorMixin(object):
     def grid_to_strings(self):
         """Yields a string that represents the grid content for saving
         
+        Code that is shared by several cells is written once to the code
+        dictionary. These cells are stored as references to the index of
+        their code.
+        
         Format
         ------
         [shape]
         rows\tcols\ttabs\n
+        [code_dictionary]
+        index\tcode\n
+        ...
+        [grid_references]
+        row\tcol\ttab\tindex\n
+        ...
         [grid]
         row\tcol\ttab\tcode\n
         row\tcol\ttab\tcode\n
@@ -248,28 +777,91 @@ class StringGeneratorMixin(object):
         yield u"[shape]\n"
         yield u"\t".join(map(unicode, self.shape)) + u"\n"
         
-        yield u"[grid]\n"
+        shared_codes = self.code_table.get_shared_codes()
+        
+        # Maps code to index in the code dictionary
+        indices = {}
         
-        for key in self:
-            key_str = u"\t".join(repr(ele) for ele in key)
-            code_str = unicode(self[key])
+        if shared_codes:
+            yield u"[code_dictionary]\n"
             
-            yield key_str + u"\t" + code_str + u"\n"
+            for index, code in enumerate(shared_codes):
+                indices[code] = index
+                
+                yield unicode(index) + u"\t" + unicode(code) + u"\n"
+            
+            yield u"[grid_references]\n"
+            
+            for key, code in self.iteritems():
+                if code in indices:
+                    key_str = u"\t".join(repr(ele) for ele in key)
+                    
+                    yield key_str + u"\t" + unicode(indices[code]) + u"\n"
+        
+        yield u"[grid]\n"
+        
+        for key, code in self.iteritems():
+            if code not in indices:
+                key_str = u"\t".join(repr(ele) for ele in key)
+                code_str = unicode(code)
+                
+                yield key_str + u"\t" + code_str + u"\n"
     
 
 
     def attributes_to_strings(self):
         """Yields a string that represents the cell attributes for saving
         
+        Styles that are used by several entries are written once to the 
+        styles section. These entries reference the index of their style.
+        
         Format
         ------
         
+        [styles]
+        index\tkey\tvalue\t...\tkey\tvalue\n
+        ...
         [attributes]
         selection[0]\t...\tselection[5]\ttab\tkey\tvalue\t...\tkey\tvalue\n
+        selection[0]\t...\tselection[5]\ttab\tindex\n
         ...
         
         """
         
+        def get_attr_dict_list(attr_dict):
+            """Returns list of alternating keys and values"""
+            
+            attr_dict_list = []
+            for key in attr_dict:
+                attr_dict_list.append(key)
+                attr_dict_list.append(attr_dict[key])
+            
+            return attr_dict_list
+        
+        # Count styles that are shared by entries
+        
+        style_counts = {}
+        
+        for _, _, attr_dict in self.cell_attributes:
+            if isinstance(attr_dict, Style):
+                style_id = attr_dict.style_id
+                style_counts[style_id] = style_counts.get(style_id, 0) + 1
+        
+        # Maps style id to index in the styles section
+        indices = {}
+        
+        for style_id in sorted(style_counts):
+            if style_counts[style_id] > 1:
+                if not indices:
+                    yield u"[styles]\n"
+                
+                index = indices[style_id] = len(indices)
+                style = self.cell_attributes.styles[style_id]
+                
+                line_list = map(repr, [index] + get_attr_dict_list(style))
+                
+                yield u"\t".join(line_list) + u"\n"
+        
         yield u"[attributes]\n"
         
         for selection, tab, attr_dict in self.cell_attributes:
@@ -278,10 +870,10 @@ class StringGeneratorMixin(object):
                         
             tab_list = [tab]
             
-            attr_dict_list = []
-            for key in attr_dict:
-                attr_dict_list.append(key)
-                attr_dict_list.append(attr_dict[key])
+            if getattr(attr_dict, "style_id", None) in indices:
+                attr_dict_list = [indices[attr_dict.style_id]]
+            else:
+                attr_dict_list = get_attr_dict_list(attr_dict)
                 
             line_list = map(repr, sel_list + tab_list + attr_dict_list)
             
@@ -343,7 +935,7 @@ class StringGeneratorMixin(object):
 
 # End of class StringGeneratorMixin
 
-class DictGrid(KeyValueStore, ParserMixin, StringGeneratorMixin):
+class DictGrid(ParserMixin, StringGeneratorMixin):
     """The core data class with all information that is stored in a pys file.
     
     Besides grid code access via standard dict operations, it provides 
@@ -352,17 +944,24 @@ class DictGrid(KeyValueStore, ParserMixin, StringGeneratorMixin):
     * cell_attributes: Stores cell formatting attributes
     * macros:          String of all macros
     
+    Grid code is kept in a layer 0 store.
+    
     This class represents layer 1 of the model.
     
     Parameters
     ----------
     shape: n-tuple of integer
     \tShape of the grid
+    store: TileStore, SqliteStore or KeyValueStore, defaults to TileStore
+    \tLayer 0 store of the grid code
     
     """
        
-    def __init__(self, shape):
-        KeyValueStore.__init__(self)
+    def __init__(self, shape, store=None):
+        if store is None:
+            store = TileStore()
+        
+        self.store = store
         
         self.shape = shape
         
@@ -373,6 +972,30 @@ class DictGrid(KeyValueStore, ParserMixin, StringGeneratorMixin):
         self.row_heights = {} # Keys have the format (row, table)
         self.col_widths = {}  # Keys have the format (col, table)
     
+    def _get_store(self):
+        return self._store
+    
+    def _set_store(self, store):
+        self._store = store
+        
+        # Maps tables to bounding boxes of their cells, None if empty
+        # Missing tables are computed from the store on demand.
+        self._used_ranges = {}
+        
+        # Shared code strings of the cells that are set via the grid.
+        # Stores that keep the code on disk count shared code themselves.
+        if hasattr(store, "get_shared_codes"):
+            self.code_table = StoreCodeTable(store)
+        else:
+            self.code_table = CodeTable()
+        
+        # Map indices of the code dictionary and of the styles of a loaded 
+        # file to code and to attribute dicts
+        self.code_dictionary = {}
+        self.style_dictionary = {}
+    
+    store = property(_get_store, _set_store)
+    
     def __getitem__(self, key):
         
         shape = self.shape
@@ -382,16 +1005,243 @@ class DictGrid(KeyValueStore, ParserMixin, StringGeneratorMixin):
                 raise IndexError, "Grid index " + \
                       str(key) + " outside grid shape " + str(shape)
         
-        return KeyValueStore.__getitem__(self, key)
-
-# End of class DictGrid
-
-# ------------------------------------------------------------------------------
-
-class DataArray(object):
-    """DataArray provides enhanced grid read/write access.
+        return self.store[key]
     
-    Enhancements comprise:
+    def __setitem__(self, key, value):
+        old_value = self.store[key]
+        
+        if value is None:
+            self.store[key] = value
+            self._reduce_used_range(key)
+        else:
+            self.store[key] = self.code_table.intern(value)
+            self._extend_used_range(key)
+        
+        if old_value is not None:
+            self.code_table.release(old_value)
+    
+    def __delitem__(self, key):
+        self.pop(key)
+    
+    def __contains__(self, key):
+        return key in self.store
+    
+    def __iter__(self):
+        return iter(self.store)
+    
+    def __len__(self):
+        return len(self.store)
+    
+    def __str__(self):
+        return str(self.store)
+    
+    def keys(self):
+        """Returns list of the keys of all cells with code"""
+        
+        return self.store.keys()
+    
+    def iteritems(self):
+        """Returns iterator over key, code pairs"""
+        
+        return self.store.iteritems()
+    
+    def iteritems_in(self, start, stop):
+        """Returns iterator over key, code pairs inside a box
+        
+        Parameters
+        ----------
+        start: 3-tuple of Integer
+        \tSmallest row, column and table of the box
+        stop: 3-tuple of Integer
+        \tRow, column and table behind the box
+        
+        """
+        
+        return self.store.iteritems_in(start, stop)
+    
+    def get(self, key, default=None):
+        """Returns code of key or default"""
+        
+        return self.store.get(key, default)
+    
+    def pop(self, key, *default):
+        """Removes key and returns its code"""
+        
+        try:
+            code = self.store.pop(key)
+            
+        except KeyError:
+            if default:
+                return default[0]
+            
+            raise
+        
+        if code is not None:
+            self.code_table.release(code)
+        
+        self._reduce_used_range(key)
+        
+        return code
+    
+    def clear(self):
+        """Removes the code of all cells"""
+        
+        self.store.clear()
+        self._used_ranges.clear()
+        self.code_table.clear()
+    
+    def get_used_range(self, tab):
+        """Returns bounding box of the cells of table tab or None if empty
+        
+        The bounding box is a 2-tuple of top left and bottom right cell.
+        
+        """
+        
+        try:
+            return self._used_ranges[tab]
+            
+        except KeyError:
+            used_range = self._used_ranges[tab] = \
+                self.store.get_used_range(tab)
+            
+            return used_range
+    
+    def snapshot(self):
+        """Returns a copy of the grid that is unaffected by later changes
+        
+        The cell code is copied by the store, which may share data with the
+        copy. The sections of the grid are copied shallowly. Cell attribute
+        dicts are shared Styles except for the dicts of frozen entries.
+        These are copied because frozen results are updated in place.
+        
+        """
+        
+        snapshot = DictGrid(self.shape, store=self.store.snapshot())
+        
+        snapshot._used_ranges.update(self._used_ranges)
+        
+        if isinstance(self.code_table, CodeTable):
+            snapshot.code_table = self.code_table.copy()
+        
+        # Selections are changed in place on row and column insertion
+        for selection, tab, attrs in self.cell_attributes:
+            if "frozen" in attrs:
+                attrs = copy(attrs)
+            
+            snapshot.cell_attributes.append((copy(selection), tab, attrs))
+        
+        snapshot.macros = self.macros
+        
+        snapshot.row_heights.update(self.row_heights)
+        snapshot.col_widths.update(self.col_widths)
+        
+        return snapshot
+    
+    def _extend_used_range(self, key):
+        """Extends the used range of the table of key by key"""
+        
+        row, col, tab = key
+        
+        if tab not in self._used_ranges:
+            return
+        
+        used_range = self._used_ranges[tab]
+        
+        if used_range is None:
+            self._used_ranges[tab] = (row, col), (row, col)
+        else:
+            (top, left), (bottom, right) = used_range
+            self._used_ranges[tab] = (min(top, row), min(left, col)), \
+                                     (max(bottom, row), max(right, col))
+    
+    def _reduce_used_range(self, key):
+        """Marks the used range of the table of key for recomputation
+        
+        This is only necessary if key is on the border of the used range.
+        
+        """
+        
+        row, col, tab = key
+        
+        used_range = self._used_ranges.get(tab)
+        
+        if used_range is not None:
+            (top, left), (bottom, right) = used_range
+            
+            if row in (top, bottom) or col in (left, right):
+                del self._used_ranges[tab]
+    
+    def shift(self, point, amount, axis):
+        """Moves all cells from point on along axis by amount
+        
+        Only the cells from point + amount on are visited. For negative 
+        amounts, the cells that are overwritten are removed beforehand.
+        
+        Parameters
+        ----------
+        point: Integer
+        \tFirst position on axis of the cells that are moved
+        amount: Integer
+        \tNumber of rows/cols/tabs, by which the cells are moved
+        axis: Integer
+        \tAxis of the movement, i.e. 0 == row, 1 == col, 2 == tab
+        
+        Returns
+        -------
+        Dict that maps the keys of the removed cells to their code
+        
+        """
+        
+        start = [0] * len(self.shape)
+        start[axis] = min(point, point + amount)
+        
+        items = list(self.iteritems_in(start, self.shape))
+        
+        removed_cells = {}
+        
+        for key, code in items:
+            self.store.pop(key)
+            
+            if key[axis] < point:
+                removed_cells[key] = code
+                self.code_table.release(code)
+        
+        for key, code in items:
+            if key[axis] >= point:
+                new_key = list(key)
+                new_key[axis] += amount
+                
+                self.store[tuple(new_key)] = code
+        
+        # Adjust used ranges
+        
+        if axis == 2:
+            self._used_ranges.clear()
+        
+        for tab, used_range in self._used_ranges.items():
+            if used_range is None or used_range[1][axis] < min(point, 
+                                                               point + amount):
+                continue
+            
+            if amount < 0:
+                # Deleted cells may have been on the border
+                del self._used_ranges[tab]
+            else:
+                self._used_ranges[tab] = tuple(
+                    tuple(ele + amount if i == axis and ele >= point else ele
+                          for i, ele in enumerate(corner))
+                    for corner in used_range)
+        
+        return removed_cells
+
+# End of class DictGrid
+
+# ------------------------------------------------------------------------------
+
+class DataArray(object):
+    """DataArray provides enhanced grid read/write access.
+    
+    Enhancements comprise:
      * Slicing
      * Multi-dimensional operations such as insertion and deletion along 1 axis
      * Undo/redo operations
@@ -484,12 +1334,32 @@ class DataArray(object):
         
         old_shape = self.shape
         
-        if any(new_axis < old_axis 
-               for new_axis, old_axis in zip(shape, old_shape)):
-            for key in self.dict_grid.keys():
-                if any(key_ele >= new_axis 
-                       for key_ele, new_axis in zip(key, shape)):
-                    self.pop(key)
+        deleted_keys = set()
+        
+        for tab in xrange(old_shape[2]):
+            used_range = self.dict_grid.get_used_range(tab)
+            
+            if used_range is None:
+                continue
+            
+            (top, left), (bottom, right) = used_range
+            
+            if tab >= shape[2]:
+                boxes = [((top, left, tab), (bottom + 1, right + 1, tab + 1))]
+            else:
+                # Cells below and right of the new borders
+                boxes = [((shape[0], left, tab), 
+                          (bottom + 1, right + 1, tab + 1)),
+                         ((top, shape[1], tab), 
+                          (bottom + 1, right + 1, tab + 1))]
+            
+            for start, stop in boxes:
+                if start[0] <= bottom and start[1] <= right:
+                    deleted_keys.update(key for key, _ in 
+                        self.dict_grid.iteritems_in(start, stop))
+        
+        for key in deleted_keys:
+            self.pop(key)
         
         # Set dict_grid shape attribute
         
@@ -519,6 +1389,26 @@ class DataArray(object):
         
         return {"dict_grid": self.dict_grid}
     
+    # Snapshot support
+    
+    def snapshot(self):
+        """Returns a frozen copy for background work such as saving
+        
+        Taking a snapshot is cheap because cell code is shared with the
+        snapshot until it is changed. Edits of the array do not affect
+        the snapshot and vice versa.
+        
+        """
+        
+        snapshot = self.__class__((0, 0, 0))
+        
+        snapshot.dict_grid = self.dict_grid.snapshot()
+        snapshot.dict_grid.cell_attributes.unredo = snapshot.unredo
+        
+        snapshot.safe_mode = self.safe_mode
+        
+        return snapshot
+    
     # Slice support
        
     def __getitem__(self, key):
@@ -557,62 +1447,129 @@ class DataArray(object):
         return self.dict_grid.__str__()
     
     def __setitem__(self, key, value):
-        """Accepts index and slice keys"""
+        """Accepts index and slice keys
         
-        single_keys_per_dim = []
+        For slice keys, value is written into all cells of the slices
+        as one undo step.
         
-        for axis, key_ele in enumerate(key):
-            if is_slice_like(key_ele):
-                # We have something slice-like here 
+        """
+        
+        if any(is_string_like(key_ele) for key_ele in key):
+            raise NotImplementedError
+        
+        if any(is_slice_like(key_ele) for key_ele in key):
+            ranges = [slice_range(key_ele, length) if is_slice_like(key_ele)
+                      else (key_ele, ) 
+                      for key_ele, length in zip(key, self.shape)]
+            
+            self._undoable_set_cells(dict.fromkeys(product(*ranges), value))
+            
+            return
+        
+        if value:
+            # UnRedo support
+            
+            old_value = self(key)
+            
+            # We seem to have double calls on __setitem__
+            # This hack catches them
+            
+            if old_value != value:
+                undo_operation = (self.__setitem__, [key, old_value])
+                redo_operation = (self.__setitem__, [key, value])
                 
-                single_keys_per_dim.append(slice_range(key_ele, 
-                                                       length = key[axis]))
+                self.unredo.append(undo_operation, redo_operation)
                 
-            elif is_string_like(key_ele):
-                # We have something string-like here 
+                self.unredo.mark()
                 
-                raise NotImplementedError
+            # End UnRedo support
             
-            else:
-                # key_ele is a single cell
+            self.dict_grid[key] = value
+            
+        else:
+            # Value is empty --> delete cell
+            try:
+                self.dict_grid.pop(key)
                 
-                single_keys_per_dim.append((key_ele, ))
+            except (KeyError, TypeError):
+                pass
+    
+    def _set_cells(self, cells):
+        """Writes cells without undo support and returns their old code
+        
+        Parameters
+        ----------
+        cells: Dict
+        \tMaps keys to cell code, empty code removes the cell
         
-        single_keys = product(*single_keys_per_dim)
+        """
         
-        unredo_mark = False
+        dict_grid = self.dict_grid
         
-        for single_key in single_keys:
-            if value:
-                # UnRedo support
-                
-                old_value = self(key)
-                
-                # We seem to have double calls on __setitem__
-                # This hack catches them
-                
-                if old_value != value:
-                
-                    unredo_mark = True
-                
-                    undo_operation = (self.__setitem__, [key, old_value])
-                    redo_operation = (self.__setitem__, [key, value])
+        old_cells = {}
         
-                    self.unredo.append(undo_operation, redo_operation)
-                    
-                    # End UnRedo support
-                
-                self.dict_grid[single_key] = value
+        for key, code in cells.iteritems():
+            old_cells[key] = dict_grid.get(key)
+            
+            if code:
+                dict_grid[key] = code
             else:
-                # Value is empty --> delete cell
-                try:
-                    self.dict_grid.pop(key)
-                    
-                except (KeyError, TypeError):
-                    pass
+                dict_grid.pop(key, None)
+        
+        return old_cells
+    
+    def _undoable_set_cells(self, cells):
+        """Writes cells and records them as one undo step"""
+        
+        old_cells = self._set_cells(cells)
+        
+        # UnRedo support
+        
+        undo_operation = (self._set_cells, [old_cells])
+        redo_operation = (self._set_cells, [cells])
+        
+        self.unredo.append(undo_operation, redo_operation)
+        
+        self.unredo.mark()
+        
+        # End UnRedo support
+    
+    def set_block(self, key, block):
+        """Writes a block of cell code in one pass as one undo step
+        
+        Parts of the block that are outside of the grid are cut off.
+        
+        Parameters
+        ----------
+        key: 3-tuple of Integer
+        \tKey of the top left cell of the block
+        block: 2-D or 3-D numpy array or iterable of iterables
+        \tCell code, the outer axis represents rows. 2-D blocks are written
+        \tinto table key[2]. The third axis of 3-D arrays represents tables.
+        \tEmpty strings and None remove cells. Values that are not 
+        \tstring-like are written as their repr.
+        
+        """
+        
+        rows, cols, tabs = self.shape
+        top, left, tab = key
+        
+        if isinstance(block, numpy.ndarray) and block.ndim == 3:
+            layers = izip(xrange(tab, tabs), numpy.rollaxis(block, 2))
+        else:
+            layers = [(tab, block)]
+        
+        cells = {}
+        
+        for layer_tab, layer in layers:
+            for row, row_data in izip(xrange(top, rows), layer):
+                for col, code in izip(xrange(left, cols), row_data):
+                    if code is not None and not is_string_like(code):
+                        code = repr(code)
                     
-        if unredo_mark:
-            self.unredo.mark()
+                    cells[row, col, layer_tab] = code
+        
+        self._undoable_set_cells(cells)
     
     def cell_array_generator(self, key):
         """Generator traversing cells specified in key
@@ -650,13 +1607,108 @@ class DataArray(object):
                     
                 break
     
+    def _infer_block_dtype(self, block):
+        """Returns int64 or float64 if block only holds such numbers
+        
+        Otherwise, object is returned.
+        
+        """
+        
+        if not block.size:
+            return numpy.object_
+        
+        dtype = numpy.int64
+        
+        for value in block.flat:
+            if type(value) in (int, long) or isinstance(value, numpy.integer):
+                continue
+            
+            elif type(value) is float or isinstance(value, numpy.floating):
+                dtype = numpy.float64
+            
+            else:
+                return numpy.object_
+        
+        return dtype
+    
+    def get_block(self, key, dtype="O"):
+        """Returns numpy array of the cells that are specified in key
+        
+        The array is preallocated and filled with the non-empty cells.
+        Empty cells are None. Axes with an Integer key are dropped.
+        
+        Parameters
+        ----------
+        key: 3-tuple of Integer or slice
+        \tKeys of the cells that are returned
+        dtype: numpy dtype or None, defaults to "O"
+        \tData type of the array, None infers int64, float64 or object
+        
+        """
+        
+        ranges = [slice_range(key_ele, length) if is_slice_like(key_ele)
+                  else xrange(key_ele, key_ele + 1)
+                  for key_ele, length in zip(key, self.shape)]
+        
+        block = numpy.empty([len(rng) for rng in ranges], dtype="O")
+        
+        if block.size:
+            start = [min(rng[0], rng[-1]) for rng in ranges]
+            stop = [max(rng[0], rng[-1]) + 1 for rng in ranges]
+            
+            for cell_key, _ in self.dict_grid.iteritems_in(start, stop):
+                index = []
+                
+                for key_ele, rng in zip(cell_key, ranges):
+                    step = rng[1] - rng[0] if len(rng) > 1 else 1
+                    position, remainder = divmod(key_ele - rng[0], step)
+                    
+                    if remainder:
+                        break
+                    
+                    index.append(position)
+                    
+                else:
+                    block[tuple(index)] = self[cell_key]
+        
+        block = block.reshape([len(rng) for key_ele, rng in zip(key, ranges)
+                               if is_slice_like(key_ele)])
+        
+        if dtype is None:
+            dtype = self._infer_block_dtype(block)
+        
+        if block.dtype == dtype:
+            return block
+        
+        return block.astype(dtype)
+    
     def _adjust_shape(self, amount, axis):
-        """Changes shape along axis by amount"""
+        """Changes shape along axis by amount without undo support"""
 
         new_shape = list(self.shape)
         new_shape[axis] += amount
         
-        self.shape = tuple(new_shape)
+        self.dict_grid.shape = tuple(new_shape)
+    
+    def compact_cell_attributes(self):
+        """Removes redundant cell attributes without changing cell formats
+        
+        Entries that may be removed by undoing appends are not compacted so
+        that the undo history stays valid.
+        
+        Returns
+        -------
+        Number of removed entries
+        
+        """
+        
+        cell_attributes = self.cell_attributes
+        
+        no_undo_pops = sum(1 for step in self.unredo.undolist 
+            if step != "MARK" and 
+               getattr(step[0], "im_self", None) is cell_attributes)
+        
+        return cell_attributes.compact(len(cell_attributes) - no_undo_pops)
     
     def _set_cell_attributes(self, value):
         """Setter for cell_atributes"""
@@ -666,19 +1718,16 @@ class DataArray(object):
         self.cell_attributes.extend(value)
     
     def _adjust_cell_attributes(self, insertion_point, no_to_insert, axis):
-        """Adjusts cell attributes on insertion/deletion"""
+        """Adjusts cell attributes on insertion/deletion without undo support"""
         
         assert axis in [0, 1, 2]
         
-        # Save cell_attributes for undo
-        old_cell_attributes = copy(self.cell_attributes)
-        
         if axis < 2:
             # Adjust selections
             for selection, _, _ in self.cell_attributes:
                 selection.insert(insertion_point, no_to_insert, axis)
-                
-            self.cell_attributes._attr_cache.clear()
+            
+            self.cell_attributes.clear_index()
             
             # Adjust row heights and col widths
             cell_sizes = self.col_widths if axis else self.row_heights
@@ -703,20 +1752,48 @@ class DataArray(object):
             
             for i, new_tab in new_tabs:
                 self.cell_attributes[i][1] = new_tab
-                
-            self.cell_attributes._attr_cache.clear()
+            
+            self.cell_attributes.clear_index()
             
         else:
             raise ValueError, "axis must be in [0, 1, 2]"
+    
+    def _shift(self, point, no_to_insert, axis, cells=None):
+        """Inserts or deletes rows/cols/tabs without undo support
         
-        # Make undoable
+        Parameters
+        ----------
+        point: Integer
+        \tInsertion or deletion point on axis
+        no_to_insert: Integer
+        \tNumber of rows/cols/tabs that are inserted, negative deletes
+        axis: Integer
+        \tSpecifies number of dimension, i.e. 0 == row, 1 == col, ...
+        cells: Dict, defaults to None
+        \tMaps keys to code of cells that are filled after insertion
         
-        undo_operation = (self._adjust_cell_attributes, 
-                          [insertion_point, -no_to_insert, axis])
-        redo_operation = (self._adjust_cell_attributes, 
-                          [insertion_point, no_to_insert, axis]) 
+        Returns
+        -------
+        Dict that maps the keys of the deleted cells to their code
         
-        self.unredo.append(undo_operation, redo_operation)
+        """
+        
+        if no_to_insert < 0:
+            deleted_cells = self.dict_grid.shift(point - no_to_insert, 
+                                                 no_to_insert, axis)
+            self._adjust_cell_attributes(point, no_to_insert, axis)
+            self._adjust_shape(no_to_insert, axis)
+            
+        else:
+            self._adjust_shape(no_to_insert, axis)
+            deleted_cells = self.dict_grid.shift(point, no_to_insert, axis)
+            self._adjust_cell_attributes(point, no_to_insert, axis)
+        
+        if cells is not None:
+            for key, code in cells.iteritems():
+                self.dict_grid[key] = code
+        
+        return deleted_cells
     
     def insert(self, insertion_point, no_to_insert, axis):
         """Inserts no_to_insert rows/cols/tabs/... before insertion_point
@@ -740,23 +1817,19 @@ class DataArray(object):
            insertion_point <= -self.shape[axis]:
             raise IndexError, "Insertion point not in grid"
         
-        new_keys = {}
+        self._shift(insertion_point, no_to_insert, axis)
         
-        for key in copy(self.dict_grid):
-            if key[axis] >= insertion_point:
-                new_key = list(key)
-                new_key[axis] += no_to_insert
-                
-                new_keys[tuple(new_key)] = self.pop(key)
+        # UnRedo support
         
-        self._adjust_shape(no_to_insert, axis)
+        undo_operation = (self._shift, [insertion_point, -no_to_insert, axis])
+        redo_operation = (self._shift, [insertion_point, no_to_insert, axis])
         
-        for key in new_keys:
-            self[key] = new_keys[key]
-            
-        self._adjust_cell_attributes(insertion_point, no_to_insert, axis)
-
+        self.unredo.append(undo_operation, redo_operation)
+        
+        self.unredo.mark()
         
+        # End UnRedo support
+    
     def delete(self, deletion_point, no_to_delete, axis):
         """Deletes no_to_delete rows/cols/tabs/... starting with deletion_point
         
@@ -774,20 +1847,19 @@ class DataArray(object):
            deletion_point <= -self.shape[axis]:
             raise IndexError, "Deletion point not in grid"
         
+        deleted_cells = self._shift(deletion_point, -no_to_delete, axis)
         
-        for key in copy(self.dict_grid):
-            if deletion_point <= key[axis] < deletion_point + no_to_delete:
-                self[key] = self.pop(key)
-            
-            elif key[axis] >= deletion_point + no_to_delete:
-                new_key = list(key)
-                new_key[axis] -= no_to_delete
-                
-                self[tuple(new_key)] = self.pop(key)
+        # UnRedo support
         
-        self._adjust_cell_attributes(deletion_point, -no_to_delete, axis)
+        undo_operation = (self._shift, 
+                          [deletion_point, no_to_delete, axis, deleted_cells])
+        redo_operation = (self._shift, [deletion_point, -no_to_delete, axis])
+        
+        self.unredo.append(undo_operation, redo_operation)
         
-        self._adjust_shape(-no_to_delete, axis)
+        self.unredo.mark()
+        
+        # End UnRedo support
 
     def set_row_height(self, row, tab, height):
         """Sets row height"""
@@ -850,41 +1922,443 @@ class CodeArray(DataArray):
     
     """
     
-    operators = ["+", "-", "*", "**", "/", "//",
-             "%", "<<", ">>", "&", "|", "^", "~",
-             "<", ">", "<=", ">=", "==", "!=", "<>",
-            ]
+    # Analysed cell code that is shared by all cells with identical code
+    programs = ProgramCache(config["max_cell_programs"])
     
-    # Cache for results from __getitem calls
-    result_cache = {}
+    # Names of the position of the evaluated cell
+    position_names = "X", "Y", "Z", "R", "C", "T"
+    
+    def __init__(self, shape):
+        DataArray.__init__(self, shape)
+        
+        # Cache for results from __getitem calls
+        self.result_cache = ResultCache(config["max_result_cache_bytes"])
+        
+        # Keys of result_cache entries that stem from slices
+        self._slice_cache_keys = set()
+        
+        # Decoded values of cells with immutable literal code
+        self.literals = {}
+        
+        # Cell references for invalidating only affected results
+        self.dependencies = DependencyGraph()
+        
+        # Global namespace of cell evaluation, built on first use
+        self._namespace = None
+        
+        # Macros that have been executed in the namespace
+        self._executed_macros = None
+        
+        # Cells that are evaluated in idle time
+        self.evaluation_queue = EvaluationQueue(self)
+        
+        # Keys of the cells that are currently evaluated, innermost last
+        self._eval_stack = []
+        self._eval_stack_keys = set()
+        
+        # Maps keys of cells in reference cycles to CircularReferenceErrors
+        self.cycles = {}
+        
+        # Current values of cells in a cycle that is solved iteratively
+        self._iterates = {}
+        
+        # Deadline and key of the outermost evaluated cell if time limited
+        self._watchdog = None
+        
+        # Time limit of cell evaluations in seconds or None
+        # The config is read once because each access evaluates it.
+        self.eval_timeout = config["eval_timeout"]
     
     def __setitem__(self, key, value):
-        """Sets cell code and resets result cache"""
+        """Sets cell code and invalidates affected results"""
         
         DataArray.__setitem__(self, key, value)
         
-        # Reset result cache
-        self.result_cache = {} 
+        # Cells of slices are invalidated by _set_cells
+        if any(is_slice_like(key_ele) for key_ele in key):
+            return
+        
+        self._invalidate(key, value)
+        
+        if value and is_string_like(value):
+            is_literal, literal_value = self._parse_literal(value)
+            if is_literal:
+                self.literals[key] = literal_value
+    
+    def _parse_literal(self, code):
+        """Returns 2-tuple (is_literal, value) for cell code
+        
+        Compiled programs of the code are used if they are cached. Other 
+        code is parsed without compiling, so that literal cells do not 
+        fill the program cache.
+        
+        """
+        
+        if code in self.programs:
+            program = self.programs[code]
+            
+            return program.is_literal, program.literal_value
+        
+        return parse_literal(code)
+    
+    def pop(self, key):
+        """Pops cell code and invalidates affected results"""
+        
+        code = DataArray.pop(self, key)
+        
+        self._invalidate(key)
+        
+        return code
+    
+    def _set_cells(self, cells):
+        """Writes cells without undo support and invalidates their results"""
+        
+        old_cells = DataArray._set_cells(self, cells)
+        
+        self._invalidate_cells(cells)
+        
+        return old_cells
+    
+    def _shift(self, point, no_to_insert, axis, cells=None):
+        """Inserts or deletes rows/cols/tabs and resets all results"""
+        
+        deleted_cells = DataArray._shift(self, point, no_to_insert, axis, cells)
+        
+        # Cell keys and relative references have changed
+        self.reset_result_cache()
+        
+        return deleted_cells
+    
+    def reset_result_cache(self):
+        """Empties result cache and dependency graph
+        
+        This is required after changes that bypass __setitem__ and pop.
+        
+        """
+        
+        self.result_cache.clear()
+        self._slice_cache_keys.clear()
+        self.literals.clear()
+        self.cycles.clear()
+        self.dependencies.clear()
+        self.evaluation_queue.reset()
+    
+    def _invalidate(self, key, code=None):
+        """Removes results of cell key and of all cells that depend on it
+        
+        Parameters
+        ----------
+        key: 3-tuple of Integer or slice
+        \tKey of the cell that has changed
+        code: String or None
+        \tNew code of the cell
+        
+        """
+        
+        if any(is_slice_like(key_ele) for key_ele in key):
+            self.reset_result_cache()
+            return
+        
+        self._invalidate_cells({key: code})
+    
+    def _invalidate_cells(self, cells):
+        """Removes results of changed cells and of all cells that depend on them
+        
+        Parameters
+        ----------
+        cells: Dict
+        \tMaps keys of the changed cells to their new code
+        
+        """
+        
+        # The new code may assign a global that other cells read
+        
+        # The name is split off without compiling the code
+        
+        names = []
+        
+        for code in cells.itervalues():
+            if is_string_like(code) and code:
+                glob_var = split_assignment(code)[0]
+                if glob_var is not None:
+                    names.append(glob_var)
+        
+        dirty_keys = self.dependencies.get_dirty(cells, names)
+        
+        for key in cells:
+            # Dependencies of key are registered again on evaluation
+            self.dependencies.remove(key)
+            
+            self.literals.pop(key, None)
+        
+        for dirty_key in dirty_keys:
+            self.result_cache.pop(dirty_key)
+            self.cycles.pop(dirty_key, None)
+        
+        # Slice results are not tracked in the dependency graph
+        
+        for slice_cache_key in self._slice_cache_keys:
+            self.result_cache.pop(slice_cache_key)
+        
+        self._slice_cache_keys.clear()
+        
+        self.evaluation_queue.add(dirty_keys)
+    
+    def is_evaluated(self, key):
+        """Returns True if the result of cell key needs no evaluation"""
+        
+        if key in self.literals or key in self.cycles or \
+           key in self.result_cache:
+            return True
+        
+        code = self(key)
+        
+        if code is None or \
+           is_string_like(code) and self._parse_literal(code)[0]:
+            return True
+        
+        return self.cell_attributes.get_frozen(key) is not False
     
     def __getitem__(self, key):
         """Returns _eval_cell"""
         
+        is_single_key = all(type(k) is not SliceType for k in key)
+        
         # Frozen cell handling
-        if all(type(k) is not SliceType for k in key):
-            frozen_res = self.cell_attributes[key]["frozen"]
+        if is_single_key:
+            frozen_res = self.cell_attributes.get_frozen(key)
             if frozen_res is not False:
                 return frozen_res
+            
+            # Literal cells are served without evaluation
+            if key in self.literals:
+                return self.literals[key]
+            
+            if key in self._iterates:
+                return self._iterates[key]
+            
+            if key in self.cycles:
+                return self.cycles[key]
+            
+            if key in self._eval_stack_keys:
+                self._raise_circular_reference(key)
         
         # Normal cell handling
         
-        if repr(key) in self.result_cache:
-            return self.result_cache[repr(key)]
+        result = self.result_cache.get(key)
+        
+        if result is not MISSING:
+            return result
+        
+        if not is_single_key:
+            result = self.get_block(key)
             
-        elif self(key) is not None:
-            result = self._eval_cell(key)
-            self.result_cache[repr(key)] = result
+            self.result_cache[key] = result
+            self._slice_cache_keys.add(self.result_cache.get_cache_key(key))
             
             return result
+        
+        code = self(key)
+        
+        if code is not None:
+            # Cells that have not been written via __setitem__ such as
+            # loaded cells are checked for literal code on first access
+            if is_string_like(code):
+                is_literal, literal_value = self._parse_literal(code)
+                if is_literal:
+                    self.literals[key] = literal_value
+                    return literal_value
+            
+            self._eval_stack.append(key)
+            self._eval_stack_keys.add(key)
+            
+            try:
+                result = self._eval_cell(key)
+                
+            finally:
+                self._eval_stack.pop()
+                self._eval_stack_keys.discard(key)
+            
+            self.result_cache[key] = result
+            
+            # Cycles are solved when the outermost evaluation has finished
+            
+            if self.cycles and not self._eval_stack and \
+               config["iterative_calculation"]:
+                self._solve_cycles()
+                return self[key]
+            
+            return result
+    
+    def _raise_circular_reference(self, key):
+        """Records the cycle that is closed by cell key and raises its error
+        
+        All cells on the evaluation stack from key onwards are on the cycle.
+        
+        """
+        
+        cycle = self._eval_stack[self._eval_stack.index(key):]
+        
+        error = CircularReferenceError("Circular dependency at " + repr(key))
+        
+        for cycle_key in cycle:
+            self.cycles[cycle_key] = error
+        
+        raise error
+    
+    def _get_static_precedents(self, key):
+        """Returns set of keys of non-empty cells that cell key references"""
+        
+        code = self(key)
+        
+        if not is_string_like(code):
+            return set()
+        
+        references = self.programs[code].references
+        
+        precedents = set(ref_key for ref_key in references.get_cells(key)
+                         if ref_key in self.dict_grid)
+        
+        for rng in references.get_ranges(key):
+            precedents.update(ref_key for ref_key in self.dict_grid
+                              if is_in_range(ref_key, rng))
+        
+        return precedents
+    
+    def _is_converged(self, previous, current):
+        """Returns True if all iterates have changed less than the tolerance
+        
+        Parameters
+        ----------
+        previous: List
+        \tValues of the cells of a cycle before the last iteration
+        current: List
+        \tValues of the cells of a cycle after the last iteration
+        
+        """
+        
+        try:
+            previous_array = numpy.array(previous, dtype="float64")
+            current_array = numpy.array(current, dtype="float64")
+            
+        except (TypeError, ValueError):
+            # Non-numeric values have to be stable
+            try:
+                return bool(previous == current)
+                
+            except ValueError:
+                return False
+        
+        deviation = numpy.abs(current_array - previous_array)
+        
+        return bool(numpy.all(deviation <= config["iteration_tolerance"]))
+    
+    def _solve_cycles(self):
+        """Solves all recorded reference cycles by fixed-point iteration
+        
+        Each strongly connected component of cells is evaluated cell by 
+        cell with the latest values of all other cells until the values 
+        converge or the maximum number of iterations is reached. The last 
+        values become the results of the cells.
+        
+        """
+        
+        dirty_keys = set()
+        
+        while self.cycles:
+            key = min(self.cycles)
+            error = self.cycles[key]
+            
+            component = get_strongly_connected_component(
+                                        key, self._get_static_precedents)
+            
+            # Cycles via volatile references are not found statically
+            component.update(cycle_key for cycle_key in self.cycles 
+                             if self.cycles[cycle_key] is error)
+            
+            keys = sorted(component)
+            
+            for cycle_key in keys:
+                self.cycles.pop(cycle_key, None)
+                self.result_cache.pop(cycle_key)
+            
+            self._iterates = dict.fromkeys(keys, 0)
+            values = [0] * len(keys)
+            
+            try:
+                for _ in xrange(config["max_iterations"]):
+                    for cycle_key in keys:
+                        self._iterates[cycle_key] = self._eval_cell(cycle_key)
+                    
+                    previous_values = values
+                    values = [self._iterates[cycle_key] for cycle_key in keys]
+                    
+                    if self._is_converged(previous_values, values):
+                        break
+            
+            finally:
+                self._iterates = {}
+            
+            # Results that stem from the circular reference errors
+            
+            for dirty_key in self.dependencies.get_dirty(keys):
+                self.result_cache.pop(dirty_key)
+                dirty_keys.add(dirty_key)
+            
+            for cycle_key, value in zip(keys, values):
+                self.result_cache[cycle_key] = value
+        
+        for slice_cache_key in self._slice_cache_keys:
+            self.result_cache.pop(slice_cache_key)
+        
+        self._slice_cache_keys.clear()
+        
+        self.evaluation_queue.add(dirty_keys)
+    
+    def _get_timeout_error(self):
+        """Returns EvaluationTimeoutError for the watched cell"""
+        
+        key = self._watchdog[1]
+        
+        return EvaluationTimeoutError("Evaluation of cell " + repr(key) + 
+                    " exceeded " + repr(self.eval_timeout) + " s")
+    
+    def _trace(self, frame, event, arg):
+        """Trace function that interrupts cells that exceed their deadline
+        
+        The deadline is only checked on call events. No local trace function
+        is returned so that lines are executed without overhead.
+        
+        """
+        
+        if event == "call" and time.time() > self._watchdog[0]:
+            # Cell code may swallow the error, which removes the trace
+            # function. The profile function restores it.
+            sys.setprofile(self._restore_trace)
+            
+            raise self._get_timeout_error()
+    
+    def _restore_trace(self, frame, event, arg):
+        """Profile function that restores the trace function after timeouts"""
+        
+        if event == "call" and sys.gettrace() is None:
+            sys.settrace(self._trace)
+    
+    def _get_namespace(self):
+        """Returns global namespace for cell evaluation
+        
+        The namespace is shared by all cells and rebuilt by execute_macros.
+        It contains the module globals, the names that macros define and
+        the global variables that cells assign. Cell positions are not in
+        the shared namespace.
+        
+        """
+        
+        if self._namespace is None:
+            self._namespace = globals().copy()
+            self._namespace["S"] = self
+        
+        return self._namespace
     
     def _make_nested_list(self, gen):
         """Makes nested list from generator for creating numpy.array"""
@@ -904,32 +2378,9 @@ class CodeArray(DataArray):
         
         return res
     
-    def _has_assignment(self, code):
-        """Returns True iif  code is a global assignment
-        
-        Assignment is valid iif 
-         * only one term in front of "=" and 
-         * no "==" and 
-         * no operators left and 
-         * parentheses balanced
-         
-        """
-        
-        return len(code) > 1 and \
-               len(code[0].split()) == 1 and \
-               code[1] != "" and \
-               (not max(op in code[0] for op in self.operators)) and \
-               code[0].count("(") == code[0].count(")")
-    
     def _eval_cell(self, key):
         """Evaluates one cell"""
         
-        # Set up environment for evaluation
-        env = globals().copy()
-        env.update( {'X':key[0], 'Y':key[1], 'Z':key[2],
-                     'R':key[0], 'C':key[1], 'T':key[2],
-                     'S':self } )
-        
         code = self(key)
         
         # If cell is not present return None
@@ -943,32 +2394,89 @@ class CodeArray(DataArray):
             
             return numpy.array(self._make_nested_list(code), dtype="O")
         
+        # Code is parsed and compiled only once for all cells
+        
+        program = self.programs[code]
+        
         # If only 1 term in front of the "=" --> global
         
-        split_exp = code.split("=")
+        glob_var = program.glob_var
         
-        if self._has_assignment(split_exp):
-            glob_var = split_exp[0].strip()
-            expression = "=".join(split_exp[1:])
-        else:
-            glob_var = None
-            expression = code
+        # Register cell references for result cache invalidation
+        
+        self.dependencies.add(key, program.references, glob_var)
+        
+        # Each evaluation has its own globals with the cell position so 
+        # that functions, which the cell creates, keep the position.
+        # CPython cannot chain globals, so the shared namespace is copied.
+        
+        namespace = self._get_namespace()
+        
+        cell_globals = namespace.copy()
+        cell_globals.update(izip(self.position_names, key + key))
+        
+        # Python code of the cell is traced for its deadline.
+        # Nested cells share the deadline of the outermost cell.
+        
+        timeout = self.eval_timeout
+        is_watched = timeout is not None and self._watchdog is None
+        
+        if is_watched:
+            self._watchdog = time.time() + timeout, key
+            
+            enclosing_trace = sys.gettrace()
+            enclosing_profile = sys.getprofile()
+            sys.settrace(self._trace)
         
         try:
-            result = eval(expression, env, {})
+            if program.error is not None:
+                raise program.error
+            
+            result = eval(program.code_object, cell_globals, {})
             
         except AttributeError, err:
             # Attribute Error includes RunTimeError
             result = err 
             
+        except EvaluationTimeoutError, err:
+            result = err
+            
         except Exception, err:
             result = Exception(err)
         
-        # Change back cell value for evaluation from other cells
-        self.dict_grid[key] = code
+        finally:
+            if is_watched:
+                # Tracing ends before any further Python code is called.
+                # The profile function would restore the trace function.
+                is_timed_out = sys.getprofile() == self._restore_trace
+                sys.setprofile(enclosing_profile)
+                sys.settrace(enclosing_trace)
+                
+                if is_timed_out:
+                    timeout_error = self._get_timeout_error()
+                
+                self._watchdog = None
+            
+            elif self._watchdog is not None and sys.gettrace() is None:
+                # A timeout in this nested cell removes the trace function
+                sys.settrace(self._trace)
+        
+        if is_watched and is_timed_out and \
+           not isinstance(result, EvaluationTimeoutError):
+            # The cell code has swallowed a timeout
+            result = timeout_error
+        
+        # Cells on a reference cycle get the cycle's error
+        if key in self.cycles:
+            result = self.cycles[key]
+        
+        # Change back cell value for evaluation from other cells.
+        # The code is only written if the evaluation has changed it.
+        if self.dict_grid.get(key) != code:
+            self.dict_grid[key] = code
         
         if glob_var is not None:
-            globals().update({glob_var: result})
+            namespace[glob_var] = result
         
         return result
     
@@ -989,8 +2497,13 @@ class CodeArray(DataArray):
         sys.stdout = code_out
         sys.stderr = code_err
 
+        # Macros are executed in a fresh namespace for cell evaluation
+        self._namespace = None
+        self.eval_timeout = config["eval_timeout"]
+        self._executed_macros = self.macros
+        
         try:
-            exec(self.macros, globals())
+            exec(self.macros, self._get_namespace())
             
         except Exception, err:
             print err
@@ -999,6 +2512,11 @@ class CodeArray(DataArray):
         sys.stdout = sys.__stdout__
         sys.stderr = sys.__stderr__
 
+        # Macros may have redefined names that cells use
+        self.reset_result_cache()
+        
+        self.dependencies.macros_read_cells = reads_cells(self.macros)
+        
         outstring = code_out.getvalue() + code_err.getvalue()
 
         code_out.close()
@@ -1006,6 +2524,25 @@ class CodeArray(DataArray):
 
         return outstring
     
+    def recalculate(self, processes=None):
+        """Evaluates all cells anew and returns number of cells in workers
+        
+        Cells that do not depend on each other are evaluated in parallel
+        in a pool of worker processes, in which the executed macros are 
+        executed as well.
+        
+        Parameters
+        ----------
+        processes: Integer or None, defaults to None
+        \tNumber of worker processes, None is the number of CPUs.
+        \tIf processes is 1 then all cells are evaluated in this process.
+        
+        """
+        
+        recalculation = Recalculation(self, self._executed_macros, processes)
+        
+        return recalculation()
+    
     def findnextmatch(self, startkey, find_string, flags):
         """ Returns a tuple with the position of the next match of find_string
         
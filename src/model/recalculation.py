@@ -0,0 +1,384 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2008 Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+
+Recalculation
+=============
+
+Recalculation evaluates all cells of a CodeArray level by level.
+Independent cells of one level are evaluated in a process pool.
+
+Provides
+--------
+
+ * get_levels: Topological levels of a precedents graph
+ * Recalculation: Parallel recalculation of all cells of a CodeArray
+
+"""
+
+import cPickle as pickle
+from multiprocessing import Pool, TimeoutError, cpu_count
+
+from config import config
+
+from lib.typechecks import is_string_like
+
+from dependencies import RangeIndex
+from errors import EvaluationTimeoutError
+
+# CodeArray of a worker process, created by _init_worker
+_worker_code_array = None
+
+
+def _init_worker(code_array_class, shape, macros):
+    """Initializes worker process with an empty CodeArray
+
+    Parameters
+    ----------
+    code_array_class: Class
+    \tCodeArray class that evaluates cells in the worker
+    shape: 3-tuple of Integer
+    \tShape of the recalculated grid
+    macros: String or None
+    \tMacros that have been executed for the recalculated grid
+
+    """
+
+    global _worker_code_array
+
+    _worker_code_array = code_array_class(shape)
+
+    if macros is not None:
+        _worker_code_array.macros = macros
+        _worker_code_array.execute_macros()
+
+
+def _eval_in_worker(task):
+    """Returns pickled result of a pickled task or None on failure
+
+    A task is a pickled 3-tuple of cell key, cell code and a dict that maps
+    the keys of the cells that the code references to their results.
+
+    """
+
+    code_array = _worker_code_array
+
+    try:
+        key, code, values = pickle.loads(task)
+
+        code_array.reset_result_cache()
+        code_array.dict_grid.clear()
+
+        # Precedents are served from literals. Their placeholder code
+        # makes range reads find them in the grid.
+        for precedent in values:
+            code_array.dict_grid[precedent] = u"None"
+
+        code_array.literals.update(values)
+
+        code_array.dict_grid[key] = code
+        result = code_array[key]
+
+        return pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+
+    except Exception:
+        # The cell is evaluated in the main process instead
+        return
+
+
+def get_levels(precedents):
+    """Returns 2-tuple of topological levels and keys in cycles
+
+    Each cell in a level only depends on cells of previous levels.
+    Cells that are part of or depend on cycles are not levelled.
+
+    Parameters
+    ----------
+    precedents: Dict
+    \tMaps each cell key to a set of keys of the cells that it references.
+    \tAll referenced keys are keys of precedents.
+
+    """
+
+    dependents = {}
+    no_unlevelled_precedents = {}
+
+    for key, key_precedents in precedents.iteritems():
+        no_unlevelled_precedents[key] = len(key_precedents)
+        for precedent in key_precedents:
+            dependents.setdefault(precedent, []).append(key)
+
+    level = [key for key, number in no_unlevelled_precedents.iteritems()
+             if not number]
+    levels = []
+
+    while level:
+        levels.append(level)
+        next_level = []
+
+        for key in level:
+            for dependent in dependents.get(key, ()):
+                no_unlevelled_precedents[dependent] -= 1
+                if not no_unlevelled_precedents[dependent]:
+                    next_level.append(dependent)
+
+        level = next_level
+
+    cyclic_keys = [key for key, number in no_unlevelled_precedents.iteritems()
+                   if number]
+
+    return levels, cyclic_keys
+
+
+class Recalculation(object):
+    """Recalculation of all cells of a CodeArray in a process pool
+
+    Cells are evaluated level by level. Within a level, all cells whose
+    results only depend on their statically known precedents are sent to
+    the worker processes together with the results of these precedents.
+
+    Cells are evaluated in the main process if they
+     * have code that is no string, e. g. a generator,
+     * have volatile references, call functions that may be macros,
+     * assign or read cell global variables,
+     * are literal or frozen, which makes evaluation cheap,
+     * have precedents or results that cannot be pickled or
+     * are part of a cycle.
+
+    Worker processes that do not return a result within the evaluation
+    timeout are terminated. Their cell gets an EvaluationTimeoutError.
+
+    Parameters
+    ----------
+    code_array: CodeArray
+    \tCodeArray that is recalculated
+    macros: String or None
+    \tMacros that have been executed for code_array
+    processes: Integer or None, defaults to None
+    \tNumber of worker processes, None is the number of CPUs
+
+    """
+
+    def __init__(self, code_array, macros, processes=None):
+        self.code_array = code_array
+        self.macros = macros
+        self.processes = cpu_count() if processes is None else processes
+
+        # Keys of the cells that are evaluated in the main process
+        self.local_keys = set()
+
+        self.pool = None
+
+        self.precedents = self._get_precedents()
+
+    def _get_precedents(self):
+        """Returns dict that maps keys to the keys of their precedents
+
+        Cells that are evaluated in the main process are added to
+        self.local_keys.
+
+        """
+
+        code_array = self.code_array
+
+        keys = set(code_array.keys())
+
+        programs = {}
+        readers = {}
+        assigners = {}
+
+        for key in keys:
+            code = code_array(key)
+
+            if not is_string_like(code) or key in code_array.literals or \
+               code_array.cell_attributes.get_frozen(key) is not False:
+                self.local_keys.add(key)
+                continue
+
+            program = code_array.programs[code]
+            programs[key] = program
+
+            if program.is_literal or program.error is not None or \
+               program.references.volatile or program.references.calls:
+                self.local_keys.add(key)
+
+            if program.glob_var is not None:
+                self.local_keys.add(key)
+                assigners.setdefault(program.glob_var, []).append(key)
+
+            for name in program.references.names:
+                readers.setdefault(name, []).append(key)
+
+        precedents = dict((key, set()) for key in keys)
+
+        # Ranges are indexed so that each key only visits nearby ranges
+        range_index = RangeIndex()
+
+        for key, program in programs.iteritems():
+            references = program.references
+
+            precedents[key].update(ref_key for ref_key in
+                                   references.get_cells(key) if ref_key in keys)
+
+            for rng in references.get_ranges(key):
+                range_index.add(key, rng)
+
+        for ref_key in keys:
+            for key in range_index.get_dependents(ref_key):
+                precedents[key].add(ref_key)
+
+        # Cells that read cell global variables follow their assigners
+
+        for name, assigner_keys in assigners.iteritems():
+            for key in readers.get(name, ()):
+                self.local_keys.add(key)
+                precedents[key].update(assigner_keys)
+
+        return precedents
+
+    def _get_task(self, key):
+        """Returns pickled task for a worker or None if pickling fails"""
+
+        code_array = self.code_array
+
+        values = dict((precedent, code_array[precedent])
+                      for precedent in self.precedents[key])
+
+        try:
+            return pickle.dumps((key, code_array(key), values),
+                                pickle.HIGHEST_PROTOCOL)
+
+        except Exception:
+            return
+
+    def _set_result(self, key, result):
+        """Stores result of a cell that has been evaluated in a worker"""
+
+        code_array = self.code_array
+
+        program = code_array.programs[code_array(key)]
+
+        code_array.result_cache[key] = result
+        code_array.dependencies.add(key, program.references)
+
+    def _get_pool(self):
+        """Returns pool of worker processes, which is started on demand"""
+
+        if self.pool is None:
+            code_array = self.code_array
+            self.pool = Pool(self.processes, _init_worker,
+                             (type(code_array), code_array.shape, self.macros))
+
+        return self.pool
+
+    def _map(self, task_keys, tasks):
+        """Returns list of pickled results or errors for tasks
+
+        Results are None if a worker has failed to evaluate a task.
+
+        """
+
+        timeout = config["eval_timeout"]
+
+        results = []
+
+        while len(results) < len(tasks):
+            pending_tasks = tasks[len(results):]
+
+            chunksize = max(1, len(pending_tasks) // (4 * self.processes))
+
+            # Tasks of a chunk are evaluated one after another
+            wait_time = None if timeout is None else 2 * timeout * chunksize
+
+            result_iter = self._get_pool().imap(_eval_in_worker,
+                                                pending_tasks, chunksize)
+
+            try:
+                for _ in pending_tasks:
+                    results.append(result_iter.next(wait_time))
+
+            except TimeoutError:
+                # The worker may hang inside of a C function
+                self.pool.terminate()
+                self.pool = None
+
+                key = task_keys[len(results)]
+                results.append(EvaluationTimeoutError("Evaluation of cell " +
+                        repr(key) + " exceeded " + repr(timeout) + " s"))
+
+        return results
+
+    def __call__(self):
+        """Recalculates all cells and returns number of cells in workers"""
+
+        code_array = self.code_array
+
+        code_array.reset_result_cache()
+
+        levels, cyclic_keys = get_levels(self.precedents)
+
+        no_worker_cells = 0
+
+        try:
+            for level in levels:
+                task_keys = []
+                tasks = []
+
+                for key in level:
+                    task = None
+
+                    if key not in self.local_keys and self.processes > 1:
+                        task = self._get_task(key)
+
+                    if task is None:
+                        code_array[key]
+                    else:
+                        task_keys.append(key)
+                        tasks.append(task)
+
+                if not tasks:
+                    continue
+
+                results = self._map(task_keys, tasks)
+
+                for key, result in zip(task_keys, results):
+                    if result is None:
+                        code_array[key]
+                    elif isinstance(result, EvaluationTimeoutError):
+                        self._set_result(key, result)
+                    else:
+                        self._set_result(key, pickle.loads(result))
+                        no_worker_cells += 1
+
+        finally:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+                self.pool = None
+
+        # Cycles are reported by the ordinary evaluation
+        for key in cyclic_keys:
+            code_array[key]
+
+        return no_worker_cells
+
+# End of class Recalculation
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2008 Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+
+Resultcache
+===========
+
+Resultcache contains the memory bounded cache of cell results.
+
+Provides
+--------
+
+ * MISSING: Marker for results that are not in a ResultCache
+ * get_nbytes: Approximate memory size of a result
+ * ResultCache: Memory bounded LRU cache of cell results
+
+"""
+
+from collections import OrderedDict
+import sys
+from types import SliceType
+
+import numpy
+
+# Default of ResultCache.get that distinguishes misses from None results
+MISSING = object()
+
+
+def get_nbytes(value):
+    """Returns approximate number of bytes that value occupies
+
+    Numpy arrays are estimated by their data size, all other objects by
+    sys.getsizeof, which does not include referenced objects.
+
+    """
+
+    if isinstance(value, numpy.ndarray):
+        return value.nbytes
+
+    try:
+        return sys.getsizeof(value)
+
+    except TypeError:
+        return 0
+
+
+class ResultCache(object):
+    """Memory bounded least recently used cache of cell results
+
+    Keys are cell keys. Slices in keys are stored as 3-tuples of start,
+    stop and step.
+
+    Parameters
+    ----------
+    maxbytes: Integer
+    \tMaximum sum of the approximate sizes of the cached results
+
+    Attributes
+    ----------
+    nbytes: Integer
+    \tSum of the approximate sizes of the cached results
+    hits: Integer
+    \tNumber of get calls that found a result
+    misses: Integer
+    \tNumber of get calls that did not find a result
+    evictions: Integer
+    \tNumber of results that have been removed or not stored for space
+
+    """
+
+    def __init__(self, maxbytes):
+        self.maxbytes = maxbytes
+
+        # Maps cache key to 2-tuple of result and its size
+        self.results = OrderedDict()
+
+        self.nbytes = 0
+
+        self.reset_stats()
+
+    def get_cache_key(self, key):
+        """Returns hashable cache key for a cell key that may contain slices"""
+
+        try:
+            hash(key)
+            return key
+
+        except TypeError:
+            return tuple((ele.start, ele.stop, ele.step)
+                         if type(ele) is SliceType else ele for ele in key)
+
+    def __len__(self):
+        return len(self.results)
+
+    def __contains__(self, key):
+        return self.get_cache_key(key) in self.results
+
+    def __getitem__(self, key):
+        """Returns result for key without counting or reordering"""
+
+        return self.results[self.get_cache_key(key)][0]
+
+    def __setitem__(self, key, value):
+        """Stores value and evicts least recently used results if full"""
+
+        cache_key = self.get_cache_key(key)
+
+        self.pop(cache_key)
+
+        nbytes = get_nbytes(value)
+
+        if nbytes > self.maxbytes:
+            self.evictions += 1
+            return
+
+        while self.nbytes + nbytes > self.maxbytes:
+            _, (_, evicted_nbytes) = self.results.popitem(last=False)
+            self.nbytes -= evicted_nbytes
+            self.evictions += 1
+
+        # Most recently used results are at the end
+        self.results[cache_key] = value, nbytes
+        self.nbytes += nbytes
+
+    def get(self, key, default=MISSING):
+        """Returns result for key or default and counts hits and misses"""
+
+        cache_key = self.get_cache_key(key)
+
+        try:
+            value, nbytes = self.results.pop(cache_key)
+
+        except KeyError:
+            self.misses += 1
+            return default
+
+        self.results[cache_key] = value, nbytes
+        self.hits += 1
+
+        return value
+
+    def pop(self, key, default=None):
+        """Removes result for key and returns it or default"""
+
+        try:
+            value, nbytes = self.results.pop(self.get_cache_key(key))
+
+        except KeyError:
+            return default
+
+        self.nbytes -= nbytes
+
+        return value
+
+    def clear(self):
+        """Removes all results"""
+
+        self.results.clear()
+        self.nbytes = 0
+
+    def itervalues(self):
+        """Returns iterator over all cached results"""
+
+        return (value for value, _ in self.results.itervalues())
+
+    def reset_stats(self):
+        """Resets hit, miss and eviction counters"""
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def hit_rate(self):
+        """Ratio of hits and get calls, None if there is no get call"""
+
+        accesses = self.hits + self.misses
+
+        if accesses:
+            return float(self.hits) / accesses
+
+# End of class ResultCache
@@ -0,0 +1,400 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2008 Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+
+Sqlitestore
+===========
+
+Sqlitestore contains the on-disk key value store of layer 0 of the model
+for grids that do not fit into memory.
+
+Only the cell code is stored on disk. Cell attributes, row heights,
+column widths and macros stay in memory. Snapshots, e.g. for saving,
+copy the whole database.
+
+Provides
+--------
+
+ * PAGE_SHAPE: Default number of rows and columns of a page
+ * SqliteStore: Key value store in an SQLite database with a page cache
+
+"""
+
+from collections import OrderedDict
+import os
+import sqlite3
+import tempfile
+
+PAGE_SHAPE = 256, 64
+
+
+class SqliteStore(object):
+    """Key value store for cell keys in an SQLite database
+
+    The cells of each table are read in pages of a fixed number of rows
+    and columns. The least recently used pages are kept in memory.
+    Writes go to the page and are collected. They are written to the
+    database in one batch when batch_size writes are pending or before
+    the database is queried.
+
+    Values are unicode or str. None values are not stored.
+
+    SqliteStore provides the dict operations that DictGrid uses. Iteration
+    is ordered by table and row. The store must not be changed while
+    iterating over all keys.
+
+    This class represents layer 0 of the model.
+
+    Parameters
+    ----------
+    path: String, defaults to ""
+    \tPath of the database file. The empty string creates a temporary
+    \tdatabase that is removed when the store is garbage collected.
+    page_shape: 2-tuple of Integer, defaults to PAGE_SHAPE
+    \tNumber of rows and columns of a page
+    max_pages: Integer, defaults to 64
+    \tMaximum number of pages in memory
+    batch_size: Integer, defaults to 1000
+    \tMaximum number of pending writes
+    check_same_thread: Bool, defaults to True
+    \tIf False, the store may be used from other threads than the one
+    \tthat has created it. Only one thread at a time may use it.
+
+    """
+
+    def __init__(self, path="", page_shape=PAGE_SHAPE, max_pages=64,
+                 batch_size=1000, check_same_thread=True):
+        self.path = path
+        self.page_shape = page_shape
+        self.max_pages = max_pages
+        self.batch_size = batch_size
+
+        self.connection = sqlite3.connect(
+            path, check_same_thread=check_same_thread)
+
+        # The database is a working copy that does not survive crashes
+        self.connection.execute("PRAGMA journal_mode = OFF")
+        self.connection.execute("PRAGMA synchronous = OFF")
+
+        self.connection.execute("CREATE TABLE IF NOT EXISTS cells "
+                                "(tab INTEGER, row INTEGER, col INTEGER, "
+                                "code, PRIMARY KEY (tab, row, col))")
+
+        # Maps (tab, page_row, page_col) to dict of key, value pairs
+        self.pages = OrderedDict()
+
+        # Maps keys to values that are not written yet, None removes keys
+        self._pending = {}
+
+        # Path of a temporary database file that is removed with the store
+        self._temp_path = None
+
+        self._len, = \
+            self.connection.execute("SELECT COUNT(*) FROM cells").fetchone()
+
+    def __del__(self):
+        if self._temp_path is not None:
+            self.connection.close()
+            os.remove(self._temp_path)
+
+    def flush(self):
+        """Writes pending changes to the database"""
+
+        if not self._pending:
+            return
+
+        inserts = []
+        deletes = []
+
+        for (row, col, tab), value in self._pending.iteritems():
+            if value is None:
+                deletes.append((tab, row, col))
+            else:
+                inserts.append((tab, row, col, self._encode(value)))
+
+        self._pending.clear()
+
+        self.connection.executemany("INSERT OR REPLACE INTO cells VALUES "
+                                    "(?, ?, ?, ?)", inserts)
+        self.connection.executemany("DELETE FROM cells WHERE "
+                                    "tab = ? AND row = ? AND col = ?",
+                                    deletes)
+
+    def commit(self):
+        """Writes pending changes to the database and commits them"""
+
+        self.flush()
+        self.connection.commit()
+
+    def _write(self, key, value):
+        """Marks key for writing value to the database, None removes key"""
+
+        self._pending[key] = value
+
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def _get_page_key(self, key):
+        """Returns key of the page that contains key"""
+
+        row, col, tab = key
+        page_rows, page_cols = self.page_shape
+
+        return tab, row // page_rows, col // page_cols
+
+    def _get_page(self, page_key):
+        """Returns dict of the cells of a page, which is loaded on demand"""
+
+        try:
+            page = self.pages.pop(page_key)
+
+        except KeyError:
+            tab, page_row, page_col = page_key
+            page_rows, page_cols = self.page_shape
+
+            start = page_row * page_rows, page_col * page_cols, tab
+            stop = start[0] + page_rows, start[1] + page_cols, tab + 1
+
+            page = dict(self.iteritems_in(start, stop))
+
+            while len(self.pages) >= self.max_pages:
+                self.pages.popitem(last=False)
+
+        # Most recently used pages are at the end
+        self.pages[page_key] = page
+
+        return page
+
+    def _encode(self, value):
+        """Returns value for the database, str is stored as blob"""
+
+        if type(value) is str:
+            return buffer(value)
+
+        return value
+
+    def _decode(self, value):
+        """Returns value from the database"""
+
+        if type(value) is buffer:
+            return str(value)
+
+        return value
+
+    def __len__(self):
+        return self._len
+
+    def __contains__(self, key):
+        return key in self._get_page(self._get_page_key(key))
+
+    def __getitem__(self, key):
+        """Returns the value of key or the default value None"""
+
+        return self._get_page(self._get_page_key(key)).get(key)
+
+    def __setitem__(self, key, value):
+        """Stores value for key, None removes key"""
+
+        if value is None:
+            self.pop(key, None)
+            return
+
+        page = self._get_page(self._get_page_key(key))
+
+        if key not in page:
+            self._len += 1
+
+        page[key] = value
+
+        self._write(key, value)
+
+    def __delitem__(self, key):
+        self.pop(key)
+
+    def pop(self, key, *default):
+        """Removes key and returns its value
+
+        If key is not present then default is returned if given.
+        Otherwise, a KeyError is raised.
+
+        """
+
+        page = self._get_page(self._get_page_key(key))
+
+        if key not in page:
+            if default:
+                return default[0]
+
+            raise KeyError(key)
+
+        self._write(key, None)
+        self._len -= 1
+
+        return page.pop(key)
+
+    def get(self, key, default=None):
+        """Returns the value of key or default"""
+
+        value = self[key]
+
+        if value is None:
+            return default
+
+        return value
+
+    def clear(self):
+        """Removes all keys"""
+
+        self._pending.clear()
+        self.connection.execute("DELETE FROM cells")
+        self.pages.clear()
+        self._len = 0
+
+    def snapshot(self):
+        """Returns a copy of the store in a temporary database file
+
+        Unlike TileStore, SqliteStore does not share data with snapshots.
+        The cells are copied by SQLite into the new database without
+        passing through Python. The database file is removed when the
+        snapshot is garbage collected. The snapshot may be passed to a
+        worker thread, e.g. for saving.
+
+        """
+
+        handle, path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+
+        # ATTACH is not possible inside of a transaction
+        self.commit()
+
+        self.connection.execute("ATTACH DATABASE ? AS snapshot", (path,))
+
+        try:
+            self.connection.execute("CREATE TABLE snapshot.cells "
+                                    "(tab INTEGER, row INTEGER, col INTEGER, "
+                                    "code, PRIMARY KEY (tab, row, col))")
+            self.connection.execute("INSERT INTO snapshot.cells "
+                                    "SELECT * FROM main.cells")
+            self.connection.commit()
+
+        finally:
+            self.connection.execute("DETACH DATABASE snapshot")
+
+        snapshot = SqliteStore(path, self.page_shape, self.max_pages,
+                               self.batch_size, check_same_thread=False)
+        snapshot._temp_path = path
+
+        return snapshot
+
+    def get_used_range(self, tab):
+        """Returns bounding box of the cells of table tab or None if empty
+
+        The bounding box is a 2-tuple of top left and bottom right cell.
+
+        """
+
+        self.flush()
+
+        top, left, bottom, right = self.connection.execute(
+            "SELECT MIN(row), MIN(col), MAX(row), MAX(col) FROM cells "
+            "WHERE tab = ?", (tab,)).fetchone()
+
+        if top is None:
+            return
+
+        return (top, left), (bottom, right)
+
+    def get_shared_codes(self):
+        """Returns list of the values that are stored more than once"""
+
+        self.flush()
+
+        cursor = self.connection.execute(
+            "SELECT code FROM cells GROUP BY code HAVING COUNT(*) > 1")
+
+        return [self._decode(value) for value, in cursor]
+
+    def iteritems(self):
+        """Returns iterator over all key, value pairs"""
+
+        self.flush()
+
+        cursor = self.connection.execute("SELECT row, col, tab, code "
+                                         "FROM cells ORDER BY tab, row, col")
+
+        return (((row, col, tab), self._decode(code))
+                for row, col, tab, code in cursor)
+
+    def iteritems_in(self, start, stop):
+        """Returns iterator over key, value pairs inside a box
+
+        Parameters
+        ----------
+        start: 3-tuple of Integer
+        \tSmallest row, column and table of the box
+        stop: 3-tuple of Integer
+        \tRow, column and table behind the box
+
+        """
+
+        self.flush()
+
+        cursor = self.connection.execute(
+            "SELECT row, col, tab, code FROM cells WHERE "
+            "tab >= ? AND tab < ? AND row >= ? AND row < ? AND "
+            "col >= ? AND col < ? ORDER BY tab, row, col",
+            (start[2], stop[2], start[0], stop[0], start[1], stop[1]))
+
+        return iter([((row, col, tab), self._decode(code))
+                     for row, col, tab, code in cursor])
+
+    def iterkeys(self):
+        """Returns iterator over all keys"""
+
+        return (key for key, _ in self.iteritems())
+
+    __iter__ = iterkeys
+
+    def itervalues(self):
+        """Returns iterator over all values"""
+
+        return (value for _, value in self.iteritems())
+
+    def keys(self):
+        """Returns list of all keys"""
+
+        return list(self.iterkeys())
+
+    def values(self):
+        """Returns list of all values"""
+
+        return list(self.itervalues())
+
+    def items(self):
+        """Returns list of all key, value pairs"""
+
+        return list(self.iteritems())
+
+    def __repr__(self):
+        return repr(dict(self.iteritems()))
+
+# End of class SqliteStore
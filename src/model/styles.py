@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2008 Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+
+Styles
+======
+
+Styles contains the shared immutable attribute dicts of cells.
+
+Provides
+--------
+
+ * Style: Immutable attribute dict with an id
+ * StyleRegistry: Table of shared styles
+ * get_style_key: Hashable key of an attribute dict
+
+"""
+
+# Marks attribute values that are not hashable in style keys
+_UNHASHABLE = object()
+
+
+def get_style_key(attr_dict):
+    """Returns hashable key that is equal for equal attribute dicts
+
+    Values that are not hashable are represented by their identity.
+
+    """
+
+    items = []
+
+    for key, value in attr_dict.iteritems():
+        try:
+            hash(value)
+
+        except TypeError:
+            value = _UNHASHABLE, id(value)
+
+        items.append((key, value))
+
+    return frozenset(items)
+
+
+class Style(dict):
+    """Immutable attribute dict that is shared by all cells with equal format
+
+    Parameters
+    ----------
+    attr_dict: Dict
+    \tAttributes of the style
+    style_id: Integer
+    \tIndex of the style in its StyleRegistry
+
+    """
+
+    def __init__(self, attr_dict, style_id):
+        dict.__init__(self, attr_dict)
+        self.style_id = style_id
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError, "Style objects are immutable"
+
+    __setitem__ = __delitem__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return Style, (dict(self), self.style_id)
+
+# End of class Style
+
+
+class StyleRegistry(object):
+    """Table of shared styles, in which each attribute dict is stored once
+
+    Styles are never removed so that style ids stay valid.
+
+    """
+
+    def __init__(self):
+        # Style objects ordered by style id
+        self.styles = []
+
+        # Maps style key to style id
+        self.style_ids = {}
+
+    def __len__(self):
+        return len(self.styles)
+
+    def __getitem__(self, style_id):
+        """Returns Style for style_id"""
+
+        return self.styles[style_id]
+
+    def get_style_id(self, attr_dict):
+        """Returns id of the style that is equal to attr_dict
+
+        A new style is created if there is none.
+
+        """
+
+        style_key = get_style_key(attr_dict)
+
+        try:
+            return self.style_ids[style_key]
+
+        except KeyError:
+            style_id = self.style_ids[style_key] = len(self.styles)
+            self.styles.append(Style(attr_dict, style_id))
+
+            return style_id
+
+# End of class StyleRegistry
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unit test for attributeindex.py"""
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+from sys import path, modules
+path.insert(0, "..")
+path.insert(0, "../..")
+
+from lib.selection import Selection
+from model.attributeindex import AttributeIndex
+
+class TestAttributeIndex(object):
+    """Unit test for AttributeIndex"""
+
+    def setup_method(self, method):
+        """Creates AttributeIndex with 4x2 buckets and 6 buckets per block"""
+
+        self.index = AttributeIndex((4, 2), 6)
+
+        self.selections = [
+            (Selection([(2, 1)], [(5, 2)], [], [], []), 0),
+            (Selection([], [], [7], [3], [(1, 1)]), 0),
+            (Selection([(0, 0)], [(99, 99)], [], [], []), 0),
+            (Selection([(2, 1)], [(5, 2)], [], [], []), 1),
+        ]
+
+        for index, (selection, tab) in enumerate(self.selections):
+            self.index.add(index, selection, tab)
+
+    def test_get_indices(self):
+        """Only entries that contain the cell are returned in order"""
+
+        assert self.index.get_indices((3, 2, 0)) == [0, 2]
+        assert self.index.get_indices((7, 3, 0)) == [1, 2]
+        assert self.index.get_indices((1, 1, 0)) == [1, 2]
+        assert self.index.get_indices((6, 2, 0)) == [2]
+        assert self.index.get_indices((3, 2, 1)) == [3]
+        assert self.index.get_indices((6, 2, 1)) == []
+
+        assert 0 in self.index.large_blocks
+
+    def test_get_indices_in(self):
+        """All entries that overlap a block are returned in order"""
+
+        assert self.index.get_indices_in(2, 1, 3, 2, 0) == [0, 2]
+        assert self.index.get_indices_in(8, 0, 9, 9, 0) == [1, 2]
+        assert self.index.get_indices_in(4, 1, 5, 1, 1) == [3]
+        assert self.index.get_indices_in(8, 8, 9, 9, 1) == []
+
+    def test_remove_last(self):
+        """Removed entries are not returned"""
+
+        for selection, tab in reversed(self.selections[1:]):
+            self.index.remove_last(selection, tab)
+
+        assert self.index.get_indices((7, 3, 0)) == []
+        assert self.index.get_indices((3, 2, 0)) == [0]
+        assert not self.index.rows
+        assert not self.index.large_blocks
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unit test for cellcode.py"""
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+import py.test as pytest
+from sys import path, modules
+path.insert(0, "..") 
+path.insert(0, "../..")
+
+from model.cellcode import split_assignment, parse_literal
+from model.cellcode import CellProgram, ProgramCache
+
+def test_split_assignment():
+    """Test global assignment detection"""
+    
+    assert split_assignment("a = 5") == ("a", " 5")
+    assert split_assignment("a == 5") == (None, "a == 5")
+    assert split_assignment("f(a=5)") == (None, "f(a=5)")
+
+def test_parse_literal():
+    """Test literal classification"""
+    
+    assert parse_literal("42") == (True, 42)
+    assert parse_literal(" -1.5") == (True, -1.5)
+    assert parse_literal("'Test'") == (True, "Test")
+    assert parse_literal("u'\\xe4'") == (True, u"\xe4")
+    
+    for code in ["a = 5", "[1, 2]", "1 +", "X + 1", "'a' * 3"]:
+        assert parse_literal(code) == (False, None)
+
+class TestCellProgram(object):
+    """Unit test for CellProgram"""
+    
+    def test_expression(self):
+        """Expressions are compiled and not literal"""
+        
+        program = CellProgram("S[X-1, Y, Z] + 1")
+        
+        assert eval(program.code_object, {"S": {(0, 0, 0): 1}, 
+                                          "X": 1, "Y": 0, "Z": 0}) == 2
+        assert not program.is_literal
+        assert program.references.get_cells((1, 0, 0)) == [(0, 0, 0)]
+        
+    def test_literal(self):
+        """Immutable literals are classified"""
+        
+        for code, value in [("1", 1), (" 2.5", 2.5), ("u'a'", u"a"), 
+                            ("(1, 'b')", (1, "b")), ("None", None)]:
+            program = CellProgram(code)
+            assert program.is_literal
+            assert program.literal_value == value
+        
+        assert not CellProgram("[1, 2]").is_literal
+        assert not CellProgram("a = 1").is_literal
+        
+    def test_error(self):
+        """Compile errors are kept for evaluation"""
+        
+        program = CellProgram("1 +* 2")
+        
+        assert program.code_object is None
+        assert isinstance(program.error, SyntaxError)
+
+class TestProgramCache(object):
+    """Unit test for ProgramCache"""
+    
+    def setup_method(self, method):
+        """Creates ProgramCache with 2 entries"""
+        
+        self.program_cache = ProgramCache(2)
+        
+    def test_getitem(self):
+        """Test hits, misses and LRU eviction"""
+        
+        program = self.program_cache["1 + 1"]
+        assert self.program_cache["1 + 1"] is program
+        
+        self.program_cache["2 + 2"]
+        self.program_cache["1 + 1"]
+        self.program_cache["3 + 3"]
+        
+        assert "1 + 1" in self.program_cache
+        assert "2 + 2" not in self.program_cache
+        
+        assert self.program_cache.hits == 2
+        assert self.program_cache.misses == 3
+        assert self.program_cache.evictions == 1
+        assert self.program_cache.hit_rate == 0.4
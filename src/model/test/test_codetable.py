@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unit test for codetable.py"""
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+from sys import path, modules
+path.insert(0, "..")
+path.insert(0, "../..")
+
+from model.codetable import is_plain_literal, CodeTable, StoreCodeTable
+from model.sqlitestore import SqliteStore
+
+class TestCodeTable(object):
+    """Unit test for CodeTable"""
+
+    def setup_method(self, method):
+        """Creates empty CodeTable"""
+
+        self.code_table = CodeTable()
+
+    def test_intern(self):
+        """Equal code is shared"""
+
+        code_1 = self.code_table.intern("".join(["S[0, 0, 0]", " + 1"]))
+        code_2 = self.code_table.intern("".join(["S[0, 0, 0]", " + 1"]))
+
+        assert code_1 is code_2
+        assert len(self.code_table) == 1
+        assert self.code_table.refcounts[code_1] == 2
+
+    def test_release(self):
+        """Code is removed when it is no longer referenced"""
+
+        self.code_table.intern("a")
+        self.code_table.intern("a")
+        self.code_table.intern("b")
+
+        assert sorted(self.code_table.get_shared_codes()) == ["a"]
+        assert "b" not in self.code_table.refcounts
+
+        self.code_table.release("a")
+        self.code_table.release("b")
+        self.code_table.release("c")
+
+        assert "a" in self.code_table
+        assert "b" not in self.code_table
+        assert self.code_table.get_shared_codes() == []
+
+        self.code_table.release("a")
+
+        assert len(self.code_table) == 0
+
+    def test_literals(self):
+        """Plain literals are not interned"""
+
+        for code in ["1", " -2.5", "'a'", u'"b" ']:
+            assert is_plain_literal(code)
+            assert self.code_table.intern(code) is code
+
+        for code in ["", "a", "1 + 1", "[1]"]:
+            assert not is_plain_literal(code)
+
+        assert len(self.code_table) == 0
+
+    def test_copy(self):
+        """Copies have their own reference counts"""
+
+        self.code_table.intern("a")
+
+        code_table = self.code_table.copy()
+        code_table.release("a")
+
+        assert "a" in self.code_table
+        assert "a" not in code_table
+
+
+class TestStoreCodeTable(object):
+    """Unit test for StoreCodeTable"""
+
+    def setup_method(self, method):
+        """Creates StoreCodeTable of a SqliteStore"""
+
+        self.store = SqliteStore()
+        self.code_table = StoreCodeTable(self.store)
+
+    def test_shared_codes(self):
+        """Code is not interned and shared codes are counted by the store"""
+
+        code = "".join(["S[0, 0, 0]", " + 1"])
+
+        assert self.code_table.intern(code) is code
+
+        self.store[0, 0, 0] = code
+        self.store[1, 0, 0] = u"S[0, 0, 0] + 1"
+        self.store[2, 0, 0] = u"S[0, 0, 0] + 1"
+
+        assert self.code_table.get_shared_codes() == [u"S[0, 0, 0] + 1"]
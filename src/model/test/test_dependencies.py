@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unit test for dependencies.py"""
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+import py.test as pytest
+from sys import path, modules
+path.insert(0, "..") 
+path.insert(0, "../..")
+
+import time
+
+from model.dependencies import get_references, reads_cells, DependencyGraph
+from model.dependencies import RangeIndex, get_strongly_connected_component
+
+def test_get_references():
+    """Test static reference analysis"""
+    
+    refs = get_references("S[1, 2, 0] + S[X-1, Y, Z+2]")
+    assert refs.get_cells((5, 5, 1)) == [(1, 2, 0), (4, 5, 3)]
+    assert not refs.volatile
+    
+    refs = get_references("sum(S[0:10, Y, 0])")
+    assert refs.cells == []
+    assert refs.get_ranges((3, 4, 0)) == [((0, 10), (4, 5), (0, 1))]
+    assert not refs.volatile
+    
+    # Dynamic references are volatile, macro calls are marked
+    
+    assert get_references("S[int(X), 0, 0]").volatile
+    assert get_references("S").volatile
+    assert not get_references("my_macro(3)").volatile
+    assert get_references("my_macro(3)").calls
+    assert not get_references("len([3])").calls
+    
+    assert get_references("a + 1").names == frozenset(["a"])
+    assert not get_references("1 +* 2").volatile
+    
+    # Bound position names are not the cell position
+    
+    assert get_references("sum(S[X, 1, 0] for X in xrange(3))").volatile
+    assert get_references("[S[0, Y, 0] for Y, _ in a]").volatile
+    assert get_references("(lambda X: S[X, 0, 0])(2)").volatile
+    assert get_references("(lambda *R: S[R, 0, 0])(2)").volatile
+    assert not get_references("[S[X, 0, 0] for a in b]").volatile
+
+def test_reads_cells():
+    """Test detection of macros that read cells"""
+    
+    assert reads_cells("def f():\n    return S[0, 0, 0]")
+    assert not reads_cells("def f(x):\n    return x + 1")
+    assert not reads_cells("def f(:")
+
+class TestRangeIndex(object):
+    """Unit test for RangeIndex"""
+    
+    def setup_method(self, method):
+        """Creates RangeIndex with 4x2 buckets and 6 buckets per range"""
+        
+        self.index = RangeIndex((4, 2), 6)
+        
+        self.index.add((0, 9, 0), ((2, 6), (1, 3), (0, 1)))
+        self.index.add((1, 9, 0), ((None, None), (0, 1), (0, 1)))
+        self.index.add((2, 9, 0), ((0, 100), (0, 100), (0, 1)))
+        self.index.add((3, 9, 1), ((2, 6), (1, 3), (None, None)))
+    
+    def test_get_dependents(self):
+        """Only cells whose ranges contain the key are returned"""
+        
+        assert self.index.get_dependents((3, 2, 0)) == \
+            set([(0, 9, 0), (2, 9, 0), (3, 9, 1)])
+        assert self.index.get_dependents((50, 0, 0)) == \
+            set([(1, 9, 0), (2, 9, 0)])
+        assert self.index.get_dependents((3, 2, 5)) == set([(3, 9, 1)])
+        assert self.index.get_dependents((3, 5, 0)) == set([(2, 9, 0)])
+        
+        assert 0 in self.index.large_ranges
+        assert None in self.index.large_ranges
+    
+    def test_remove(self):
+        """Removed ranges are not returned"""
+        
+        self.index.remove((0, 9, 0), ((2, 6), (1, 3), (0, 1)))
+        self.index.remove((3, 9, 1), ((2, 6), (1, 3), (None, None)))
+        
+        assert self.index.get_dependents((3, 2, 0)) == set([(2, 9, 0)])
+        assert None not in self.index.large_ranges
+
+def test_get_strongly_connected_component():
+    """Test cycle component search"""
+    
+    precedents = {
+        "a": ["b"],
+        "b": ["c", "d"],
+        "c": ["a"],
+        "d": [],
+        "e": ["a"],
+    }
+    
+    assert get_strongly_connected_component("a", precedents.get) == \
+                set(["a", "b", "c"])
+    assert get_strongly_connected_component("e", precedents.get) == \
+                set(["e"])
+
+class TestDependencyGraph(object):
+    """Unit test for DependencyGraph"""
+    
+    def setup_method(self, method):
+        """Creates DependencyGraph with a chain and an unrelated cell"""
+        
+        self.graph = DependencyGraph()
+        
+        self.graph.add((1, 0, 0), get_references("S[0, 0, 0] + 1"))
+        self.graph.add((2, 0, 0), get_references("S[X-1, Y, Z] * 2"))
+        self.graph.add((0, 5, 0), get_references("S[0, 4, 0]"))
+        
+    def test_get_dirty(self):
+        """Test transitive invalidation"""
+        
+        assert self.graph.get_dirty([(0, 0, 0)]) == \
+               set([(0, 0, 0), (1, 0, 0), (2, 0, 0)])
+        assert self.graph.get_dirty([(2, 0, 0)]) == set([(2, 0, 0)])
+        
+    def test_volatile(self):
+        """Volatile cells are always dirty"""
+        
+        self.graph.add((9, 9, 0), get_references("S[int(X), 0, 0]"))
+        assert (9, 9, 0) in self.graph.get_dirty([(0, 4, 0)])
+        
+    def test_callers(self):
+        """Macro callers are dirty only if macros may read cells"""
+        
+        self.graph.add((9, 9, 0), get_references("my_macro(3)"))
+        assert (9, 9, 0) not in self.graph.get_dirty([(0, 4, 0)])
+        
+        self.graph.macros_read_cells = True
+        self.graph.clear()
+        self.graph.add((9, 9, 0), get_references("my_macro(3)"))
+        assert (9, 9, 0) in self.graph.get_dirty([(0, 4, 0)])
+        
+    def test_ranges(self):
+        """Range references depend on all cells in the range"""
+        
+        self.graph.add((0, 9, 0), get_references("sum(S[:, 0, 0])"))
+        assert (0, 9, 0) in self.graph.get_dirty([(99, 0, 0)])
+        assert (0, 9, 0) not in self.graph.get_dirty([(99, 1, 0)])
+        
+        self.graph.remove((0, 9, 0))
+        assert (0, 9, 0) not in self.graph.get_dirty([(99, 0, 0)])
+        
+    def test_range_fan_out(self):
+        """Invalidation of many running sums does not test all pairs"""
+        
+        references = get_references("sum(S[0:X, 0, 0])")
+        
+        for row in xrange(1, 3001):
+            self.graph.add((row, 0, 0), references)
+        
+        start = time.time()
+        dirty = self.graph.get_dirty([(0, 0, 0)])
+        
+        assert time.time() - start < 1.0
+        assert len(dirty) == 3001
+        assert self.graph.get_dirty([(3000, 0, 0)]) == set([(3000, 0, 0)])
+        
+    def test_names(self):
+        """Readers of assigned globals depend on the assigning cell"""
+        
+        self.graph.add((0, 0, 1), get_references("3"), "a")
+        self.graph.add((1, 0, 1), get_references("a + 1"))
+        
+        assert (1, 0, 1) in self.graph.get_dirty([(0, 0, 1)])
+        assert (1, 0, 1) in self.graph.get_dirty([(5, 5, 1)], ["a"])
+        
+    def test_remove(self):
+        """Test unregistering of cells"""
+        
+        self.graph.remove((1, 0, 0))
+        
+        assert (1, 0, 0) not in self.graph
+        assert self.graph.get_dirty([(0, 0, 0)]) == set([(0, 0, 0)])
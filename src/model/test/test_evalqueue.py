@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unit test for evalqueue.py"""
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+import py.test as pytest
+from sys import path, modules
+path.insert(0, "..") 
+path.insert(0, "../..")
+
+from model.model import CodeArray
+from model.evalqueue import PENDING
+
+class TestEvaluationQueue(object):
+    """Unit test for EvaluationQueue"""
+    
+    def setup_method(self, method):
+        """Creates CodeArray with literal and formula cells"""
+        
+        self.code_array = CodeArray((100, 10, 3))
+        self.evaluation_queue = self.code_array.evaluation_queue
+        
+        self.code_array[0, 0, 0] = "1"
+        self.code_array[1, 0, 0] = "S[0, 0, 0] + 1"
+        self.code_array[2, 0, 0] = "S[1, 0, 0] + 1"
+        self.code_array[50, 5, 0] = "2 ** 10"
+        
+    def test_get(self):
+        """Only cells that need evaluation are pending"""
+        
+        assert self.evaluation_queue.get((0, 0, 0)) == 1
+        assert self.evaluation_queue.get((3, 0, 0)) is None
+        assert self.evaluation_queue.get((1, 0, 0)) is PENDING
+        assert unicode(PENDING) == u"..."
+        
+        assert self.evaluation_queue.requested.keys() == [(1, 0, 0)]
+        
+    def test_evaluate(self):
+        """Requested cells come first, then background cells"""
+        
+        self.evaluation_queue.get((2, 0, 0))
+        
+        visible_slice = slice(0, 10), slice(0, 5), slice(0, 1)
+        
+        finished_keys = self.evaluation_queue.evaluate(10, visible_slice)
+        
+        assert finished_keys[0] == (2, 0, 0)
+        assert sorted(finished_keys[1:]) == [(50, 5, 0)]
+        assert not self.evaluation_queue
+        
+        assert self.evaluation_queue.get((2, 0, 0)) == 3
+        assert self.evaluation_queue.get((50, 5, 0)) == 1024
+        
+        # Changes queue the dirty cells only
+        
+        self.code_array[0, 0, 0] = "5"
+        
+        assert self.evaluation_queue
+        assert sorted(self.evaluation_queue.background) == \
+                    [(0, 0, 0), (1, 0, 0), (2, 0, 0)]
+        assert sorted(self.evaluation_queue.evaluate(10)) == \
+                    [(1, 0, 0), (2, 0, 0)]
+        assert self.code_array.result_cache[(2, 0, 0)] == 7
+        
+    def test_invisible(self):
+        """Requested cells outside of the visible slice are deferred"""
+        
+        self.evaluation_queue.get((50, 5, 0))
+        
+        self.evaluation_queue.evaluate(0, (slice(0, 10), slice(0, 5), 
+                                           slice(0, 1)))
+        
+        assert not self.evaluation_queue.requested
@@ -19,7 +19,8 @@
 # --------------------------------------------------------------------
 
 import py.test as pytest
-from sys import path, modules
+from sys import path, modules, getrefcount
+import time
 path.insert(0, "..") 
 path.insert(0, "../..") 
 
@@ -30,7 +31,10 @@ import numpy
 import wx
 
 from model.model import KeyValueStore, CellAttributes, DictGrid
-from model.model import DataArray, CodeArray
+from model.model import DataArray, CodeArray, CircularReferenceError
+from model.model import EvaluationTimeoutError
+from model.tilestore import TileStore
+from model.sqlitestore import SqliteStore
 
 from lib.selection import Selection
 
@@ -78,6 +82,158 @@ class TestCellAttributes(object):
         assert self.cell_attr[32, 53]["testattr"] == 2
         assert self.cell_attr[2, 2]["testattr"] == 3
 
+    def test_index(self):
+        """Lookups follow appends, pops and in place changes"""
+        
+        selection = Selection([(2, 2)], [(4, 5)], [], [], [])
+        
+        self.cell_attr.append((selection, 0, {"angle": 90}))
+        
+        assert self.cell_attr[3, 3, 0]["angle"] == 90
+        
+        self.cell_attr.extend([(Selection([], [], [3], [], []), 0, 
+                                {"angle": 45})])
+        
+        assert self.cell_attr[3, 4, 0]["angle"] == 45
+        
+        self.cell_attr.pop()
+        
+        assert self.cell_attr[3, 5, 0]["angle"] == 90
+        
+        selection.insert(0, 10, 0)
+        self.cell_attr.clear_index()
+        
+        assert self.cell_attr[12, 5, 0]["angle"] == 90
+        assert self.cell_attr[3, 6, 0]["angle"] == 0.0
+        
+        del self.cell_attr[:]
+        
+        assert self.cell_attr[12, 4, 0]["angle"] == 0.0
+    
+    def test_cache(self):
+        """Appends only invalidate cached cells of their selection"""
+        
+        self.cell_attr._max_attr_cache = 3
+        
+        for col in xrange(4):
+            self.cell_attr[0, col, 0]
+        
+        assert self.cell_attr._attr_cache.keys() == \
+            [(0, 1, 0), (0, 2, 0), (0, 3, 0)]
+        
+        cached_attrs = self.cell_attr[0, 1, 0]
+        
+        self.cell_attr.append((Selection([], [], [], [3], []), 0, 
+                               {"angle": 90}))
+        self.cell_attr.append((Selection([], [], [], [2], []), 1, 
+                               {"angle": 90}))
+        
+        assert self.cell_attr._attr_cache.keys() == [(0, 2, 0), (0, 1, 0)]
+        assert self.cell_attr[0, 1, 0] is cached_attrs
+        assert self.cell_attr[0, 3, 0]["angle"] == 90
+        
+        self.cell_attr.pop()
+        self.cell_attr.pop()
+        
+        assert self.cell_attr[0, 3, 0]["angle"] == 0.0
+    
+    def test_get_style_ids(self):
+        """Block resolution equals the resolution of the single cells"""
+        
+        self.cell_attr._max_attr_cache = 1000
+        
+        self.cell_attr.extend([
+            (Selection([(2, 1)], [(6, 4)], [], [], []), 0, {"angle": 90}),
+            (Selection([], [], [3], [2], [(0, 0)]), 0, {"pointsize": 8}),
+            (Selection([(0, 0)], [(99, 99)], [], [], []), 0, {"angle": 45}),
+            (Selection([], [], [5], [], [(7, 7)]), 0, {"angle": 30}),
+            (Selection([], [], [4], [], []), 1, {"angle": 10}),
+        ])
+        
+        style_ids = self.cell_attr.get_style_ids(1, 0, 8, 7, 0)
+        
+        assert style_ids.shape == (8, 8)
+        assert self.cell_attr.has_style_id((1, 0, 0))
+        assert self.cell_attr.has_style_id((8, 7, 0))
+        
+        self.cell_attr.clear_index()
+        
+        for row in xrange(1, 9):
+            for col in xrange(8):
+                assert style_ids[row - 1, col] == \
+                    self.cell_attr.get_style_id((row, col, 0))
+    
+    def test_compact(self):
+        """Compaction does not change cell attributes"""
+        
+        block = Selection([(0, 0)], [(9, 9)], [], [], [])
+        
+        entries = [
+            (Selection([], [], [], [], [(1, 1)]), 0, {"angle": 90}),
+            (Selection([], [], [], [], [(1, 2)]), 0, {"angle": 90}),
+            (Selection([(2, 2)], [(3, 3)], [], [], []), 0, {"angle": 45, 
+                                                            "pointsize": 8}),
+            (Selection([], [], [], [], [(5, 5)]), 1, {"angle": 30}),
+            (block, 0, {"angle": 0.0}),
+            (block, 0, {"underline": True}),
+            (Selection([], [], [], [], [(20, 20)]), 0, {"angle": 90}),
+        ]
+        
+        self.cell_attr.extend(entries)
+        
+        keys = [(row, col, tab) for row in xrange(22) for col in xrange(22)
+                                for tab in xrange(2)]
+        attrs = [self.cell_attr[key] for key in keys]
+        
+        assert self.cell_attr.compact() == 3
+        
+        assert [self.cell_attr[key] for key in keys] == attrs
+        assert list.__getitem__(self.cell_attr, 2) == \
+            (block, 0, {"angle": 0.0, "underline": True})
+        assert self.cell_attr.compacted_length == 4
+        
+        # Entries from stop on are kept
+        self.cell_attr.append((block, 0, {"angle": 0.0}))
+        
+        assert self.cell_attr.compact(4) == 0
+        assert len(self.cell_attr) == 5
+    
+    def test_frozen(self):
+        """Refreshes of frozen results do not add styles"""
+        
+        selection = Selection([], [], [], [], [(1, 1)])
+        attr_dict = {"frozen": numpy.zeros(10)}
+        
+        self.cell_attr.append((selection, 0, attr_dict))
+        self.cell_attr.get_style_ids(0, 0, 2, 2, 0)
+        
+        no_styles = len(self.cell_attr.styles)
+        
+        for refresh in xrange(50):
+            attr_dict["frozen"] = numpy.ones(10) * refresh
+            self.cell_attr.clear_index()
+            
+            assert self.cell_attr[1, 1, 0]["frozen"] is attr_dict["frozen"]
+            assert self.cell_attr[0, 0, 0]["frozen"] is False
+        
+        assert len(self.cell_attr.styles) == no_styles
+        
+        # Frozen results are looked up without the style id cache
+        
+        self.cell_attr.clear_index()
+        
+        assert self.cell_attr.get_frozen((1, 1, 0)) is attr_dict["frozen"]
+        assert self.cell_attr.get_frozen((0, 0, 0)) is False
+        assert not self.cell_attr._attr_cache
+        
+        self.cell_attr.append((selection, 0, {"frozen": False}))
+        
+        assert self.cell_attr.get_frozen((1, 1, 0)) is False
+        
+        self.cell_attr.pop()
+        
+        assert self.cell_attr.get_frozen((1, 1, 0)) is attr_dict["frozen"]
+
 class TestParserMixin(object):
     """Unit test for ParserMixin"""
     
@@ -103,10 +259,73 @@ class TestStringGeneratorMixin(object):
     """Unit test for StringGeneratorMixin"""
     
     def test_grid_to_strings(self):
-        pass
+        """Shared code is saved once in the code dictionary"""
+        
+        dict_grid = DictGrid((100, 100, 100))
+        
+        for row in xrange(3):
+            dict_grid[row, 0, 0] = "S[X, 1, Z]"
+        dict_grid[5, 5, 5] = "7"
+        
+        lines = list(dict_grid.grid_to_strings())
+        
+        assert lines == [u"[shape]\n", u"100\t100\t100\n", 
+                         u"[code_dictionary]\n", u"0\tS[X, 1, Z]\n", 
+                         u"[grid_references]\n", u"0\t0\t0\t0\n", 
+                         u"1\t0\t0\t0\n", u"2\t0\t0\t0\n", 
+                         u"[grid]\n", u"5\t5\t5\t7\n"]
+        
+        new_grid = DictGrid((100, 100, 100))
+        
+        parsers = {
+            u"[shape]\n": new_grid.parse_to_shape,
+            u"[code_dictionary]\n": new_grid.parse_to_code_dictionary,
+            u"[grid_references]\n": new_grid.parse_to_grid_reference,
+            u"[grid]\n": new_grid.parse_to_grid,
+        }
+        
+        for line in lines:
+            if line in parsers:
+                parser = parsers[line]
+            else:
+                parser(line)
+        
+        assert sorted(new_grid.iteritems()) == sorted(dict_grid.iteritems())
+        assert new_grid[0, 0, 0] is new_grid[2, 0, 0]
 
     def test_attributes_to_strings(self):
-        pass
+        """Shared styles are saved once in the styles section"""
+        
+        dict_grid = DictGrid((100, 100, 100))
+        
+        selections = [Selection([], [], [], [], [(row, 0)]) 
+                      for row in xrange(3)]
+        
+        dict_grid.cell_attributes.append((selections[0], 0, {"angle": 90}))
+        dict_grid.cell_attributes.append((selections[1], 0, {"angle": 45}))
+        dict_grid.cell_attributes.append((selections[2], 0, {"angle": 90}))
+        
+        lines = list(dict_grid.attributes_to_strings())
+        
+        assert lines[:3] == [u"[styles]\n", u"0\t'angle'\t90\n", 
+                             u"[attributes]\n"]
+        assert lines[3].endswith(u"\t0\t0\n")
+        assert lines[4].endswith(u"\t0\t'angle'\t45\n")
+        
+        new_grid = DictGrid((100, 100, 100))
+        
+        parser = new_grid.parse_to_style
+        
+        for line in lines[1:]:
+            if line == u"[attributes]\n":
+                parser = new_grid.parse_to_attribute
+            else:
+                parser(line)
+        
+        assert [attrs for _, _, attrs in new_grid.cell_attributes] == \
+            [{"angle": 90}, {"angle": 45}, {"angle": 90}]
+        assert new_grid.cell_attributes[2, 0, 0] is \
+            new_grid.cell_attributes[0, 0, 0]
 
     def test_heights_to_strings(self):
         pass
@@ -131,7 +350,117 @@ class TestDictGrid(object):
         
         with pytest.raises(IndexError):
             self.dict_grid[100, 0, 0]
+
+    def test_store(self):
+        """Test if KeyValueStore can replace the default store"""
+
+        dict_grid = DictGrid((100, 100, 100), store=KeyValueStore())
+
+        dict_grid[1, 2, 3] = "7"
+        dict_grid[50, 2, 3] = "8"
+
+        assert dict_grid[1, 2, 3] == "7"
+        assert dict_grid[1, 2, 4] is None
+        assert list(dict_grid.iteritems_in((0, 0, 3), (10, 10, 4))) == \
+            [((1, 2, 3), "7")]
+
+    def test_used_range(self):
+        """Used ranges follow set, pop and shift"""
+
+        assert self.dict_grid.get_used_range(0) is None
+
+        self.dict_grid[5, 3, 0] = "1"
+        self.dict_grid[2, 7, 0] = "2"
+        self.dict_grid[9, 9, 1] = "3"
+
+        assert self.dict_grid.get_used_range(0) == ((2, 3), (5, 7))
+        assert self.dict_grid.get_used_range(1) == ((9, 9), (9, 9))
+
+        self.dict_grid[8, 1, 0] = "4"
+
+        assert self.dict_grid.get_used_range(0) == ((2, 1), (8, 7))
+
+        self.dict_grid.pop((8, 1, 0))
+
+        assert self.dict_grid.get_used_range(0) == ((2, 3), (5, 7))
+
+        self.dict_grid.shift(3, 2, 0)
+
+        assert self.dict_grid.get_used_range(0) == ((2, 3), (7, 7))
+        assert self.dict_grid.get_used_range(1) == ((11, 9), (11, 9))
+
+        self.dict_grid.shift(4, -2, 1)
+
+        assert self.dict_grid.get_used_range(0) == ((2, 5), (2, 5))
+
+        self.dict_grid.clear()
+
+        assert self.dict_grid.get_used_range(1) is None
+
+    def test_code_table(self):
+        """Cells share their code, which is released on removal"""
+
+        for row in xrange(10):
+            self.dict_grid[row, 0, 0] = "".join(["S[X-1, Y, Z]", " + 1"])
+
+        assert self.dict_grid[0, 0, 0] is self.dict_grid[9, 0, 0]
+        assert len(self.dict_grid.code_table) == 1
+
+        self.dict_grid[0, 0, 0] = "2"
+        self.dict_grid.pop((1, 0, 0))
+        self.dict_grid.shift(5, -3, 0)
+
+        assert self.dict_grid.code_table.refcounts["S[X-1, Y, Z] + 1"] == 5
+        assert "2" not in self.dict_grid.code_table
+
+        self.dict_grid.clear()
+
+        assert len(self.dict_grid.code_table) == 0
+
+        # Unique values do not add table entries
+
+        for row in xrange(100):
+            self.dict_grid[row, 1, 0] = repr(row * 0.5)
+            self.dict_grid[row, 2, 0] = repr(str(row))
+
+        assert len(self.dict_grid.code_table) == 0
+        assert not self.dict_grid.code_table.refcounts
+
+    def test_code_table_disk(self):
+        """Unique code of on-disk stores is not kept in memory"""
+        
+        store = SqliteStore(page_shape=(1, 1), max_pages=1, batch_size=1)
+        self.dict_grid.store = store
+        
+        codes = [repr(row) for row in xrange(100, 200)]
+        refcounts = [getrefcount(code) for code in codes]
+        
+        for row, code in enumerate(codes):
+            self.dict_grid[row, 0, 0] = code
+        
+        self.dict_grid[0, 1, 0] = "1"
+        self.dict_grid[0, 2, 0] = "1"
         
+        assert [getrefcount(code) for code in codes] == refcounts
+        assert self.dict_grid.code_table.get_shared_codes() == ["1"]
+        
+        shared = u"".join(self.dict_grid.grid_to_strings())
+        
+        assert u"[code_dictionary]\n0\t1\n" in shared
+    
+    def test_used_range_stores(self):
+        """All stores compute the same used range"""
+
+        for store in [TileStore((4, 2)), KeyValueStore()]:
+            dict_grid = DictGrid((100, 100, 100), store=store)
+
+            dict_grid[13, 5, 2] = "1"
+            dict_grid[3, 22, 2] = "2"
+            dict_grid[0, 0, 1] = "3"
+
+            assert store.get_used_range(2) == ((3, 5), (13, 22))
+            assert store.get_used_range(0) is None
+
 class TestDataArray(object):
     """Unit test for DataArray"""
     
@@ -167,6 +496,16 @@ class TestDataArray(object):
         
         assert self.data_array.shape == (10000, 100, 100)
         
+        self.data_array[5, 5, 0] = "1"
+        self.data_array[50, 5, 0] = "2"
+        self.data_array[5, 50, 1] = "3"
+        self.data_array[5, 5, 60] = "4"
+        
+        self.data_array.shape = (10, 100, 50)
+        
+        assert sorted(self.data_array.keys()) == [(5, 5, 0), (5, 50, 1)]
+        assert self.data_array.dict_grid.get_used_range(0) == ((5, 5), (5, 5))
+        
     def test_getstate(self):
         """Test pickle support"""
         
@@ -198,6 +537,60 @@ class TestDataArray(object):
         
         pass
         
+    def test_get_block(self):
+        """Test block read of cell code"""
+
+        self.data_array[2, 3, 4] = "42"
+        self.data_array[4, 3, 4] = "43"
+        self.data_array[5, 5, 4] = "44"
+
+        block = self.data_array.get_block((slice(0, 6), slice(3, 6), 4))
+
+        assert block.shape == (6, 3)
+        assert block[2, 0] == "42"
+        assert block[5, 2] == "44"
+        assert block[0, 0] is None
+
+        block = self.data_array.get_block((slice(6, 1, -2), 3, 4))
+
+        assert block.tolist() == [None, "43", "42"]
+
+    def test_setitem_slice(self):
+        """Slice assignment writes all cells of the slice"""
+
+        self.data_array[1:4, 2, 0:2] = "'a'"
+
+        assert len(self.data_array.keys()) == 6
+        assert self.data_array[3, 2, 1] == "'a'"
+        assert self.data_array[4, 2, 1] is None
+
+        self.data_array.unredo.undo()
+
+        assert not self.data_array.keys()
+
+    def test_set_block(self):
+        """Test block assignment"""
+
+        self.data_array[0, 0, 0] = "'x'"
+        self.data_array.unredo.reset()
+
+        self.data_array.set_block((98, 98, 5), [["1", "2", "3"], ["4", ""]])
+
+        assert len(self.data_array.unredo.undolist) == 2
+        assert sorted(self.data_array.keys()) == \
+            [(0, 0, 0), (98, 98, 5), (98, 99, 5), (99, 98, 5)]
+
+        block = numpy.arange(8).reshape((2, 2, 2))
+        self.data_array.set_block((0, 0, 0), block)
+
+        assert self.data_array[0, 0, 0] == "0"
+        assert self.data_array[1, 1, 1] == "7"
+
+        self.data_array.unredo.undo()
+
+        assert self.data_array[0, 0, 0] == "'x'"
+        assert self.data_array[1, 1, 1] is None
+
     def test_insert(self):
         """Tests insert operation"""
         
@@ -219,7 +612,104 @@ class TestDataArray(object):
         assert self.data_array[1, 3, 4] == "42"
         print self.data_array.shape
         assert self.data_array.shape == (99, 100, 100)
-        
+
+    def test_insert_delete_undo(self):
+        """Insertion and deletion are single undo steps"""
+
+        for row in xrange(10):
+            self.data_array[row, 3, 4] = str(row)
+
+        self.data_array.unredo.reset()
+
+        self.data_array.delete(2, 3, 0)
+
+        assert len(self.data_array.unredo.undolist) == 2
+        assert self.data_array[2, 3, 4] == "5"
+        assert self.data_array[9, 3, 4] is None
+        assert len(self.data_array.keys()) == 7
+
+        self.data_array.unredo.undo()
+
+        assert self.data_array.shape == (100, 100, 100)
+        assert [self.data_array[row, 3, 4] for row in xrange(10)] == \
+            map(str, xrange(10))
+
+        self.data_array.insert(5, 10, 0)
+        self.data_array.unredo.undo()
+
+        assert len(self.data_array.keys()) == 10
+        assert self.data_array[9, 3, 4] == "9"
+
+        self.data_array.unredo.redo()
+
+        assert self.data_array.shape == (110, 100, 100)
+        assert self.data_array[19, 3, 4] == "9"
+
+    def test_compact_cell_attributes(self):
+        """Entries that undo may pop are not compacted"""
+
+        selection = Selection([], [], [], [], [(1, 1)])
+
+        for angle in [10, 20, 30]:
+            self.data_array.cell_attributes.undoable_append(
+                (selection, 0, {"angle": angle}))
+
+        self.data_array.unredo.undolist = \
+            self.data_array.unredo.undolist[-2:]
+
+        assert self.data_array.compact_cell_attributes() == 1
+        assert len(self.data_array.cell_attributes) == 2
+
+        self.data_array.unredo.undo()
+
+        assert self.data_array.cell_attributes[1, 1, 0]["angle"] == 20
+
+    def test_snapshot(self):
+        """Snapshots are unaffected by edits"""
+
+        selection = Selection([], [], [2], [], [])
+
+        self.data_array[1, 2, 0] = "1"
+        self.data_array.cell_attributes.append((selection, 0, {"angle": 90}))
+        self.data_array.row_heights[1, 0] = 40.0
+        self.data_array.macros = u"a = 1"
+
+        snapshot = self.data_array.snapshot()
+
+        self.data_array[1, 2, 0] = "2"
+        self.data_array.insert(0, 3, 0)
+        self.data_array.row_heights[1, 0] = 50.0
+        self.data_array.macros = u"a = 2"
+
+        assert snapshot.shape == (100, 100, 100)
+        assert snapshot[1, 2, 0] == "1"
+        assert snapshot.cell_attributes[2, 0, 0]["angle"] == 90
+        assert snapshot.row_heights[1, 0] == 40.0
+        assert snapshot.macros == u"a = 1"
+        assert self.data_array.cell_attributes[2, 0, 0]["angle"] == 0.0
+        assert self.data_array.cell_attributes[5, 0, 0]["angle"] == 90
+
+        snapshot[0, 0, 0] = "3"
+        snapshot.unredo.undo()
+
+        assert snapshot[0, 0, 0] is None
+        assert self.data_array[4, 2, 0] == "2"
+
+    def test_snapshot_frozen(self):
+        """Frozen results of snapshots are unaffected by refreshes"""
+
+        selection = Selection([], [], [], [], [(0, 0)])
+        attr_dict = {"frozen": 1}
+
+        self.data_array.cell_attributes.append((selection, 0, attr_dict))
+
+        snapshot = self.data_array.snapshot()
+
+        attr_dict["frozen"] = 2
+
+        assert list.__getitem__(snapshot.cell_attributes, 0)[2] == \
+            {"frozen": 1}
+
     def test_set_row_height(self):
         pass
 
@@ -294,14 +784,298 @@ class TestCodeArray(object):
         filled_grid[0, 0, 0] = "S[5:10, 1, 0]"
         assert filled_grid[0, 0, 0].tolist() == range(7, 12)
 
+    def test_get_block(self):
+        """Test block read of cell results"""
+
+        for row in xrange(5):
+            self.code_array[row, 0, 0] = str(row)
+            self.code_array[row, 1, 0] = str(row) + " / 2.0"
+
+        self.code_array[0, 2, 0] = "'a'"
+
+        block = self.code_array.get_block((slice(0, 5), 0, 0), dtype=None)
+        assert block.dtype == numpy.int64
+        assert block.tolist() == range(5)
+
+        block = self.code_array.get_block((slice(0, 5), slice(0, 2), 0),
+                                          dtype=None)
+        assert block.dtype == numpy.float64
+        assert block[4, 1] == 2.0
+
+        block = self.code_array.get_block((0, slice(0, 4), 0), dtype=None)
+        assert block.dtype == object
+        assert block.tolist() == [0, 0.0, "a", None]
+
+        assert self.code_array[0:5, 1, 0].dtype == object
+        assert self.code_array[0:5, 1, 0].tolist() == \
+            [row / 2.0 for row in xrange(5)]
+
+    def test_set_block(self):
+        """Block assignment invalidates affected results"""
+
+        self.code_array[0, 1, 0] = "list(S[0:3, 0, 0])"
+        self.code_array[0, 2, 0] = "S[1, 0, 0]"
+
+        assert self.code_array[0, 1, 0] == [None] * 3
+
+        self.code_array.set_block((0, 0, 0), [["1"], ["2"], ["3"]])
+
+        assert self.code_array[0, 1, 0] == [1, 2, 3]
+        assert self.code_array[0, 2, 0] == 2
+
+        self.code_array.unredo.undo()
+
+        assert self.code_array[0, 2, 0] is None
+
+    def test_result_invalidation(self):
+        """Only dependents of a changed cell are re-evaluated"""
+        
+        self.code_array[0, 0, 0] = "1"
+        self.code_array[1, 0, 0] = "S[0, 0, 0] + 1"
+        self.code_array[2, 0, 0] = "S[X-1, Y, Z] * 2"
+        self.code_array[5, 5, 0] = "3 + 4"
+        
+        assert self.code_array[2, 0, 0] == 4
+        assert self.code_array[5, 5, 0] == 7
+        
+        self.code_array[0, 0, 0] = "10"
+        
+        assert (5, 5, 0) in self.code_array.result_cache
+        assert (1, 0, 0) not in self.code_array.result_cache
+        assert self.code_array[2, 0, 0] == 22
+        
+        self.code_array.pop((0, 0, 0))
+        assert isinstance(self.code_array[1, 0, 0], Exception)
+    
+    def test_bound_position_invalidation(self):
+        """Position names that are bound in cell code are not positions"""
+        
+        for row in xrange(3):
+            self.code_array[row, 1, 0] = repr(row)
+        
+        self.code_array[0, 2, 0] = "sum(S[X, 1, 0] for X in xrange(3))"
+        
+        assert self.code_array[0, 2, 0] == 3
+        
+        self.code_array[2, 1, 0] = "10"
+        
+        assert self.code_array[0, 2, 0] == 11
+
+    def test_program_sharing(self):
+        """Filled down formulas share one compiled program"""
+        
+        programs = self.code_array.programs
+        
+        self.code_array[0, 5, 0] = "1"
+        for row in xrange(1, 50):
+            self.code_array[row, 5, 0] = "S[X-1, Y, Z] + 1"
+        
+        hits = programs.hits
+        
+        assert self.code_array[49, 5, 0] == 50
+        assert programs.hits >= hits + 48
+        
+        # Cached programs classify literals without parsing
+        
+        model_module = modules["model.model"]
+        parse_literal = model_module.parse_literal
+        parsed_codes = []
+        
+        def counting_parse_literal(code):
+            parsed_codes.append(code)
+            return parse_literal(code)
+        
+        self.code_array.reset_result_cache()
+        model_module.parse_literal = counting_parse_literal
+        
+        try:
+            assert self.code_array[49, 5, 0] == 50
+            
+        finally:
+            model_module.parse_literal = parse_literal
+        
+        assert parsed_codes == ["1"]
+
+    def test_literals(self):
+        """Literal cells are served without evaluation"""
+        
+        self.code_array[0, 0, 0] = "'Test'"
+        self.code_array[1, 0, 0] = "S[0, 0, 0] + '1'"
+        self.code_array.dict_grid[2, 0, 0] = "2.5"
+        
+        assert self.code_array.literals[0, 0, 0] == "Test"
+        assert self.code_array[1, 0, 0] == "Test1"
+        assert self.code_array[2, 0, 0] == 2.5
+        assert (2, 0, 0) in self.code_array.literals
+        assert (1, 0, 0) not in self.code_array.literals
+        
+        self.code_array[0, 0, 0] = "'Tes' + 't'"
+        
+        assert (0, 0, 0) not in self.code_array.literals
+        assert self.code_array[1, 0, 0] == "Test1"
+        
+        # Literal writes do not compile
+        
+        programs = self.code_array.programs
+        misses = programs.misses
+        
+        for row in xrange(100):
+            for col in xrange(3, 8):
+                self.code_array[row, col, 0] = repr(row * col)
+        
+        assert self.code_array[99, 7, 0] == 693
+        assert programs.misses == misses
+
+    def test_frozen_reads(self):
+        """Reading results does not fill the style id cache"""
+        
+        cell_attributes = self.code_array.cell_attributes
+        
+        self.code_array[0, 0, 0] = "1 + 1"
+        self.code_array[1, 0, 0] = "S[0, 0, 0] + 1"
+        cell_attributes.append((Selection([], [], [], [], [(1, 0)]), 0, 
+                                {"frozen": 5}))
+        
+        assert self.code_array[0, 0, 0] == 2
+        assert self.code_array[1, 0, 0] == 5
+        assert not cell_attributes._attr_cache
+        
+    def test_eval_writes(self):
+        """Evaluation does not write unchanged cell code to the store"""
+        
+        store = SqliteStore()
+        self.code_array.dict_grid.store = store
+        
+        self.code_array[0, 0, 0] = "1 + 1"
+        self.code_array[1, 0, 0] = "S[0, 0, 0] * 2"
+        store.commit()
+        
+        assert self.code_array[1, 0, 0] == 4
+        assert not store._pending
+        
+    def test_namespace(self):
+        """Macros, cell globals and nested cell positions in evaluation"""
+        
+        self.code_array.macros = "def double(x):\n    return 2 * x\n"
+        self.code_array.execute_macros()
+        
+        self.code_array[0, 0, 0] = "a = double(3)"
+        self.code_array[1, 0, 0] = "a + 1"
+        self.code_array[2, 0, 0] = "X + S[X-2, Y, Z] + X"
+        self.code_array[3, 0, 0] = "sum(S[x, Y, Z] for x in xrange(X))"
+        
+        assert self.code_array[0, 0, 0] == 6
+        assert self.code_array[1, 0, 0] == 7
+        assert self.code_array[2, 0, 0] == 10
+        assert self.code_array[3, 0, 0] == 23
+        
+        assert "a" not in vars(modules["model.model"])
+        
+        # Functions of cells keep the position of their cell
+        
+        self.code_array[7, 0, 0] = "lambda: X"
+        self.code_array[8, 0, 0] = "S[7, 0, 0]()"
+        
+        assert self.code_array[7, 0, 0]() == 7
+        assert self.code_array[8, 0, 0] == 7
+
     def test_cycle_detection(self):
         """Tests creation of cycle detection graph"""
         
         self.code_array[0, 1, 0] = 'S[1, 1, 0]'
         self.code_array[1, 1, 0] = 'S[0, 1, 0]'
+        self.code_array[2, 1, 0] = 'S[1, 1, 0] + 1'
+        self.code_array[3, 1, 0] = 'sum(S[0:5, 1, 0])'
         res = self.code_array[1, 1, 0]
-        comp = KeyError("Circular dependency at (1, 1, 0)")
-        assert repr(res) == repr(comp)
+        assert isinstance(res, CircularReferenceError)
+        assert isinstance(res, KeyError)
+        assert res.args == ("Circular dependency at (1, 1, 0)",)
+        
+        # All cells on the cycle get the error
+        assert self.code_array.cycles == {(0, 1, 0): res, (1, 1, 0): res}
+        assert self.code_array[0, 1, 0] is res
+        assert isinstance(self.code_array[2, 1, 0], Exception)
+        
+        # Range references that contain the cell itself
+        assert isinstance(self.code_array[3, 1, 0], CircularReferenceError)
+        
+        # Breaking the cycle
+        self.code_array[0, 1, 0] = '5'
+        assert not self.code_array.cycles
+        assert self.code_array[1, 1, 0] == 5
+        assert self.code_array[2, 1, 0] == 6
+
+    def test_iterative_calculation(self):
+        """Cycles are solved by fixed-point iteration in iterative mode"""
+        
+        config = modules["model.model"].config
+        iterative_calculation = config.data.iterative_calculation
+        config["iterative_calculation"] = "True"
+        
+        try:
+            # x = 1 + x / 2 converges to 2
+            self.code_array[0, 0, 0] = "1 + S[1, 0, 0] / 2.0"
+            self.code_array[1, 0, 0] = "S[0, 0, 0]"
+            self.code_array[2, 0, 0] = "S[1, 0, 0] * 10"
+            
+            assert abs(self.code_array[2, 0, 0] - 20) < 0.1
+            assert abs(self.code_array[0, 0, 0] - 2) < 0.01
+            assert not self.code_array.cycles
+            
+            # Non-converging cycles end after max_iterations
+            self.code_array[5, 0, 0] = "S[5, 0, 0] + 1"
+            
+            assert self.code_array[5, 0, 0] == config["max_iterations"]
+            
+        finally:
+            config["iterative_calculation"] = iterative_calculation
+
+    def test_eval_timeout(self):
+        """Cells that exceed the evaluation timeout are aborted"""
+        
+        config = modules["model.model"].config
+        eval_timeout = config.data.eval_timeout
+        config["eval_timeout"] = "0.1"
+        
+        # The timeout is read on creation and on macro execution
+        self.code_array.execute_macros()
+        assert self.code_array.eval_timeout == 0.1
+        
+        try:
+            self.code_array[0, 0, 0] = "sum(i for i in xrange(10 ** 10))"
+            self.code_array[1, 0, 0] = "S[0, 0, 0]"
+            self.code_array[2, 0, 0] = "1 + 1"
+            
+            assert isinstance(self.code_array[0, 0, 0], EvaluationTimeoutError)
+            assert self.code_array[1, 0, 0] is self.code_array[0, 0, 0]
+            assert self.code_array[2, 0, 0] == 2
+            
+            # Swallowed timeouts are reported
+            self.code_array.macros = \
+                "def swallow(n):\n" \
+                "    try:\n" \
+                "        return sum(i for i in xrange(n))\n" \
+                "    except:\n" \
+                "        return sum(i for i in xrange(n))\n"
+            self.code_array.execute_macros()
+            self.code_array[3, 0, 0] = "swallow(10 ** 10)"
+            
+            start = time.time()
+            assert isinstance(self.code_array[3, 0, 0], EvaluationTimeoutError)
+            assert time.time() - start < 1.0
+            
+            # Nested cells share the deadline of the outermost cell
+            self.code_array[4, 0, 0] = "sum(i for i in xrange(10 ** 6))"
+            for row in xrange(5, 15):
+                self.code_array[row, 0, 0] = \
+                    "S[X-1, 0, 0] + sum(i for i in xrange(10 ** 6))"
+            
+            start = time.time()
+            self.code_array[14, 0, 0]
+            assert time.time() - start < 0.5
+            
+        finally:
+            config["eval_timeout"] = eval_timeout
 
     def test_findnextmatch(self):
         """Find method test"""
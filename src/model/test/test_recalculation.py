@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unit test for recalculation.py"""
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+import py.test as pytest
+from sys import path, modules
+path.insert(0, "..") 
+path.insert(0, "../..")
+
+from model.model import CodeArray, EvaluationTimeoutError
+from model.recalculation import get_levels, Recalculation
+
+def test_get_levels():
+    """Test topological leveling"""
+    
+    precedents = {
+        (0, 0, 0): set(),
+        (1, 0, 0): set([(0, 0, 0)]),
+        (2, 0, 0): set([(0, 0, 0), (1, 0, 0)]),
+        (0, 1, 0): set(),
+        (5, 5, 0): set([(6, 5, 0)]),
+        (6, 5, 0): set([(5, 5, 0)]),
+    }
+    
+    levels, cyclic_keys = get_levels(precedents)
+    
+    assert map(sorted, levels) == [[(0, 0, 0), (0, 1, 0)], [(1, 0, 0)], 
+                                   [(2, 0, 0)]]
+    assert sorted(cyclic_keys) == [(5, 5, 0), (6, 5, 0)]
+
+class TestRecalculation(object):
+    """Unit test for Recalculation"""
+    
+    def setup_method(self, method):
+        """Creates CodeArray with a chain and independent cells"""
+        
+        self.code_array = CodeArray((100, 10, 3))
+        
+        self.code_array.macros = "factor = 3\n"
+        self.code_array.execute_macros()
+        
+        self.code_array[0, 0, 0] = "1"
+        for row in xrange(1, 20):
+            self.code_array[row, 0, 0] = "S[X-1, Y, Z] + 1"
+            self.code_array[row, 1, 0] = "factor * S[X, Y-1, Z]"
+        
+        self.code_array[0, 2, 0] = "sum(S[1:20, 1, 0])"
+        self.code_array[1, 2, 0] = "a = 5"
+        self.code_array[2, 2, 0] = "a + 1"
+        self.code_array[3, 2, 0] = "lambda: 1"
+        self.code_array[4, 2, 0] = "S[3, 2, 0]()"
+        
+    def test_local_keys(self):
+        """Cells with cell globals are evaluated in the main process"""
+        
+        recalculation = Recalculation(self.code_array, None)
+        
+        assert (1, 2, 0) in recalculation.local_keys
+        assert (2, 2, 0) in recalculation.local_keys
+        assert (1, 0, 0) not in recalculation.local_keys
+        assert (1, 2, 0) in recalculation.precedents[2, 2, 0]
+        assert len(recalculation.precedents[0, 2, 0]) == 19
+    
+    @pytest.mark.parametrize("processes", [1, 2])
+    def test_recalculate(self, processes):
+        """Results equal serial evaluation"""
+        
+        no_worker_cells = self.code_array.recalculate(processes=processes)
+        
+        if processes == 1:
+            assert no_worker_cells == 0
+        else:
+            assert no_worker_cells >= 38
+        
+        result_cache = self.code_array.result_cache
+        
+        assert result_cache[(19, 0, 0)] == 20
+        assert result_cache[(19, 1, 0)] == 60
+        assert self.code_array[0, 2, 0] == 3 * sum(xrange(2, 21))
+        assert self.code_array[2, 2, 0] == 6
+        assert self.code_array[4, 2, 0] == 1
+        
+        # Results of worker cells are invalidated as usual
+        
+        self.code_array[0, 0, 0] = "2"
+        
+        assert (19, 1, 0) not in result_cache
+        assert self.code_array[19, 1, 0] == 63
+    
+    def test_timeout(self):
+        """Workers that hang in C code are terminated"""
+        
+        config = modules["model.model"].config
+        eval_timeout = config.data.eval_timeout
+        config["eval_timeout"] = "0.2"
+        
+        try:
+            self.code_array[10, 3, 0] = "sum(xrange(10 ** 11))"
+            self.code_array[11, 3, 0] = "S[10, 3, 0]"
+            
+            self.code_array.recalculate(processes=2)
+            
+            result = self.code_array.result_cache[(10, 3, 0)]
+            
+            assert isinstance(result, EvaluationTimeoutError)
+            assert isinstance(self.code_array[11, 3, 0], 
+                              EvaluationTimeoutError)
+            assert self.code_array[19, 0, 0] == 20
+            
+        finally:
+            config["eval_timeout"] = eval_timeout
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unit test for resultcache.py"""
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+import py.test as pytest
+from sys import path, modules
+path.insert(0, "..") 
+path.insert(0, "../..")
+
+import numpy
+
+from model.resultcache import get_nbytes, ResultCache, MISSING
+
+def test_get_nbytes():
+    """Test result size estimation"""
+    
+    assert get_nbytes(numpy.zeros(1000)) == 8000
+    assert get_nbytes("a" * 1000) > 1000
+
+class TestResultCache(object):
+    """Unit test for ResultCache"""
+    
+    def setup_method(self, method):
+        """Creates ResultCache for 20000 bytes"""
+        
+        self.result_cache = ResultCache(20000)
+        
+    def test_get(self):
+        """Test hits and misses"""
+        
+        self.result_cache[1, 2, 0] = None
+        
+        assert self.result_cache.get((1, 2, 0)) is None
+        assert self.result_cache.get((1, 3, 0)) is MISSING
+        assert self.result_cache.hits == 1
+        assert self.result_cache.misses == 1
+        assert self.result_cache.hit_rate == 0.5
+        
+    def test_slice_keys(self):
+        """Keys with slices are stored as tuples"""
+        
+        key = slice(0, 10, None), 1, 0
+        
+        self.result_cache[key] = numpy.arange(10)
+        
+        assert key in self.result_cache
+        assert ((0, 10, None), 1, 0) in self.result_cache
+        assert self.result_cache.get_cache_key(key) == ((0, 10, None), 1, 0)
+        
+        self.result_cache.pop(key)
+        
+        assert not self.result_cache
+        assert self.result_cache.nbytes == 0
+        
+    def test_eviction(self):
+        """Least recently used results are evicted"""
+        
+        for row in xrange(3):
+            self.result_cache[row, 0, 0] = numpy.zeros(1000)
+        
+        assert self.result_cache.nbytes == 24000 - 8000
+        assert (0, 0, 0) not in self.result_cache
+        assert self.result_cache.evictions == 1
+        
+        self.result_cache.get((1, 0, 0))
+        self.result_cache[3, 0, 0] = numpy.zeros(1000)
+        
+        assert (1, 0, 0) in self.result_cache
+        assert (2, 0, 0) not in self.result_cache
+        
+        # Results larger than the budget are not stored
+        self.result_cache[4, 0, 0] = numpy.zeros(5000)
+        
+        assert (4, 0, 0) not in self.result_cache
+        assert self.result_cache.evictions == 3
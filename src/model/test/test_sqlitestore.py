@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unit test for sqlitestore.py"""
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+import os
+from threading import Thread
+
+import py.test as pytest
+from sys import path, modules
+path.insert(0, "..")
+path.insert(0, "../..")
+
+from model.sqlitestore import SqliteStore
+
+class TestSqliteStore(object):
+    """Unit test for SqliteStore"""
+
+    def setup_method(self, method):
+        """Creates SqliteStore with 4x2 pages and 2 pages in memory"""
+
+        self.store = SqliteStore(page_shape=(4, 2), max_pages=2)
+
+    def test_missing(self):
+        """Test if missing value returns None"""
+
+        assert self.store[1, 2, 3] is None
+        assert (1, 2, 3) not in self.store
+
+        self.store[1, 2, 3] = u"7"
+
+        assert self.store[1, 2, 3] == u"7"
+        assert (1, 2, 3) in self.store
+
+    def test_types(self):
+        """Unicode and str values keep their type"""
+
+        self.store[0, 0, 0] = u"'\xe4'"
+        self.store[0, 1, 0] = "'\xc3\xa4'"
+
+        self.store.pages.clear()
+
+        assert self.store[0, 0, 0] == u"'\xe4'"
+        assert type(self.store[0, 1, 0]) is str
+
+    def test_pages(self):
+        """Only max_pages pages are kept in memory"""
+
+        for row in xrange(20):
+            self.store[row, 0, 0] = str(row)
+
+        assert len(self.store) == 20
+        assert len(self.store.pages) == 2
+
+        assert [self.store[row, 0, 0] for row in xrange(20)] == \
+            map(str, xrange(20))
+
+        assert self.store.pop((3, 0, 0)) == "3"
+        assert len(self.store) == 19
+
+        self.store.pages.clear()
+
+        assert self.store[3, 0, 0] is None
+        assert self.store[4, 0, 0] == "4"
+
+    def test_pop(self):
+        """Test pop of missing keys"""
+
+        with pytest.raises(KeyError):
+            self.store.pop((1, 1, 1))
+
+        assert self.store.pop((1, 1, 1), "x") == "x"
+
+    def test_iteritems_in(self):
+        """Only keys inside the box are returned"""
+
+        for row in xrange(10):
+            for col in xrange(5):
+                self.store[row, col, 1] = "1"
+
+        keys = [key for key, _ in self.store.iteritems_in((3, 1, 1),
+                                                          (6, 4, 2))]
+
+        assert keys == [(row, col, 1) for row in xrange(3, 6)
+                                      for col in xrange(1, 4)]
+
+    def test_reopen(self, tmpdir):
+        """Cells are kept in the database file"""
+
+        path = str(tmpdir.join("grid.db"))
+
+        store = SqliteStore(path)
+        store[5, 5, 0] = u"5"
+        store.commit()
+
+        assert SqliteStore(path)[5, 5, 0] == u"5"
+        assert len(SqliteStore(path)) == 1
+
+    def test_get_used_range(self):
+        """Bounding box of a table spans several pages"""
+
+        assert self.store.get_used_range(0) is None
+
+        self.store[13, 5, 0] = "1"
+        self.store[3, 22, 0] = "2"
+        self.store[6, 3, 0] = "3"
+        self.store[0, 0, 1] = "4"
+
+        assert self.store.get_used_range(0) == ((3, 3), (13, 22))
+
+        self.store.pop((13, 5, 0))
+
+        assert self.store.get_used_range(0) == ((3, 3), (6, 22))
+
+    def test_snapshot(self):
+        """Snapshots are independent copies"""
+
+        self.store[0, 0, 0] = u"1"
+        self.store[5, 0, 0] = "2"
+
+        snapshot = self.store.snapshot()
+
+        self.store[0, 0, 0] = u"3"
+
+        assert snapshot[0, 0, 0] == u"1"
+        assert type(snapshot[5, 0, 0]) is str
+        assert len(snapshot) == 2
+
+        path = snapshot.path
+
+        del snapshot
+
+        assert not os.path.exists(path)
+
+    def test_snapshot_thread(self):
+        """Snapshots can be read from a worker thread"""
+
+        self.store[0, 0, 0] = u"1"
+
+        snapshot = self.store.snapshot()
+        items = []
+
+        thread = Thread(target=lambda: items.extend(snapshot.iteritems()))
+        thread.start()
+        thread.join()
+
+        assert items == [((0, 0, 0), u"1")]
+
+    def test_batch(self):
+        """Writes are collected until batch_size writes are pending"""
+
+        store = SqliteStore(page_shape=(4, 2), batch_size=3)
+
+        store[0, 0, 0] = u"1"
+        store[1, 0, 0] = u"2"
+        store.pop((0, 0, 0))
+
+        count = "SELECT COUNT(*) FROM cells"
+
+        assert store.connection.execute(count).fetchone() == (0,)
+
+        store[2, 0, 0] = u"3"
+
+        assert store.connection.execute(count).fetchone() == (2,)
+        assert store.items() == [((1, 0, 0), u"2"), ((2, 0, 0), u"3")]
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unit test for styles.py"""
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+from copy import copy
+import cPickle as pickle
+
+import py.test as pytest
+from sys import path, modules
+path.insert(0, "..")
+path.insert(0, "../..")
+
+from model.styles import Style, StyleRegistry
+
+class TestStyle(object):
+    """Unit test for Style"""
+
+    def test_immutable(self):
+        """Styles cannot be changed"""
+
+        style = Style({"angle": 90}, 3)
+
+        with pytest.raises(TypeError):
+            style["angle"] = 0
+
+        with pytest.raises(TypeError):
+            style.update({"angle": 0})
+
+        assert copy(style) is style
+
+        style = pickle.loads(pickle.dumps(style))
+
+        assert style == {"angle": 90}
+        assert style.style_id == 3
+
+class TestStyleRegistry(object):
+    """Unit test for StyleRegistry"""
+
+    def setup_method(self, method):
+        """Creates empty StyleRegistry"""
+
+        self.styles = StyleRegistry()
+
+    def test_get_style_id(self):
+        """Equal attribute dicts share one style"""
+
+        style_id = self.styles.get_style_id({"angle": 90, "pointsize": 8})
+
+        assert self.styles.get_style_id({"pointsize": 8, "angle": 90}) == \
+            style_id
+        assert self.styles.get_style_id({"angle": 90}) != style_id
+        assert len(self.styles) == 2
+        assert self.styles[style_id] == {"angle": 90, "pointsize": 8}
+
+    def test_unhashable(self):
+        """Unhashable values are compared by identity"""
+
+        value = [1, 2]
+
+        style_id = self.styles.get_style_id({"frozen": value})
+
+        assert self.styles.get_style_id({"frozen": value}) == style_id
+        assert self.styles.get_style_id({"frozen": [1, 2]}) != style_id
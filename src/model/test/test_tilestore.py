@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unit test for tilestore.py"""
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+import cPickle as pickle
+
+import py.test as pytest
+from sys import path, modules
+path.insert(0, "..")
+path.insert(0, "../..")
+
+from model.tilestore import TileStore
+
+class TestTileStore(object):
+    """Unit test for TileStore"""
+
+    def setup_method(self, method):
+        """Creates TileStore with 4x2 tiles"""
+
+        self.store = TileStore((4, 2))
+
+    def test_missing(self):
+        """Test if missing value returns None"""
+
+        assert self.store[1, 2, 3] is None
+        assert (1, 2, 3) not in self.store
+
+        self.store[1, 2, 3] = "7"
+
+        assert self.store[1, 2, 3] == "7"
+        assert (1, 2, 3) in self.store
+
+    def test_tiles(self):
+        """Tiles are created on write and removed when empty"""
+
+        self.store[0, 0, 0] = "1"
+        self.store[1, 1, 0] = "2"
+        self.store[9, 0, 0] = "3"
+        self.store[0, 0, 1] = "4"
+
+        assert len(self.store) == 4
+        assert sorted(self.store.tiles) == [(0, 0, 0), (0, 2, 0), (1, 0, 0)]
+
+        assert self.store.pop((9, 0, 0)) == "3"
+
+        assert len(self.store) == 3
+        assert (0, 2, 0) not in self.store.tiles
+
+        self.store[1, 1, 0] = None
+
+        assert len(self.store) == 2
+        assert self.store.tile_sizes[0, 0, 0] == 1
+
+    def test_dense(self):
+        """Tiles are dicts until they exceed dense_size cells"""
+
+        store = TileStore((4, 4), 4)
+
+        for col in xrange(4):
+            store[0, col, 0] = str(col)
+
+        assert type(store.tiles[0, 0, 0]) is dict
+        assert store.get_used_range(0) == ((0, 0), (0, 3))
+
+        store[3, 2, 0] = "x"
+
+        assert type(store.tiles[0, 0, 0]) is not dict
+        assert store[3, 2, 0] == "x"
+        assert store.get_used_range(0) == ((0, 0), (3, 3))
+        assert list(store.iteritems_in((0, 1, 0), (4, 3, 1))) == \
+            [((0, 1, 0), "1"), ((0, 2, 0), "2"), ((3, 2, 0), "x")]
+
+        for col in xrange(3):
+            store.pop((0, col, 0))
+
+        assert type(store.tiles[0, 0, 0]) is dict
+        assert store.items() == [((0, 3, 0), "3"), ((3, 2, 0), "x")]
+
+    def test_pop(self):
+        """Test pop of missing keys"""
+
+        with pytest.raises(KeyError):
+            self.store.pop((1, 1, 1))
+
+        assert self.store.pop((1, 1, 1), "x") == "x"
+
+    def test_iteritems(self):
+        """Iteration is ordered by table, tile and row"""
+
+        keys = [(5, 0, 1), (0, 3, 0), (1, 0, 0), (0, 1, 0), (8, 1, 0)]
+
+        for key in keys:
+            self.store[key] = repr(key)
+
+        assert list(self.store) == \
+            [(0, 1, 0), (1, 0, 0), (0, 3, 0), (8, 1, 0), (5, 0, 1)]
+        assert dict(self.store.iteritems()) == \
+            dict((key, repr(key)) for key in keys)
+
+    def test_iteritems_in(self):
+        """Only keys inside the box are returned"""
+
+        for row in xrange(10):
+            for col in xrange(5):
+                self.store[row, col, 0] = "0"
+                self.store[row, col, 1] = "1"
+
+        keys = [key for key, _ in self.store.iteritems_in((3, 1, 1),
+                                                          (6, 4, 2))]
+
+        assert sorted(keys) == [(row, col, 1) for row in xrange(3, 6)
+                                              for col in xrange(1, 4)]
+
+        # Keys may be removed while iterating
+        for key, _ in self.store.iteritems_in((0, 0, 0), (10, 5, 1)):
+            self.store.pop(key)
+
+        assert len(self.store) == 50
+
+    def test_pickle(self):
+        """Test pickling"""
+
+        self.store[3, 4, 0] = "a"
+
+        store = pickle.loads(pickle.dumps(self.store))
+
+        assert store[3, 4, 0] == "a"
+        assert len(store) == 1
+
+    def test_get_used_range(self):
+        """Bounding box of a table spans several tiles"""
+
+        assert self.store.get_used_range(0) is None
+
+        self.store[13, 5, 0] = "1"
+        self.store[3, 22, 0] = "2"
+        self.store[6, 3, 0] = "3"
+        self.store[0, 0, 1] = "4"
+
+        assert self.store.get_used_range(0) == ((3, 3), (13, 22))
+
+        self.store.pop((13, 5, 0))
+
+        assert self.store.get_used_range(0) == ((3, 3), (6, 22))
+
+    def test_snapshot(self):
+        """Snapshots share tiles until either store changes them"""
+
+        self.store[0, 0, 0] = "1"
+        self.store[5, 0, 0] = "2"
+
+        snapshot = self.store.snapshot()
+
+        assert snapshot.tiles[0, 0, 0] is self.store.tiles[0, 0, 0]
+
+        self.store[0, 1, 0] = "3"
+        self.store.pop((5, 0, 0))
+        snapshot[9, 0, 0] = "4"
+
+        assert snapshot.tiles[0, 0, 0] is not self.store.tiles[0, 0, 0]
+        assert sorted(snapshot.items()) == \
+            [((0, 0, 0), "1"), ((5, 0, 0), "2"), ((9, 0, 0), "4")]
+        assert sorted(self.store.items()) == \
+            [((0, 0, 0), "1"), ((0, 1, 0), "3")]
+        assert len(snapshot) == 3
@@ -0,0 +1,435 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2008 Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+
+Tilestore
+=========
+
+Tilestore contains the tiled key value store of layer 0 of the model.
+
+Provides
+--------
+
+ * TILE_SHAPE: Default number of rows and columns of a tile
+ * TileStore: Key value store that partitions tables into tiles with
+   copy-on-write snapshots
+
+"""
+
+from itertools import izip
+
+import numpy
+
+TILE_SHAPE = 256, 64
+
+
+class TileStore(object):
+    """Key value store for cell keys with default value None
+
+    Each table is partitioned into tiles of a fixed number of rows and
+    columns. Tiles are created on first write and removed when their last
+    cell is removed. Sparse tiles are dicts that map the position inside
+    the tile to the cell code. A tile with more than dense_size cells is
+    replaced by a numpy object array that holds references to the cell
+    codes, in which empty cells are None. Dense tiles become sparse again
+    when at most half of dense_size cells are left.
+
+    TileStore provides the dict operations that DictGrid uses. Iteration
+    is ordered by table, tile and row.
+
+    This class represents layer 0 of the model.
+
+    Parameters
+    ----------
+    tile_shape: 2-tuple of Integer, defaults to TILE_SHAPE
+    \tNumber of rows and columns of a tile
+    dense_size: Integer or None, defaults to None
+    \tNumber of cells, above which a tile is dense.
+    \tNone is 1/16 of the cells of a tile.
+
+    """
+
+    def __init__(self, tile_shape=TILE_SHAPE, dense_size=None):
+        self.tile_shape = tile_shape
+
+        if dense_size is None:
+            dense_size = tile_shape[0] * tile_shape[1] // 16
+
+        self.dense_size = dense_size
+
+        # Maps (tab, tile_row, tile_col) to tile dict or tile array
+        self.tiles = {}
+
+        # Maps (tab, tile_row, tile_col) to number of non-empty tile cells
+        self.tile_sizes = {}
+
+        self._len = 0
+
+        # Keys of tiles that are shared with snapshots
+        self._shared = set()
+
+    def _locate(self, key):
+        """Returns 2-tuple of tile key and position of key inside the tile"""
+
+        row, col, tab = key
+        tile_rows, tile_cols = self.tile_shape
+
+        tile_row, tile_row_offset = divmod(row, tile_rows)
+        tile_col, tile_col_offset = divmod(col, tile_cols)
+
+        return (tab, tile_row, tile_col), (tile_row_offset, tile_col_offset)
+
+    def __len__(self):
+        return self._len
+
+    def __contains__(self, key):
+        return self[key] is not None
+
+    def __getitem__(self, key):
+        """Returns the value of key or the default value None"""
+
+        tile_key, position = self._locate(key)
+
+        try:
+            tile = self.tiles[tile_key]
+
+        except KeyError:
+            return
+
+        if type(tile) is dict:
+            return tile.get(position)
+
+        return tile[position]
+
+    def _set_dense(self, tile_key, is_dense):
+        """Converts tile between dict and array, returns converted tile"""
+
+        tile = self.tiles[tile_key]
+
+        if is_dense:
+            new_tile = numpy.empty(self.tile_shape, dtype="O")
+
+            for position, value in tile.iteritems():
+                new_tile[position] = value
+
+        else:
+            rows, cols = numpy.not_equal(tile, None).nonzero()
+
+            new_tile = dict(((int(row), int(col)), tile[row, col])
+                            for row, col in izip(rows, cols))
+
+        self.tiles[tile_key] = new_tile
+
+        # The new tile is owned by this store
+        self._shared.discard(tile_key)
+
+        return new_tile
+
+    def __setitem__(self, key, value):
+        """Stores value for key, None removes key"""
+
+        if value is None:
+            self.pop(key, None)
+            return
+
+        tile_key, position = self._locate(key)
+
+        try:
+            tile = self.tiles[tile_key]
+
+        except KeyError:
+            tile = self.tiles[tile_key] = {}
+            self.tile_sizes[tile_key] = 0
+
+        if tile_key in self._shared:
+            tile = self._own_tile(tile_key)
+
+        if type(tile) is dict:
+            if position not in tile:
+                self.tile_sizes[tile_key] += 1
+                self._len += 1
+
+                if self.tile_sizes[tile_key] > self.dense_size:
+                    tile = self._set_dense(tile_key, True)
+
+        elif tile[position] is None:
+            self.tile_sizes[tile_key] += 1
+            self._len += 1
+
+        tile[position] = value
+
+    def __delitem__(self, key):
+        self.pop(key)
+
+    def pop(self, key, *default):
+        """Removes key and returns its value
+
+        If key is not present then default is returned if given.
+        Otherwise, a KeyError is raised.
+
+        """
+
+        tile_key, position = self._locate(key)
+
+        value = self[key]
+
+        if value is None:
+            if default:
+                return default[0]
+
+            raise KeyError(key)
+
+        self._len -= 1
+        self.tile_sizes[tile_key] -= 1
+
+        tile_size = self.tile_sizes[tile_key]
+
+        if not tile_size:
+            del self.tiles[tile_key]
+            del self.tile_sizes[tile_key]
+            self._shared.discard(tile_key)
+
+            return value
+
+        if tile_key in self._shared:
+            tile = self._own_tile(tile_key)
+        else:
+            tile = self.tiles[tile_key]
+
+        if type(tile) is dict:
+            del tile[position]
+
+        else:
+            tile[position] = None
+
+            if tile_size <= self.dense_size // 2:
+                self._set_dense(tile_key, False)
+
+        return value
+
+    def get(self, key, default=None):
+        """Returns the value of key or default"""
+
+        value = self[key]
+
+        if value is None:
+            return default
+
+        return value
+
+    def clear(self):
+        """Removes all keys"""
+
+        self.tiles.clear()
+        self.tile_sizes.clear()
+        self._len = 0
+        self._shared.clear()
+
+    def _own_tile(self, tile_key):
+        """Replaces a tile that is shared with snapshots by a copy
+
+        Returns the copy.
+
+        """
+
+        tile = self.tiles[tile_key] = self.tiles[tile_key].copy()
+        self._shared.discard(tile_key)
+
+        return tile
+
+    def snapshot(self):
+        """Returns a copy of the store that shares all tiles with the store
+
+        Shared tiles are copied by the store or the snapshot before they
+        are changed. Therefore, taking a snapshot only copies the tile
+        dict and changes of one store do not show up in the other one.
+
+        """
+
+        snapshot = TileStore(self.tile_shape, self.dense_size)
+
+        snapshot.tiles.update(self.tiles)
+        snapshot.tile_sizes.update(self.tile_sizes)
+        snapshot._len = self._len
+
+        self._shared.update(self.tiles)
+        snapshot._shared.update(self.tiles)
+
+        return snapshot
+
+    def get_used_range(self, tab):
+        """Returns bounding box of the cells of table tab or None if empty
+
+        The bounding box is a 2-tuple of top left and bottom right cell.
+        Only the tiles at the border of the table are searched.
+
+        """
+
+        tile_keys = [tile_key for tile_key in self.tiles if tile_key[0] == tab]
+
+        if not tile_keys:
+            return
+
+        tile_rows, tile_cols = self.tile_shape
+
+        bounds = []
+
+        for axis, tile_size, first in [(0, tile_rows, True),
+                                       (1, tile_cols, True),
+                                       (0, tile_rows, False),
+                                       (1, tile_cols, False)]:
+            pick = min if first else max
+            border = pick(tile_key[axis + 1] for tile_key in tile_keys)
+
+            # Occupied rows or columns in the tiles at the border
+            offsets = []
+
+            for tile_key in tile_keys:
+                if tile_key[axis + 1] != border:
+                    continue
+
+                tile = self.tiles[tile_key]
+
+                if type(tile) is dict:
+                    offsets.append(pick(position[axis] for position in tile))
+
+                else:
+                    used = numpy.not_equal(tile, None).any(axis=1 - axis)
+                    tile_offsets = numpy.flatnonzero(used)
+                    offsets.append(int(tile_offsets[0 if first else -1]))
+
+            offset = pick(offsets)
+
+            bounds.append(border * tile_size + int(offset))
+
+        top, left, bottom, right = bounds
+
+        return (top, left), (bottom, right)
+
+    def _iteritems_in_tiles(self, tile_keys, start=None, stop=None):
+        """Returns iterator over key, value pairs of tiles inside a box
+
+        The tiles are searched before the first pair is yielded so that
+        keys may be removed while iterating.
+
+        """
+
+        tile_rows, tile_cols = self.tile_shape
+
+        items = []
+
+        for tile_key in tile_keys:
+            tile = self.tiles[tile_key]
+            tab, tile_row, tile_col = tile_key
+
+            row_offset = tile_row * tile_rows
+            col_offset = tile_col * tile_cols
+
+            if start is None:
+                top, left = 0, 0
+                bottom, right = self.tile_shape
+
+            else:
+                # Restrict the tile to the rows and columns inside the box
+                top = max(start[0] - row_offset, 0)
+                left = max(start[1] - col_offset, 0)
+                bottom = max(stop[0] - row_offset, 0)
+                right = max(stop[1] - col_offset, 0)
+
+            if type(tile) is dict:
+                items.extend(((row_offset + row, col_offset + col, tab), value)
+                             for (row, col), value in sorted(tile.iteritems())
+                             if top <= row < bottom and left <= col < right)
+                continue
+
+            tile = tile[top:bottom, left:right]
+            row_offset += top
+            col_offset += left
+
+            rows, cols = numpy.not_equal(tile, None).nonzero()
+
+            items.extend(((row_offset + int(row), col_offset + int(col), tab),
+                          tile[row, col]) for row, col in izip(rows, cols))
+
+        return iter(items)
+
+    def iteritems(self):
+        """Returns iterator over all key, value pairs"""
+
+        return self._iteritems_in_tiles(sorted(self.tiles))
+
+    def iteritems_in(self, start, stop):
+        """Returns iterator over key, value pairs inside a box
+
+        Only the tiles that intersect the box are searched.
+
+        Parameters
+        ----------
+        start: 3-tuple of Integer
+        \tSmallest row, column and table of the box
+        stop: 3-tuple of Integer
+        \tRow, column and table behind the box
+
+        """
+
+        tile_rows, tile_cols = self.tile_shape
+
+        tile_start = start[2], start[0] // tile_rows, start[1] // tile_cols
+        tile_stop = stop[2], -(-stop[0] // tile_rows), -(-stop[1] // tile_cols)
+
+        tile_keys = sorted(tile_key for tile_key in self.tiles
+                           if all(lower <= ele < upper for ele, lower, upper
+                                  in izip(tile_key, tile_start, tile_stop)))
+
+        return self._iteritems_in_tiles(tile_keys, start, stop)
+
+    def iterkeys(self):
+        """Returns iterator over all keys"""
+
+        return (key for key, _ in self.iteritems())
+
+    __iter__ = iterkeys
+
+    def itervalues(self):
+        """Returns iterator over all values"""
+
+        return (value for _, value in self.iteritems())
+
+    def keys(self):
+        """Returns list of all keys"""
+
+        return list(self.iterkeys())
+
+    def values(self):
+        """Returns list of all values"""
+
+        return list(self.itervalues())
+
+    def items(self):
+        """Returns list of all key, value pairs"""
+
+        return list(self.iteritems())
+
+    def __repr__(self):
+        return repr(dict(self.iteritems()))
+
+# End of class TileStore